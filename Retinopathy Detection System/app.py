@@ -1,15 +1,23 @@
-
+import io
+import json
+import multiprocessing
 import os
-import joblib
-import pandas as pd
+import threading
+import time
 import numpy as np
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, Response, g, render_template, request, jsonify, session, redirect, url_for, send_from_directory
 from functools import wraps
 from werkzeug.utils import secure_filename
 from flask_cors import CORS
 
-# Import the mock model
-from retinopathy.model import RetinopathyModel
+# Heavy dependencies (joblib/sklearn, pandas, OpenCV, torch) are imported inside
+# load_models() and the handlers that need them, keeping module import fast.
+from diabetes_store import ModelVersions
+from model_registry import ModelRegistry, ModelSlot, RegistryWatcher
+from retinopathy.cache import ResultCache
+from retinopathy.artifacts import ArtifactWriter
+from retinopathy.metrics import MetricsRegistry
+from retinopathy.profiler import SamplingProfiler
 
 app = Flask(__name__)
 app.secret_key = 'super_secret_health_ai_key'  # Change this for production
@@ -17,32 +25,279 @@ CORS(app) # Enable CORS for Next.js frontend communication
 
 # Configuration
 MODEL_PATH = os.path.join('Two classes', 'models', 'diabetes_model.pkl')
+COMPILED_MODEL_PATH = os.path.join('Two classes', 'models', 'diabetes_model_forest.npz')
+# 'compiled' evaluates the flattened forest arrays; 'sklearn' uses the joblib pickle
+DIABETES_ENGINE = os.environ.get('DIABETES_ENGINE', 'compiled')
+# Versioned model registries (model_registry.py): main.py publishes diabetes versions, retinopathy weights are
+# published with `python model_registry.py --registry models/retinopathy publish weights=retinopathy_model.pth`
+# (exported .onnx/.pt archives go in the same version under their usual names). A newly activated version is
+# loaded in the background and hot-swapped in within MODEL_RELOAD_SECONDS (0 = only load at startup)
+MODEL_VERSIONS_DIR = os.path.join('Two classes', 'models', 'versions')
+RETINOPATHY_REGISTRY = os.environ.get('RETINOPATHY_REGISTRY', os.path.join('models', 'retinopathy'))
+MODEL_RELOAD_SECONDS = float(os.environ.get('MODEL_RELOAD_SECONDS', '10'))
 UPLOAD_FOLDER = 'static/uploads'
+# Dynamic batching of ResNet18 forward passes across concurrent requests
+RETINOPATHY_BATCHING = os.environ.get('RETINOPATHY_BATCHING', '0') == '1'
+BATCH_MAX_SIZE = int(os.environ.get('BATCH_MAX_SIZE', '8'))
+BATCH_MAX_WAIT_MS = float(os.environ.get('BATCH_MAX_WAIT_MS', '5'))
+# Content-hash cache of retinopathy results (in-memory LRU, optional disk tier)
+RESULT_CACHE_ENTRIES = int(os.environ.get('RESULT_CACHE_ENTRIES', '1024'))
+RESULT_CACHE_MB = int(os.environ.get('RESULT_CACHE_MB', '64'))
+RESULT_CACHE_DIR = os.environ.get('RESULT_CACHE_DIR') or None
+# Persist uploads and segmented masks to UPLOAD_FOLDER
+SAVE_UPLOADS = os.environ.get('SAVE_UPLOADS', '1') == '1'
+# Artifact writer (format: png or webp; compression: PNG level 0-9 / WebP quality 1-101)
+ARTIFACT_FORMAT = os.environ.get('ARTIFACT_FORMAT', 'png')
+ARTIFACT_COMPRESSION = int(os.environ.get('ARTIFACT_COMPRESSION', '3'))
+# Background writer threads for uploads and masks; 0 writes inline, which was as fast or faster
+# unless spare cores are free for encoding (python -m benchmarks.bench_writer)
+ARTIFACT_WORKERS = int(os.environ.get('ARTIFACT_WORKERS', '0'))
+ARTIFACT_QUEUE = int(os.environ.get('ARTIFACT_QUEUE', '64'))
+ARTIFACT_WAIT_SECONDS = float(os.environ.get('ARTIFACT_WAIT_SECONDS', '10'))
+# CV stages run with the longest side downscaled to WORKING_SIZE px (0 = native resolution).
+# From 2048 up, lesion boxes stay within ~0.85 IoU of native; smaller sizes lose small lesions
+# (python -m benchmarks.bench_working_size)
+WORKING_SIZE = int(os.environ.get('WORKING_SIZE', '0')) or None
+REFINE_ROIS = os.environ.get('REFINE_ROIS', '0') == '1'
+# Reuse pooled OpenCV scratch buffers across requests (python -m benchmarks.bench_cv_context)
+CV_REUSE_BUFFERS = os.environ.get('CV_REUSE_BUFFERS', '0') == '1'
+# Working images longer than TILE_SIZE px (2048 recommended) and of at least TILE_MIN_MEGAPIXELS
+# are segmented in tiles: 40-45% less peak memory for 1.5-2x the time (TILE_SIZE 0 = never tile)
+TILE_SIZE = int(os.environ.get('TILE_SIZE', '0')) or None
+TILE_MIN_MEGAPIXELS = float(os.environ.get('TILE_MIN_MEGAPIXELS', '24'))
+# DL engine (auto, onnx, eager, torchscript, int8_dynamic, int8_static) and optional path of its
+# exported archive; 'auto' serves retinopathy_model.onnx through ONNX Runtime when it exists
+RETINOPATHY_ENGINE = os.environ.get('RETINOPATHY_ENGINE', 'auto')
+RETINOPATHY_ENGINE_PATH = os.environ.get('RETINOPATHY_ENGINE_PATH') or None
+# Intra/inter-op threads for the DL engine (0 = runtime default)
+DL_INTRA_OP_THREADS = int(os.environ.get('DL_INTRA_OP_THREADS', '0')) or None
+DL_INTER_OP_THREADS = int(os.environ.get('DL_INTER_OP_THREADS', '0')) or None
+# Test-time augmentation / ensemble grading: comma-separated views (e.g. identity,hflip,rot90; empty = off),
+# extra checkpoints for the same engine, and the plain-pass confidence above which an image skips it
+TTA_VIEWS = [v for v in os.environ.get('TTA_VIEWS', '').split(',') if v]
+ENSEMBLE_WEIGHTS = [p for p in os.environ.get('ENSEMBLE_WEIGHTS', '').split(',') if p]
+TTA_EXIT_CONFIDENCE = float(os.environ.get('TTA_EXIT_CONFIDENCE', '0')) or None
+# Process-pool inference backend (0 = run the pipeline inside the web process)
+RETINOPATHY_WORKERS = int(os.environ.get('RETINOPATHY_WORKERS', '0'))
+WORKER_THREADS = int(os.environ.get('WORKER_THREADS', '1'))
+# Startup: 'background' warms models up in a thread, 'lazy' loads on first request (and reports ready
+# before that), 'eager' at import
+STARTUP_MODE = os.environ.get('STARTUP_MODE', 'background')
+READY_TIMEOUT_SECONDS = float(os.environ.get('READY_TIMEOUT_SECONDS', '30'))
+# Opt-in sampling profiler: requests sent with ?profile=1 or "X-Profile: 1" dump folded stacks to PROFILE_DIR
+PROFILING_ENABLED = os.environ.get('PROFILING', '0') == '1'
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', '5'))
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
-# Load Diabetes Model
-try:
-    model = joblib.load(MODEL_PATH)
-    print("Diabetes Model loaded successfully.")
-except Exception as e:
-    print(f"Error loading Diabetes model: {e}")
-    model = None
+# Diabetes model feature order: API keys and the matching diabetes.csv column names
+FEATURE_KEYS = ['pregnancies', 'glucose', 'bp', 'skin', 'insulin', 'bmi', 'dpf', 'age']
+FEATURE_COLUMNS = ['Pregnancies', 'Glucose', 'BloodPressure', 'SkinThickness',
+                   'Insulin', 'BMI', 'DiabetesPedigreeFunction', 'Age']
+MAX_BATCH_ROWS = int(os.environ.get('MAX_BATCH_ROWS', '1000000'))
+BATCH_STREAM_CHUNK = 5000
+
+def load_diabetes_model(version=None):
+    """
+    Loads the compiled forest (exporting it from the pickle if needed) or the sklearn model.
+    `version` is a ModelVersions manifest; without it the fixed MODEL_PATH/COMPILED_MODEL_PATH are used.
+    The compiled forest keeps the sklearn model attached for batches too large for its NumPy evaluator.
+    """
+    import joblib
+    from forest import NUMBA_SUPPORT, CompiledForest, export_forest
+    model_path = version["model_path"] if version is not None else MODEL_PATH
+    compiled_path = version["compiled_path"] if version is not None else COMPILED_MODEL_PATH
+    if DIABETES_ENGINE != 'compiled':
+        return joblib.load(model_path)
+    sk_model = joblib.load(model_path) if os.path.exists(model_path) else None
+    if version is None and sk_model is not None and (
+            not os.path.exists(compiled_path) or os.path.getmtime(model_path) > os.path.getmtime(compiled_path)):
+        export_forest(sk_model, compiled_path)
+    return CompiledForest.load(compiled_path, fallback=None if NUMBA_SUPPORT else sk_model)
 
-# Initialize Retinopathy Model
-retinopathy_model = RetinopathyModel()
+def build_retinopathy_model(version=None):
+    """
+    Builds a fully configured (RetinopathyModel, ProcessPoolBackend or None) pair from a
+    registry manifest, or from the default weights file when `version` is None.
+    """
+    from retinopathy.model import RetinopathyModel
+    weights_path = version["paths"]["weights"] if version is not None else 'retinopathy_model.pth'
+    rm = RetinopathyModel(weights_path=weights_path, working_size=WORKING_SIZE, refine_rois=REFINE_ROIS,
+                          reuse_buffers=CV_REUSE_BUFFERS,
+                          tile_size=TILE_SIZE, tile_min_pixels=int(TILE_MIN_MEGAPIXELS * 1e6),
+                          engine=RETINOPATHY_ENGINE, engine_path=RETINOPATHY_ENGINE_PATH,
+                          intra_op_threads=DL_INTRA_OP_THREADS, inter_op_threads=DL_INTER_OP_THREADS)
+    if TTA_VIEWS or ENSEMBLE_WEIGHTS:
+        rm.enable_ensemble(views=TTA_VIEWS or ['identity'], member_paths=ENSEMBLE_WEIGHTS,
+                           exit_confidence=TTA_EXIT_CONFIDENCE)
+    if RETINOPATHY_BATCHING:
+        rm.enable_batching(max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS)
+    rm.artifact_url_prefix = '/artifacts'
+    rm.enable_metrics(metrics)
+    backend = None
+    if RETINOPATHY_WORKERS > 0:
+        # Workers get a copy of this model without the writer, batcher and metrics; they write masks inline
+        from retinopathy.workers import ProcessPoolBackend
+        backend = ProcessPoolBackend(rm, workers=RETINOPATHY_WORKERS, threads_per_worker=WORKER_THREADS)
+    else:
+        rm.writer = artifact_writer
+    return rm, backend
 
-import csv
+def close_retinopathy_model(pair):
+    """Stops the batcher and worker pool of a retired model (called once its requests have finished)."""
+    rm, backend = pair
+    if rm.batcher is not None:
+        rm.batcher.stop()
+    if backend is not None:
+        backend.shutdown()
 
-USER_DB = 'users.csv'
+# Models are loaded by load_models() according to STARTUP_MODE and hot-swapped by the registry watchers.
+# Requests pin a model with slot.acquire(); the retinopathy slot holds (RetinopathyModel, backend) pairs.
+diabetes_slot = ModelSlot('diabetes')
+retinopathy_slot = ModelSlot('retinopathy', close=close_retinopathy_model)
+
+def active_retinopathy_model():
+    """The RetinopathyModel currently serving requests (None before load_models), for stats endpoints."""
+    pair = retinopathy_slot.model
+    return pair[0] if pair is not None else None
+
+# Disk writes for uploads and segmented masks (on writer threads when ARTIFACT_WORKERS > 0)
+artifact_writer = ArtifactWriter(workers=ARTIFACT_WORKERS, max_queue=ARTIFACT_QUEUE,
+                                 image_format=ARTIFACT_FORMAT, compression=ARTIFACT_COMPRESSION)
+
+result_cache = ResultCache(max_entries=RESULT_CACHE_ENTRIES,
+                           max_bytes=RESULT_CACHE_MB * 1024 * 1024,
+                           disk_dir=RESULT_CACHE_DIR)
+
+# Prometheus metrics served on /metrics
+metrics = MetricsRegistry()
+metrics.histogram("http_request_duration_seconds", "HTTP request latency by endpoint")
+metrics.gauge("app_models_ready", "1 once the models are loaded")
+metrics.counter("app_model_loads_total", "Model versions loaded into service (startup and hot swaps)")
+metrics.gauge("app_model_info", "Version currently served by each model (always 1)")
+
+def collect_component_metrics(registry):
+    """Mirrors the numeric stats() of the cache, writer, batcher and CV pool as gauges at scrape time."""
+    components = [("retinopathy_result_cache", result_cache.stats()),
+                  ("retinopathy_artifact_writer", artifact_writer.stats())]
+    retinopathy_model = active_retinopathy_model()
+    if retinopathy_model is not None and retinopathy_model.batcher is not None:
+        components.append(("retinopathy_batcher", retinopathy_model.batcher.stats()))
+    if retinopathy_model is not None and retinopathy_model.cv_pool is not None:
+        components.append(("retinopathy_cv_context", retinopathy_model.cv_pool.stats()))
+    for slot in (diabetes_slot, retinopathy_slot):
+        components.append((f"app_{slot.name}_model", {k: v for k, v in slot.stats().items() if k != 'version'}))
+    for prefix, stats in components:
+        for key, value in stats.items():
+            if isinstance(value, (int, float)):
+                registry.gauge(f"{prefix}_{key}", f"{prefix.replace('_', ' ')} {key.replace('_', ' ')}")
+                registry.set(f"{prefix}_{key}", value)
+    registry.set("app_models_ready", int(_models_ready.is_set()))
+    # Only the active versions: the series set is rebuilt on every scrape, so it cannot grow with hot swaps
+    registry.clear("app_model_info")
+    for slot in (diabetes_slot, retinopathy_slot):
+        if slot.version is not None:
+            registry.set("app_model_info", 1, model=slot.name, version=slot.version)
+
+metrics.add_collector(collect_component_metrics)
+
+_load_lock = threading.Lock()
+_models_ready = threading.Event()
+startup_state = {'mode': STARTUP_MODE, 'state': 'pending', 'error': None, 'load_seconds': None}
+
+def count_model_load(name, version):
+    # No version label: every hot swap would add a series; app_model_info carries the active version
+    metrics.inc("app_model_loads_total", model=name)
+
+def load_models():
+    """Imports the heavy dependencies and loads both models (idempotent, thread-safe)."""
+    with _load_lock:
+        if _models_ready.is_set():
+            return
+        startup_state['state'] = 'loading'
+        start = time.perf_counter()
+        try:
+            watchers = [RegistryWatcher(ModelVersions(MODEL_VERSIONS_DIR), diabetes_slot, load_diabetes_model,
+                                        MODEL_RELOAD_SECONDS, on_swap=count_model_load),
+                        RegistryWatcher(ModelRegistry(RETINOPATHY_REGISTRY), retinopathy_slot, build_retinopathy_model,
+                                        MODEL_RELOAD_SECONDS, on_swap=count_model_load)]
+
+            # Load Diabetes Model: the current published version, else the fixed model files
+            try:
+                if not watchers[0].check():
+                    diabetes_slot.load(load_diabetes_model(), 'unversioned')
+                    count_model_load('diabetes', 'unversioned')
+                print(f"Diabetes Model loaded successfully ({DIABETES_ENGINE}, {diabetes_slot.version}).")
+            except Exception as e:
+                print(f"Error loading Diabetes model: {e}")
 
-def init_db():
-    if not os.path.exists(USER_DB):
-        with open(USER_DB, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(['name', 'dob', 'password'])
+            # Initialize Retinopathy Model: the current published version, else retinopathy_model.pth (or CV only)
+            try:
+                loaded = watchers[1].check()
+            except Exception as e:
+                print(f"Error loading published Retinopathy model: {e}")
+                loaded = False
+            if not loaded:
+                rm, backend = build_retinopathy_model()
+                retinopathy_slot.load((rm, backend), rm.weights_version)
+                count_model_load('retinopathy', rm.weights_version)
 
-init_db()
+            if MODEL_RELOAD_SECONDS > 0:
+                for watcher in watchers:
+                    watcher.start()
+
+            startup_state.update(state='ready', error=None)
+            _models_ready.set()
+        except Exception as e:
+            print(f"Model warm-up failed: {e}")
+            startup_state.update(state='failed', error=str(e))
+        finally:
+            startup_state['load_seconds'] = time.perf_counter() - start
+
+def ensure_models_loaded():
+    """
+    Returns None once models are ready, otherwise the error message for a 503
+    (warm-up still running after READY_TIMEOUT_SECONDS, or loading failed).
+    """
+    if not _models_ready.is_set():
+        if not _load_lock.acquire(timeout=READY_TIMEOUT_SECONDS):
+            return 'Models are still loading'
+        _load_lock.release()
+        load_models()
+        if not _models_ready.is_set():
+            return 'Models failed to load'
+    return None
+
+def models_required(f):
+    """Ensures models are loaded before the handler runs; 503 while warm-up is still in progress."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        error = ensure_models_loaded()
+        if error is not None:
+            return jsonify({'error': error, 'startup': startup_state}), 503
+        return f(*args, **kwargs)
+    return decorated
+
+# Inference pool workers re-import the main script (and so this module) while they start; their
+# model comes from the parent, so they must not load models or start pools of their own
+if getattr(multiprocessing.current_process(), '_inheriting', False):
+    pass
+elif STARTUP_MODE == 'eager':
+    load_models()
+elif STARTUP_MODE == 'background':
+    threading.Thread(target=load_models, name='model-warmup', daemon=True).start()
+
+from user_store import create_user_store
+
+USER_DB = 'users.csv'
+# 'sqlite' (indexed, WAL) or 'csv' (original flat file)
+USER_STORE_BACKEND = os.environ.get('USER_STORE', 'sqlite')
+USER_STORE_PATH = os.environ.get('USER_STORE_PATH', 'users.db')
+
+user_store = create_user_store(USER_STORE_BACKEND,
+                               path=USER_STORE_PATH if USER_STORE_BACKEND == 'sqlite' else USER_DB,
+                               csv_path=USER_DB)
 
 @app.route('/api/auth/register', methods=['POST'])
 def register():
@@ -54,19 +309,9 @@ def register():
     if not name or not dob or not password:
         return jsonify({'error': 'Missing fields'}), 400
 
-    users = []
-    with open(USER_DB, 'r', newline='') as f:
-        reader = csv.DictReader(f)
-        users = list(reader)
-
     # Check if user exists (simple check by name)
-    for user in users:
-        if user['name'] == name:
-             return jsonify({'error': 'User already exists'}), 409
-
-    with open(USER_DB, 'a', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow([name, dob, password])
+    if not user_store.add(name, dob, password):
+        return jsonify({'error': 'User already exists'}), 409
 
     return jsonify({'message': 'User registered successfully'}), 201
 
@@ -76,11 +321,9 @@ def login():
     name = data.get('name')
     password = data.get('password')
 
-    with open(USER_DB, 'r', newline='') as f:
-        reader = csv.DictReader(f)
-        for user in reader:
-            if user['name'] == name and user['password'] == password:
-                return jsonify({'message': 'Login successful', 'user': {'name': name, 'dob': user['dob']}}), 200
+    user = user_store.get(name)
+    if user is not None and user['password'] == password:
+        return jsonify({'message': 'Login successful', 'user': {'name': name, 'dob': user['dob']}}), 200
     
     return jsonify({'error': 'Invalid credentials'}), 401
 
@@ -94,67 +337,174 @@ def reset_password():
     if not name or not dob or not new_password:
         return jsonify({'error': 'Missing fields'}), 400
 
-    users = []
-    updated = False
-    with open(USER_DB, 'r', newline='') as f:
-        reader = csv.DictReader(f)
-        users = list(reader)
-
-    for user in users:
-        if user['name'] == name and user['dob'] == dob:
-            user['password'] = new_password
-            updated = True
-            break
-    
-    if updated:
-        with open(USER_DB, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(['name', 'dob', 'password'])
-            for user in users:
-                writer.writerow([user['name'], user['dob'], user['password']])
+    if user_store.update_password(name, dob, new_password):
         return jsonify({'message': 'Password reset successful'}), 200
     else:
         return jsonify({'error': 'User not found or DOB incorrect'}), 404
 
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.profiler = None
+    if PROFILING_ENABLED and (request.args.get('profile') == '1' or request.headers.get('X-Profile') == '1'):
+        g.profile_name = f"{time.strftime('%Y%m%d-%H%M%S')}-{request.endpoint or 'unknown'}-{threading.get_ident()}.folded"
+        g.profiler = SamplingProfiler(interval=PROFILE_INTERVAL_MS / 1000).start()
+
+@app.after_request
+def record_request_metrics(response):
+    # Streamed bodies (NDJSON batch scoring) are still being produced at this point
+    metrics.observe("http_request_duration_seconds", time.perf_counter() - g.request_start,
+                    endpoint=request.endpoint or 'unknown', method=request.method, status=response.status_code)
+    if g.profiler is not None:
+        response.headers['X-Profile-Dump'] = g.profile_name
+    return response
+
+@app.teardown_request
+def stop_profiler(error=None):
+    # Teardown runs for every request, including ones whose handler raised, so no sampler thread is left running
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.stop()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        samples = profiler.dump(os.path.join(PROFILE_DIR, g.profile_name))
+        print(f"Profiled {request.path}: {samples} samples in {profiler.elapsed:.3f}s -> {g.profile_name}")
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/')
 def home():
     return "Health AI API is running."
 
 
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    # Liveness: the process is up and serving requests
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    # Readiness: predictions can be served. Lazy mode loads models on the first prediction, so it
+    # is ready as soon as it accepts requests (unless a load failed); otherwise once models are loaded
+    if STARTUP_MODE == 'lazy':
+        ready = startup_state['state'] != 'failed'
+    else:
+        ready = _models_ready.is_set()
+    return jsonify({'ready': ready, 'models_loaded': _models_ready.is_set(), **startup_state}), 200 if ready else 503
+
 @app.route('/api/predict', methods=['POST'])
+@models_required
 def predict():
     # Note: Disabled login_required for API to allow Next.js easy access for demo
-    if not model:
-        return jsonify({'error': 'Model not loaded. Please train the model using main.py first.'}), 500
+    result, status = diabetes_prediction(request.json)
+    return jsonify(result), status
+
+def diabetes_prediction(data):
+    """Scores one patient JSON object. Returns (response dict, HTTP status); shared with asgi.py."""
+    with diabetes_slot.acquire() as (model, version):
+        if not model:
+            return {'error': 'Model not loaded. Please train the model using main.py first.'}, 500
+
+        try:
+            # Extract features in the correct order
+            features = np.array([[float(data.get(key, 0)) for key in FEATURE_KEYS]])
+
+            labels, probabilities = score_diabetes(model, features)
+            prediction = labels[0]
+
+            result = {
+                'prediction': int(prediction),
+                'probability': float(probabilities[0]),
+                'risk_level': 'High' if prediction == 1 else 'Low',
+                'model_version': version
+            }
+            return result, 200
+
+        except Exception as e:
+            return {'error': str(e)}, 400
+
+def score_diabetes(model, features):
+    """
+    Scores an (n, 8) feature matrix with a single predict_proba call.
+    Returns (labels, probability of class 1); labels match model.predict.
+    """
+    proba = model.predict_proba(features)
+    classes = model.classes_
+    labels = classes[np.argmax(proba, axis=1)]
+    positive = list(classes).index(1) if 1 in classes else proba.shape[1] - 1
+    return labels, proba[:, positive]
+
+def batch_features(rows=None, upload=None, filename=''):
+    """
+    Builds the (n, 8) feature matrix from a parsed JSON body (an array of patients or
+    {"patients": [...]}) or from the bytes of a CSV/Parquet upload. Shared with asgi.py.
+    """
+    if upload is not None:
+        import pandas as pd
+        raw = io.BytesIO(upload)
+        if (filename or '').lower().endswith('.parquet'):
+            df = pd.read_parquet(raw)
+        else:
+            df = pd.read_csv(raw)
+        # Accept either the API keys or the original dataset column names
+        df = df.rename(columns=dict(zip(FEATURE_KEYS, FEATURE_COLUMNS)))
+        df = df.reindex(columns=FEATURE_COLUMNS, fill_value=0)
+        return df.to_numpy(dtype=np.float64)
+
+    if isinstance(rows, dict):
+        rows = rows.get('patients')
+    if not isinstance(rows, list):
+        raise ValueError('Expected a JSON array of patients or a CSV/Parquet file upload')
+    return np.array([[float(row.get(key, 0)) for key in FEATURE_KEYS] for row in rows], dtype=np.float64).reshape(-1, len(FEATURE_KEYS))
 
+def diabetes_batch_prediction(features):
+    """
+    Scores a batch feature matrix. Returns (iterator of NDJSON chunks, 200) or
+    (error dict, HTTP status); shared with asgi.py.
+    """
+    if len(features) > MAX_BATCH_ROWS:
+        return {'error': f'Batch too large ({len(features)} rows, max {MAX_BATCH_ROWS})'}, 413
+
+    with diabetes_slot.acquire() as (model, version):
+        if not model:
+            return {'error': 'Model not loaded. Please train the model using main.py first.'}, 500
+        labels, probabilities = score_diabetes(model, features)
+
+    def generate():
+        # Stream newline-delimited JSON in chunks, in the same order as the input
+        for start in range(0, len(labels), BATCH_STREAM_CHUNK):
+            end = start + BATCH_STREAM_CHUNK
+            chunk = zip(range(start, end), labels[start:end].tolist(), probabilities[start:end].tolist())
+            yield ''.join(json.dumps({
+                'index': i,
+                'prediction': int(prediction),
+                'probability': probability,
+                'risk_level': 'High' if prediction == 1 else 'Low',
+                'model_version': version
+            }) + '\n' for i, prediction, probability in chunk)
+
+    return generate(), 200
+
+@app.route('/api/predict/batch', methods=['POST'])
+@models_required
+def predict_batch():
     try:
-        data = request.json
-        # Extract features in the correct order
-        features = [
-            float(data.get('pregnancies', 0)),
-            float(data.get('glucose', 0)),
-            float(data.get('bp', 0)),
-            float(data.get('skin', 0)),
-            float(data.get('insulin', 0)),
-            float(data.get('bmi', 0)),
-            float(data.get('dpf', 0)),
-            float(data.get('age', 0))
-        ]
-        
-        prediction = model.predict([features])[0]
-        probability = model.predict_proba([features])[0][1]
-        
-        result = {
-            'prediction': int(prediction),
-            'probability': float(probability),
-            'risk_level': 'High' if prediction == 1 else 'Low'
-        }
-        return jsonify(result)
-        
+        if 'file' in request.files:
+            file = request.files['file']
+            features = batch_features(upload=file.read(), filename=file.filename)
+        else:
+            features = batch_features(rows=request.get_json(silent=True))
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+    result, status = diabetes_batch_prediction(features)
+    if status != 200:
+        return jsonify(result), status
+    return Response(result, mimetype='application/x-ndjson')
+
 @app.route('/api/retinopathy/predict', methods=['POST'])
+@models_required
 def predict_retinopathy():
     if 'file' not in request.files:
         return jsonify({'error': 'No file part'}), 400
@@ -163,15 +513,71 @@ def predict_retinopathy():
         return jsonify({'error': 'No selected file'}), 400
     
     if file:
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        
-        # Run prediction using mockup model
-        result = retinopathy_model.predict(filepath)
-        result['image_url'] = f'/static/uploads/{filename}'
-        
-        return jsonify(result)
+        return jsonify(retinopathy_prediction(file.read(), secure_filename(file.filename)))
+
+def retinopathy_prediction(data, filename):
+    """
+    Cache lookup, prediction and cache fill for one encoded upload (shared with asgi.py).
+    `data` is any bytes-like object; the original is only saved on a cache miss.
+    """
+    # The whole request runs on one model version, even if a new one is swapped in meanwhile
+    with retinopathy_slot.acquire() as ((retinopathy_model, retinopathy_backend), version):
+        cache_key = ResultCache.key(data, f"{version}-{retinopathy_model.weights_version}")
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            return {**cached, 'cached': True}
+
+        output_dir = None
+        if SAVE_UPLOADS:
+            output_dir = app.config['UPLOAD_FOLDER']
+            path = os.path.join(output_dir, filename)
+            if isinstance(data, bytes):
+                artifact_writer.write_bytes(path, data)
+            else:
+                # Borrowed buffers (e.g. asgi.py's memory-mapped spool file) are released once
+                # this returns, so they are copied now instead of being queued for the writer
+                with open(path, 'wb') as f:
+                    f.write(data)
+
+        # Run prediction on the in-memory upload (decoded once, no disk round-trip)
+        predict_fn = retinopathy_backend.predict if retinopathy_backend is not None else retinopathy_model.predict
+        result = predict_fn(data, filename=filename, output_dir=output_dir)
+    result['image_url'] = f'/static/uploads/{filename}' if SAVE_UPLOADS else None
+    result['model_version'] = version
+    if 'error' not in result:
+        result_cache.put(cache_key, result)
+    return result
+
+@app.route('/api/retinopathy/batching', methods=['GET'])
+def batching_metrics():
+    retinopathy_model = active_retinopathy_model()
+    if retinopathy_model is None or retinopathy_model.batcher is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **retinopathy_model.batcher.stats()})
+
+@app.route('/api/retinopathy/cv-context', methods=['GET'])
+def cv_context_metrics():
+    # Pooled OpenCV operators/scratch buffers (per worker process when RETINOPATHY_WORKERS > 0)
+    retinopathy_model = active_retinopathy_model()
+    if retinopathy_model is None or retinopathy_model.cv_pool is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **retinopathy_model.cv_pool.stats()})
+
+@app.route('/artifacts/<path:filename>', methods=['GET'])
+def serve_artifact(filename):
+    # Segmented masks are encoded in the background; wait for a pending write before serving
+    path = os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(filename))
+    if not artifact_writer.wait(path, timeout=ARTIFACT_WAIT_SECONDS):
+        return jsonify({'error': 'Artifact is still being written'}), 503
+    return send_from_directory(app.config['UPLOAD_FOLDER'], secure_filename(filename))
+
+@app.route('/api/retinopathy/artifacts', methods=['GET'])
+def artifact_metrics():
+    return jsonify(artifact_writer.stats())
+
+@app.route('/api/retinopathy/cache', methods=['GET'])
+def cache_metrics():
+    return jsonify(result_cache.stats())
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
@@ -0,0 +1,223 @@
+"""
+ASGI serving mode.
+
+/api/predict, /api/predict/batch and /api/retinopathy/predict are served
+natively: uploads are parsed as a stream (multipart parts spool to a temporary
+file past 1 MB and large files are memory-mapped rather than read into memory),
+and the CPU-bound work runs on a bounded thread pool behind an in-flight limit.
+Requests that cannot get a slot within QUEUE_TIMEOUT_SECONDS, or whose
+inference exceeds REQUEST_TIMEOUT_SECONDS, get a 503 with Retry-After. Batch
+scoring holds its slot while parsing and scoring; the NDJSON body is then
+streamed outside it. Every other route (auth, metrics, artifacts) is the Flask
+app from app.py mounted as WSGI through a2wsgi.
+
+The native routes record http_request_duration_seconds like the Flask
+routes, but skip Flask's before/after_request hooks: ?profile=1 / X-Profile
+is ignored on them (profile inference through app.py instead).
+
+Example usage:
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+    python asgi.py
+"""
+import asyncio
+import mmap
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.utils import secure_filename
+from a2wsgi import WSGIMiddleware
+
+import app as flask_app
+
+# Threads running inference and the number of requests admitted at once (running + waiting for a thread)
+INFERENCE_THREADS = int(os.environ.get('INFERENCE_THREADS', str(os.cpu_count() or 4)))
+MAX_IN_FLIGHT = int(os.environ.get('MAX_IN_FLIGHT', str(2 * INFERENCE_THREADS)))
+# Seconds a request may wait for an in-flight slot, and may spend in inference, before a 503
+QUEUE_TIMEOUT_SECONDS = float(os.environ.get('QUEUE_TIMEOUT_SECONDS', '5'))
+REQUEST_TIMEOUT_SECONDS = float(os.environ.get('REQUEST_TIMEOUT_SECONDS', '60'))
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_MB', '32')) * 1024 * 1024
+# Uploads up to this size are read into memory; larger ones are memory-mapped from the spool file
+MMAP_THRESHOLD = 1024 * 1024
+
+executor = ThreadPoolExecutor(max_workers=INFERENCE_THREADS, thread_name_prefix='inference')
+_slots = asyncio.Semaphore(MAX_IN_FLIGHT)
+_in_flight = 0
+
+metrics = flask_app.metrics
+metrics.counter("asgi_rejected_total", "Requests answered 503 by admission control, by reason")
+metrics.gauge("asgi_in_flight", "Inference requests admitted and not yet finished")
+metrics.gauge("asgi_max_in_flight", "Configured in-flight limit")
+metrics.add_collector(lambda registry: (registry.set("asgi_in_flight", _in_flight),
+                                        registry.set("asgi_max_in_flight", MAX_IN_FLIGHT)))
+
+class Overloaded(Exception):
+    pass
+
+def _release_slot(_):
+    global _in_flight
+    _in_flight -= 1
+    _slots.release()
+
+async def offload(fn, *args):
+    """
+    Runs `fn(*args)` on the inference pool under the in-flight limit. The slot
+    is held until the work really finishes, even if the caller already timed out,
+    so the limit bounds actual CPU work rather than waiting clients.
+    """
+    global _in_flight
+    try:
+        await asyncio.wait_for(_slots.acquire(), QUEUE_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        raise Overloaded('queue_timeout')
+    _in_flight += 1
+    future = asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+    future.add_done_callback(_release_slot)
+    try:
+        return await asyncio.wait_for(asyncio.shield(future), REQUEST_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        raise Overloaded('request_timeout')
+
+def _overloaded(reason):
+    metrics.inc("asgi_rejected_total", reason=reason)
+    return JSONResponse({'error': 'Server is busy, retry later', 'reason': reason}, status_code=503,
+                        headers={'Retry-After': str(max(1, int(QUEUE_TIMEOUT_SECONDS)))})
+
+async def _models_error():
+    """None when models are ready; otherwise a 503 response (waits for warm-up off the event loop)."""
+    if flask_app._models_ready.is_set():
+        return None
+    error = await asyncio.get_running_loop().run_in_executor(None, flask_app.ensure_models_loaded)
+    if error is None:
+        return None
+    return JSONResponse({'error': error, 'startup': flask_app.startup_state}, status_code=503)
+
+def _observe(endpoint, request, start, status):
+    metrics.observe("http_request_duration_seconds", time.perf_counter() - start,
+                    endpoint=endpoint, method=request.method, status=status)
+
+async def predict(request):
+    start = time.perf_counter()
+    response = await _models_error()
+    if response is None:
+        try:
+            data = await request.json()
+        except ValueError:
+            data = None
+        try:
+            result, status = await offload(flask_app.diabetes_prediction, data)
+            response = JSONResponse(result, status_code=status)
+        except Overloaded as e:
+            response = _overloaded(str(e))
+    _observe('asgi_predict', request, start, response.status_code)
+    return response
+
+def _run_batch(rows, upload, filename):
+    """Executor job: parses and scores a batch; returns (NDJSON chunks or error dict, status)."""
+    try:
+        features = flask_app.batch_features(rows, upload, filename)
+    except Exception as e:
+        return {'error': str(e)}, 400
+    return flask_app.diabetes_batch_prediction(features)
+
+async def predict_batch(request):
+    start = time.perf_counter()
+    response = await _predict_batch(request)
+    # Streamed bodies are still being produced at this point, as in app.py
+    _observe('asgi_predict_batch', request, start, response.status_code)
+    return response
+
+async def _predict_batch(request):
+    response = await _models_error()
+    if response is not None:
+        return response
+
+    rows, upload, filename = None, None, ''
+    if request.headers.get('content-type', '').startswith('multipart/form-data'):
+        async with request.form() as form:
+            file = form.get('file')
+            if file is not None and not isinstance(file, str):
+                upload, filename = await file.read(), file.filename
+    else:
+        try:
+            rows = await request.json()
+        except ValueError:
+            rows = None
+
+    try:
+        result, status = await offload(_run_batch, rows, upload, filename)
+    except Overloaded as e:
+        return _overloaded(str(e))
+    if status != 200:
+        return JSONResponse(result, status_code=status)
+    return StreamingResponse(result, media_type='application/x-ndjson')
+
+def _run_retinopathy(data, filename):
+    """Executor job. Owns `data`: a memory map is closed here, after the (possibly abandoned) prediction."""
+    try:
+        return flask_app.retinopathy_prediction(data, filename)
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()
+
+async def predict_retinopathy(request):
+    start = time.perf_counter()
+    response = await _predict_retinopathy(request)
+    _observe('asgi_predict_retinopathy', request, start, response.status_code)
+    return response
+
+async def _predict_retinopathy(request):
+    if int(request.headers.get('content-length') or 0) > MAX_UPLOAD_BYTES:
+        return JSONResponse({'error': 'Upload too large'}, status_code=413)
+    response = await _models_error()
+    if response is not None:
+        return response
+
+    async with request.form() as form:
+        upload = form.get('file')
+        if upload is None or isinstance(upload, str):
+            return JSONResponse({'error': 'No file part'}, status_code=400)
+        if not upload.filename:
+            return JSONResponse({'error': 'No selected file'}, status_code=400)
+
+        upload.file.seek(0, os.SEEK_END)
+        size = upload.file.tell()
+        upload.file.seek(0)
+        if size > MAX_UPLOAD_BYTES:
+            return JSONResponse({'error': 'Upload too large'}, status_code=413)
+        if size == 0:
+            data = b''
+        elif size <= MMAP_THRESHOLD:
+            data = upload.file.read()
+        else:
+            # The spooled part already lives in a temporary file; map it instead of reading it
+            data = mmap.mmap(upload.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    try:
+        result = await offload(_run_retinopathy, data, secure_filename(upload.filename))
+    except Overloaded as e:
+        return _overloaded(str(e))
+    return JSONResponse(result)
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    executor.shutdown(wait=False)
+
+application = Starlette(
+    routes=[
+        Route('/api/predict', predict, methods=['POST']),
+        Route('/api/predict/batch', predict_batch, methods=['POST']),
+        Route('/api/retinopathy/predict', predict_retinopathy, methods=['POST']),
+        Mount('/', app=WSGIMiddleware(flask_app.app)),
+    ],
+    lifespan=lifespan,
+)
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(application, host=os.environ.get('HOST', '127.0.0.1'), port=int(os.environ.get('PORT', '5000')))
@@ -0,0 +1,95 @@
+"""
+Sustained-load comparison of the CV pipeline with and without pooled
+OpenCV contexts (shared CLAHE/kernel objects and reused scratch buffers).
+
+Several client threads push same-sized in-memory images through
+RetinopathyModel.predict for a fixed duration; the report shows throughput,
+latency percentiles and how many scratch buffers were allocated.
+
+Usage (from the project root):
+    python -m benchmarks.bench_cv_context --size 3MP --clients 4 --seconds 20
+"""
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from retinopathy.context import CVContext
+from retinopathy.model import RetinopathyModel
+from benchmarks.synthetic import RESOLUTIONS, make_fundus
+
+def buffers_per_request(model, img):
+    """Scratch buffers one request allocates when nothing is reused."""
+    ctx = CVContext()
+    work_img, scale = model._working_image(img, ctx)
+    contrast_enhanced, vessels = model._segment_vessels(work_img, ctx, scale)
+    model._extract_lesions(contrast_enhanced, vessels, scale, ctx)
+    return ctx.allocations
+
+def run_load(model, images, clients, seconds):
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client(offset):
+        local = []
+        i = offset
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            model.predict(images[i % len(images)])
+            local.append((time.perf_counter() - start) * 1000)
+            i += 1
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client, args=(c,)) for c in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": len(latencies),
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark pooled OpenCV contexts under sustained load')
+    parser.add_argument('--size', choices=list(RESOLUTIONS), default='3MP')
+    parser.add_argument('--working', type=int, default=None, help='Working resolution (long side)')
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=20.0)
+    parser.add_argument('--images', type=int, default=4, help='Distinct synthetic images (same size)')
+    args = parser.parse_args()
+
+    width, height = RESOLUTIONS[args.size]
+    images = [make_fundus(width, height, seed=s) for s in range(args.images)]
+
+    fresh = RetinopathyModel(weights_path='', working_size=args.working, reuse_buffers=False)
+    pooled = RetinopathyModel(weights_path='', working_size=args.working, reuse_buffers=True)
+
+    # Both paths must produce the same result
+    for img in images:
+        a, b = fresh.predict(img), pooled.predict(img)
+        assert a["diagnosis"] == b["diagnosis"] and a["annotations"] == b["annotations"], "pooled output differs"
+
+    per_request = buffers_per_request(fresh, images[0])
+    baseline = run_load(fresh, images, args.clients, args.seconds)
+    reused = run_load(pooled, images, args.clients, args.seconds)
+    stats = pooled.cv_pool.stats()
+
+    print(f"{args.size} ({width}x{height}), {args.clients} clients, {args.seconds:.0f}s per mode")
+    print(f"{'mode':>8} {'requests':>9} {'img/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'buffer allocs':>14}")
+    print(f"{'fresh':>8} {baseline['requests']:9d} {baseline['throughput']:8.1f} {baseline['p50_ms']:8.1f} "
+          f"{baseline['p99_ms']:8.1f} {per_request * baseline['requests']:14d}")
+    print(f"{'pooled':>8} {reused['requests']:9d} {reused['throughput']:8.1f} {reused['p50_ms']:8.1f} "
+          f"{reused['p99_ms']:8.1f} {stats['buffer_allocations']:14d}")
+    print(f"pool: {stats['contexts_created']} contexts, {stats['buffer_reuses']} buffer reuses, "
+          f"{stats['buffer_bytes'] / 2**20:.1f} MiB resident")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Accuracy parity and CPU latency/throughput of the DL inference engines.
+
+Every engine grades the same preprocessed images. Parity is reported against
+the eager fp32 model (top-1 agreement, max absolute probability difference)
+and, when the images sit in ImageFolder-style class folders, as accuracy
+against those labels. Latency is single-image p50/p99; throughput uses
+batched forward passes.
+
+Usage (from the project root):
+    python -m retinopathy.engines --weights retinopathy_model.pth --calibration-dir archive/colored_images
+    python -m benchmarks.bench_engines --weights retinopathy_model.pth --data dataset/val --threads 4
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+from torchvision import models
+
+from retinopathy.engines import ENGINES, engine_path, iter_calibration_batches
+from retinopathy.model import RetinopathyModel
+from benchmarks.synthetic import make_fundus
+
+def ensure_weights(weights_path):
+    """Uses random ResNet18 weights when no trained model exists (parity is still meaningful)."""
+    if os.path.exists(weights_path):
+        return weights_path
+    net = models.resnet18(pretrained=False)
+    net.fc = nn.Linear(net.fc.in_features, 5)
+    weights_path = os.path.join(tempfile.mkdtemp(), 'random_resnet18.pth')
+    torch.save(net.state_dict(), weights_path)
+    return weights_path
+
+def load_inputs(data_dir, limit):
+    """Returns (N, 3, 224, 224) inputs and labels (None without class folders)."""
+    if data_dir is None:
+        from retinopathy.model import to_dl_input
+        images = [to_dl_input(make_fundus(1024, 768, seed=s)) for s in range(min(limit, 64))]
+        return torch.from_numpy(np.stack(images)), None
+    inputs = torch.cat(list(iter_calibration_batches(data_dir, limit)))
+    classes = sorted(d for d in os.listdir(data_dir) if os.path.isdir(os.path.join(data_dir, d)))
+    if not classes:
+        return inputs, None
+    paths = sorted(os.path.join(root, name) for root, _, files in os.walk(data_dir) for name in files
+                   if name.lower().endswith(('.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp')))[:limit]
+    labels = np.array([classes.index(os.path.relpath(p, data_dir).split(os.sep)[0]) for p in paths])
+    return inputs, labels if len(labels) == len(inputs) else None
+
+def probabilities(model, inputs, batch_size):
+    return torch.cat([model._forward(inputs[i:i + batch_size])
+                      for i in range(0, len(inputs), batch_size)]).numpy()
+
+def latency(model, inputs, runs):
+    times = []
+    for i in range(runs):
+        x = inputs[i % len(inputs)].unsqueeze(0)
+        start = time.perf_counter()
+        model._forward(x)
+        times.append((time.perf_counter() - start) * 1000)
+    return float(np.percentile(times, 50)), float(np.percentile(times, 99))
+
+def throughput(model, inputs, batch_size, seconds=5.0):
+    batch = inputs[:batch_size]
+    if len(batch) < batch_size:
+        batch = batch.repeat((batch_size + len(batch) - 1) // len(batch), 1, 1, 1)[:batch_size]
+    done = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        model._forward(batch)
+        done += batch_size
+    return done / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare eager / TorchScript / int8 DR grading engines')
+    parser.add_argument('--weights', type=str, default='retinopathy_model.pth')
+    parser.add_argument('--data', type=str, default=None, help='Image folder (class subfolders give accuracy)')
+    parser.add_argument('--limit', type=int, default=512, help='Images used for parity')
+    parser.add_argument('--engines', nargs='+', choices=ENGINES, default=list(ENGINES))
+    parser.add_argument('--threads', type=int, default=None, help='torch intra-op threads')
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--runs', type=int, default=200, help='Single-image latency samples')
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    weights_path = ensure_weights(args.weights)
+    inputs, labels = load_inputs(args.data, args.limit)
+    print(f"{len(inputs)} images, {torch.get_num_threads()} threads"
+          f"{'' if labels is not None else ' (no labels: accuracy not reported)'}")
+
+    reference = None
+    rows = []
+    for engine in args.engines:
+        model = RetinopathyModel(weights_path, engine=engine)
+        if model.engine != engine:
+            print(f"Skipping {engine}: not available (loaded {model.engine})")
+            continue
+        probs = probabilities(model, inputs, args.batch_size)
+        if reference is None:
+            reference = probs
+        agree = float(np.mean(probs.argmax(1) == reference.argmax(1)))
+        max_diff = float(np.abs(probs - reference).max())
+        accuracy = float(np.mean(probs.argmax(1) == labels)) if labels is not None else None
+        p50, p99 = latency(model, inputs, args.runs)
+        img_s = throughput(model, inputs, args.batch_size)
+        archive = engine_path(weights_path, engine)
+        size_mb = os.path.getsize(archive if os.path.exists(archive) else weights_path) / 2**20
+        rows.append((engine, agree, max_diff, accuracy, p50, p99, img_s, size_mb))
+
+    print(f"{'engine':>13} {'top1 agree':>10} {'max |dp|':>9} {'accuracy':>9} {'p50 ms':>7} {'p99 ms':>7} "
+          f"{'img/s':>7} {'size MB':>8}")
+    for engine, agree, max_diff, accuracy, p50, p99, img_s, size_mb in rows:
+        acc = f"{accuracy:9.1%}" if accuracy is not None else f"{'-':>9}"
+        print(f"{engine:>13} {agree:10.1%} {max_diff:9.4f} {acc} {p50:7.1f} {p99:7.1f} {img_s:7.1f} {size_mb:8.1f}")
+
+if __name__ == "__main__":
+    main()
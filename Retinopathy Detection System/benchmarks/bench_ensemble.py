@@ -0,0 +1,92 @@
+"""
+Cost of test-time augmentation / ensemble grading.
+
+For one view/member configuration the DL grade of the same images is timed
+as: the plain single-model pass, the ensemble run as one batched pass, the
+same views x members as sequential single-image calls, and the batched pass
+with early exit. Also reports how many images exited early and how often
+the ensemble changed the plain grade.
+
+Usage (from the project root):
+    python -m benchmarks.bench_ensemble --weights retinopathy_model.pth --views identity hflip rot90 --members 3
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+from torchvision import models
+
+from retinopathy.ensemble import TTA_VIEWS, augment
+from retinopathy.model import RetinopathyModel, to_dl_input
+from benchmarks.bench_engines import ensure_weights
+from benchmarks.synthetic import make_fundus
+
+def extra_members(n):
+    """Randomly initialised checkpoints standing in for ensemble members."""
+    folder = tempfile.mkdtemp()
+    paths = []
+    for i in range(n):
+        torch.manual_seed(i)
+        net = models.resnet18(pretrained=False)
+        net.fc = nn.Linear(net.fc.in_features, 5)
+        paths.append(os.path.join(folder, f'member_{i}.pth'))
+        torch.save(net.state_dict(), paths[-1])
+    return paths
+
+def call_member(model, member, x):
+    """One member on one single-image view, the way N sequential calls would run it."""
+    if model.engine == 'onnx':
+        return member(x)
+    with torch.no_grad():
+        return member(torch.from_numpy(x))
+
+def timed(fn, runs):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(runs):
+        out = fn()
+    return (time.perf_counter() - start) / runs * 1000, out
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark TTA / ensemble grading')
+    parser.add_argument('--weights', type=str, default='retinopathy_model.pth')
+    parser.add_argument('--engine', type=str, default='eager')
+    parser.add_argument('--views', nargs='+', choices=list(TTA_VIEWS), default=['identity', 'hflip', 'rot90'])
+    parser.add_argument('--members', type=int, default=3, help='Models in the ensemble (including the primary)')
+    parser.add_argument('--exit-confidence', type=float, default=0.9)
+    parser.add_argument('--images', type=int, default=16)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    model = RetinopathyModel(ensure_weights(args.weights), engine=args.engine)
+    if not model.dl_active:
+        raise SystemExit("DL model could not be loaded")
+    ensemble = model.enable_ensemble(args.views, extra_members(args.members - 1))
+    inputs = np.stack([to_dl_input(make_fundus(1024, 768, seed=s)) for s in range(args.images)])
+    batch = model._stack_inputs([torch.from_numpy(x) if model.engine != 'onnx' else x for x in inputs])
+
+    plain_ms, plain = timed(lambda: np.asarray(model._forward(batch)), args.runs)
+    batched_ms, (probs, _) = timed(lambda: ensemble.grade(inputs), args.runs)
+    sequential_ms, _ = timed(lambda: [call_member(model, member, augment(x[np.newaxis], (view,)))
+                                      for x in inputs for view in ensemble.views for member in ensemble.members],
+                             args.runs)
+    ensemble.exit_confidence = args.exit_confidence
+    exit_ms, (_, summaries) = timed(lambda: ensemble.grade(inputs, np.asarray(model._forward(batch))), args.runs)
+
+    n = len(inputs)
+    print(f"{len(ensemble.members)} member(s) x {len(ensemble.views)} view(s), {n} images, {model.engine} engine")
+    print(f"  plain pass:           {plain_ms / n:8.2f} ms/image")
+    print(f"  ensemble, batched:    {batched_ms / n:8.2f} ms/image")
+    print(f"  ensemble, sequential: {sequential_ms / n:8.2f} ms/image ({sequential_ms / batched_ms:.1f}x batched)")
+    print(f"  with early exit:      {exit_ms / n:8.2f} ms/image "
+          f"({sum(s['early_exit'] for s in summaries)}/{n} exited at >= {args.exit_confidence:.0%})")
+    changed = np.mean(np.argmax(probs, axis=1) != np.argmax(plain, axis=1))
+    agreement = np.mean([s["agreement"] for s in summaries if not s["early_exit"]] or [1.0])
+    print(f"  grade changed by ensemble: {changed:.0%}, mean view agreement: {agreement:.0%}")
+
+if __name__ == "__main__":
+    main()
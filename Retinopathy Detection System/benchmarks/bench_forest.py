@@ -0,0 +1,64 @@
+"""
+Parity check and latency of the compiled forest vs. sklearn's RandomForestClassifier.
+
+Usage (from the project root):
+    python -m benchmarks.bench_forest --sizes 1 10 100 1000 10000 100000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import joblib
+import numpy as np
+
+from forest import NUMBA_SUPPORT, CompiledForest, export_forest
+from main import MODEL_PATH
+
+def timed(fn, X, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(X)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark compiled forest inference')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 100, 1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    sk_model = joblib.load(MODEL_PATH)
+    path = export_forest(sk_model, os.path.join(tempfile.mkdtemp(), 'forest.npz'))
+    engines = {"numpy": CompiledForest.load(path, use_numba=False),
+               # What app.py serves without numba: NumPy for small inputs, sklearn above FALLBACK_ROWS
+               "served": CompiledForest.load(path, use_numba=False, fallback=sk_model)}
+    if NUMBA_SUPPORT:
+        engines["numba"] = CompiledForest.load(path, use_numba=True)
+
+    # Synthetic rows spanning the PIMA feature ranges
+    rng = np.random.RandomState(0)
+    low = np.array([0, 44, 0, 0, 0, 18, 0.078, 21])
+    high = np.array([17, 199, 122, 99, 846, 67, 2.42, 81])
+    X_all = rng.uniform(low, high, size=(max(args.sizes), 8))
+
+    # Parity: probabilities must match sklearn exactly
+    expected = sk_model.predict_proba(X_all)
+    for name, engine in engines.items():
+        got = engine.predict_proba(X_all)
+        if not np.array_equal(got, expected):
+            raise SystemExit(f"PARITY FAILED ({name}): max abs diff {np.abs(got - expected).max():.3e}")
+        print(f"Parity OK ({name}): {len(X_all)} rows, identical probabilities")
+
+    print(f"{'rows':>8} {'sklearn ms':>11} " + " ".join(f"{n + ' ms':>10}" for n in engines))
+    for n in args.sizes:
+        X = X_all[:n]
+        for engine in engines.values():
+            engine.predict_proba(X)  # JIT / cache warm-up
+        row = f"{n:8d} {timed(sk_model.predict_proba, X, args.repeat):11.3f} "
+        row += " ".join(f"{timed(engine.predict_proba, X, args.repeat):10.3f}" for engine in engines.values())
+        print(row)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Lesion statistics on noisy images: per-contour Python loops vs component stats.
+
+Speckle noise is added to synthetic fundus images so the lesion masks contain
+thousands of tiny blobs. "contours" is the previous implementation
+(findContours, then contourArea/boundingRect per contour and Python list
+filtering); "components" is RetinopathyModel._extract_lesions (areas, boxes
+and centroids from one connectedComponentsWithStats call per mask, no
+findContours) plus grading and annotation on those NumPy arrays.
+
+Usage (from the project root):
+    python -m benchmarks.bench_lesion_stats --size 3MP --noise 0.002 0.01 0.05
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from retinopathy.context import CVContext
+from retinopathy.model import RetinopathyModel
+from benchmarks.synthetic import RESOLUTIONS, make_fundus
+
+def add_speckle(img, fraction, seed=0):
+    """Sets `fraction` of the pixels to black or white."""
+    rng = np.random.default_rng(seed)
+    noisy = img.copy()
+    mask = rng.random(img.shape[:2]) < fraction
+    noisy[mask] = rng.choice([0, 255], size=(int(mask.sum()), 1)).astype(np.uint8)
+    return noisy
+
+def contour_stats(model, contrast_enhanced, vessels, ctx):
+    """The previous per-contour pass: areas and boxes as Python lists, then counts and the first N boxes."""
+    shape = contrast_enhanced.shape
+    masks = model._lesion_masks(contrast_enhanced, vessels, ctx.buffer("dark", shape), ctx.buffer("lesions", shape),
+                                ctx.buffer("bright", shape))
+    counts, annotations = [], []
+    for mask, limit in zip(masks, (15, 10)):
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        areas = [cv2.contourArea(c) for c in contours]
+        boxes = [cv2.boundingRect(c) for c in contours]
+        counts.append(len([a for a in areas if a > 5]))
+        annotations += [box for area, box in zip(areas[:limit], boxes[:limit]) if area > 10]
+    return counts, annotations
+
+def component_stats(model, contrast_enhanced, vessels, ctx):
+    lesions = model._extract_lesions(contrast_enhanced, vessels, 1.0, ctx)
+    grade = model._predict_cv(None, contrast_enhanced, vessels, lesions)
+    return grade, model._generate_cv_annotations(contrast_enhanced, vessels, lesions)
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return float(np.median(times))
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark vectorized lesion statistics')
+    parser.add_argument('--size', choices=list(RESOLUTIONS), default='3MP')
+    parser.add_argument('--noise', type=float, nargs='+', default=[0.0, 0.002, 0.01, 0.05],
+                        help='Fraction of speckled pixels')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per setting (median reported)')
+    args = parser.parse_args()
+
+    model = RetinopathyModel(weights_path='')  # CV stages only
+    ctx = CVContext()
+    width, height = RESOLUTIONS[args.size]
+    base = make_fundus(width, height)
+    print(f"{'noise':>7} {'blobs':>8} {'contours ms':>12} {'components ms':>14} {'speedup':>8}")
+    for fraction in args.noise:
+        img = add_speckle(base, fraction)
+        contrast_enhanced, vessels = model._segment_vessels(img, ctx)
+        legacy_ms = timed(lambda: contour_stats(model, contrast_enhanced, vessels, ctx), args.repeat)
+        vector_ms = timed(lambda: component_stats(model, contrast_enhanced, vessels, ctx), args.repeat)
+        lesions = model._extract_lesions(contrast_enhanced, vessels, 1.0, ctx)
+        blobs = sum(len(found["areas"]) for found in lesions.values())
+        print(f"{fraction:7.3f} {blobs:8d} {legacy_ms:12.1f} {vector_ms:14.1f} {legacy_ms / vector_ms:7.1f}x")
+
+if __name__ == "__main__":
+    main()
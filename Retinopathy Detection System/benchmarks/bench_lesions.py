@@ -0,0 +1,89 @@
+"""
+Per-stage timings of the CV pipeline before/after the shared lesion-extraction stage.
+
+"before" replays the original _predict_cv and _generate_cv_annotations, each
+thresholding the CLAHE image and running findContours/contourArea on its own;
+"after" is one _extract_lesions pass read by both grading and annotation.
+
+Usage (from the project root):
+    python -m benchmarks.bench_lesions --repeat 5
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from retinopathy.model import RetinopathyModel
+from benchmarks.synthetic import RESOLUTIONS, make_fundus
+
+def _legacy_masks(contrast_enhanced, vessels):
+    _, dark_spots = cv2.threshold(contrast_enhanced, 20, 255, cv2.THRESH_BINARY_INV)
+    lesions_mask = cv2.subtract(dark_spots, vessels)
+    _, bright_spots = cv2.threshold(contrast_enhanced, 220, 255, cv2.THRESH_BINARY)
+    hemo_contours, _ = cv2.findContours(lesions_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    exud_contours, _ = cv2.findContours(bright_spots, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    return hemo_contours, exud_contours
+
+def _legacy_grade(contrast_enhanced, vessels):
+    """Lesion counting of the original _predict_cv."""
+    hemo_contours, exud_contours = _legacy_masks(contrast_enhanced, vessels)
+    hemo_count = len([c for c in hemo_contours if cv2.contourArea(c) > 5])
+    exud_count = len([c for c in exud_contours if cv2.contourArea(c) > 5])
+    return hemo_count, exud_count
+
+def _legacy_annotate(contrast_enhanced, vessels):
+    """The original _generate_cv_annotations."""
+    hemo_contours, exud_contours = _legacy_masks(contrast_enhanced, vessels)
+    annotations = []
+    for contours, limit, label in ((hemo_contours, 15, "Hemorrhage"), (exud_contours, 10, "Exudate")):
+        for c in contours[:limit]:
+            if cv2.contourArea(c) > 10:
+                x, y, w, h = cv2.boundingRect(c)
+                annotations.append({"x": x, "y": y, "w": w, "h": h, "label": label})
+    return annotations
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    out = fn(*args)
+    return out, (time.perf_counter() - start) * 1000
+
+def bench_resolution(model, img, repeat):
+    stages = {"segment": [], "before_grade": [], "before_annotate": [],
+              "after_lesions": [], "after_grade": [], "after_annotate": []}
+    for _ in range(repeat):
+        (contrast_enhanced, vessels), ms = _timed(model._segment_vessels, img)
+        stages["segment"].append(ms)
+
+        _, ms = _timed(_legacy_grade, contrast_enhanced, vessels)
+        stages["before_grade"].append(ms)
+        _, ms = _timed(_legacy_annotate, contrast_enhanced, vessels)
+        stages["before_annotate"].append(ms)
+
+        lesions, ms = _timed(model._extract_lesions, contrast_enhanced, vessels)
+        stages["after_lesions"].append(ms)
+        _, ms = _timed(model._predict_cv, img, contrast_enhanced, vessels, lesions)
+        stages["after_grade"].append(ms)
+        _, ms = _timed(model._generate_cv_annotations, contrast_enhanced, vessels, lesions)
+        stages["after_annotate"].append(ms)
+    return {name: float(np.median(values)) for name, values in stages.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark shared lesion extraction')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per resolution (median reported)')
+    args = parser.parse_args()
+
+    model = RetinopathyModel(weights_path='')  # CV stages only
+    print(f"{'size':>6} {'segment':>8} | {'grade':>7} {'annotate':>9} {'before':>8} | "
+          f"{'lesions':>8} {'grade':>6} {'annotate':>9} {'after':>8} | {'speedup':>7}")
+    for label, (width, height) in RESOLUTIONS.items():
+        img = make_fundus(width, height)
+        t = bench_resolution(model, img, args.repeat)
+        before = t["before_grade"] + t["before_annotate"]
+        after = t["after_lesions"] + t["after_grade"] + t["after_annotate"]
+        print(f"{label:>6} {t['segment']:8.1f} | {t['before_grade']:7.1f} {t['before_annotate']:9.1f} {before:8.1f} | "
+              f"{t['after_lesions']:8.1f} {t['after_grade']:6.2f} {t['after_annotate']:9.2f} {after:8.1f} | "
+              f"{before / after:6.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Memory footprint and latency of the ONNX Runtime grader vs. the torch engines.
+
+Each engine runs in a fresh interpreter so the numbers include its import cost:
+time to import and load the model, peak RSS, whether torch ended up imported,
+and single-image grading latency (preprocessing + forward pass).
+
+Usage (from the project root):
+    python train_dl.py --output retinopathy_model.pth --onnx retinopathy_model.onnx
+    python -m benchmarks.bench_onnx --weights retinopathy_model.pth --engines onnx eager torchscript --threads 2
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+PROBE = r'''
+import json, resource, sys, time
+engine, weights, runs, threads = sys.argv[1], sys.argv[2], int(sys.argv[3]), int(sys.argv[4]) or None
+
+t0 = time.perf_counter()
+from retinopathy.model import RetinopathyModel
+model = RetinopathyModel(weights, engine=engine, intra_op_threads=threads, inter_op_threads=1)
+load_s = time.perf_counter() - t0
+
+from benchmarks.synthetic import make_fundus
+img = make_fundus(1024, 768)
+probabilities = model._classify(model._preprocess_dl(img))  # warm-up
+latencies = []
+for _ in range(runs):
+    start = time.perf_counter()
+    model._classify(model._preprocess_dl(img))
+    latencies.append((time.perf_counter() - start) * 1000)
+latencies.sort()
+print(json.dumps({
+    'engine': model.engine,
+    'dl_active': model.dl_active,
+    'load_s': load_s,
+    'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'torch_imported': 'torch' in sys.modules,
+    'p50_ms': latencies[len(latencies) // 2],
+    'p99_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+    'probabilities': [float(p) for p in probabilities],
+}))
+'''
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare ONNX Runtime and torch grading engines')
+    parser.add_argument('--weights', type=str, default='retinopathy_model.pth')
+    parser.add_argument('--onnx', type=str, default=None, help='ONNX file (default: next to the weights)')
+    parser.add_argument('--engines', nargs='+', default=['onnx', 'eager', 'torchscript'])
+    parser.add_argument('--threads', type=int, default=0, help='Intra-op threads (0 = runtime default)')
+    parser.add_argument('--runs', type=int, default=200)
+    args = parser.parse_args()
+
+    rows = []
+    for engine in args.engines:
+        weights = args.onnx if engine == 'onnx' and args.onnx else args.weights
+        out = subprocess.run([sys.executable, '-c', PROBE, engine, weights, str(args.runs), str(args.threads)],
+                             capture_output=True, text=True, check=True, env=dict(os.environ))
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        if not r['dl_active'] or r['engine'] != engine:
+            print(f"Skipping {engine}: not available (loaded {r['engine']}, DL active: {r['dl_active']})")
+            continue
+        rows.append(r)
+
+    if not rows:
+        return
+    reference = np.array(rows[0]['probabilities'])
+    print(f"{'engine':>12} {'load s':>7} {'peak RSS MB':>12} {'torch':>6} {'p50 ms':>7} {'p99 ms':>7} "
+          f"{'max |dp| vs ' + rows[0]['engine']:>18}")
+    for r in rows:
+        diff = np.abs(np.array(r['probabilities']) - reference).max()
+        print(f"{r['engine']:>12} {r['load_s']:7.2f} {r['rss_mb']:12.0f} {'yes' if r['torch_imported'] else 'no':>6} "
+              f"{r['p50_ms']:7.1f} {r['p99_ms']:7.1f} {diff:18.2e}")
+
+if __name__ == "__main__":
+    main()
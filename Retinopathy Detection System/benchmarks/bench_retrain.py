@@ -0,0 +1,82 @@
+"""
+Diabetes model retrain time as the dataset grows.
+
+For each dataset size a partition store is filled with synthetic PIMA rows
+(1M-row partitions), then timed:
+    legacy       the previous option (1): pd.read_csv of the whole dataset and
+                 a single-threaded 100-tree fit (skipped above --legacy-max-rows)
+    full         main.train_incremental with no base version: parallel
+                 100-tree fit over every partition, versioned publish
+    incremental  one new partition of --update-fraction of the rows appended,
+                 then main.train_incremental growing the forest by 20 trees
+                 with warm_start on that partition only
+
+Usage (from the project root):
+    python -m benchmarks.bench_retrain --rows 768 10000 100000 1000000 10000000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+
+from diabetes_store import FEATURE_COLUMNS, PartitionStore
+from main import train_incremental
+from benchmarks.synthetic import make_pima_rows
+
+CHUNK_ROWS = 1_000_000
+
+def fill_store(store, n_rows, seed=0):
+    for i, start in enumerate(range(0, n_rows, CHUNK_ROWS)):
+        store.append(make_pima_rows(min(CHUNK_ROWS, n_rows - start), seed=seed + i))
+
+def legacy_retrain(store, folder):
+    """Whole-dataset CSV read plus the original single-threaded fit (80% train split)."""
+    csv_path = os.path.join(folder, 'diabetes.csv')
+    X, y = store.load()
+    df = pd.DataFrame(X, columns=FEATURE_COLUMNS)
+    df['Outcome'] = y
+    df.to_csv(csv_path, index=False)
+    start = time.perf_counter()
+    df = pd.read_csv(csv_path)
+    train = df.sample(frac=0.8, random_state=42)
+    RandomForestClassifier(n_estimators=100, random_state=42).fit(train.drop(columns='Outcome'), train['Outcome'])
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark diabetes retraining vs dataset size')
+    parser.add_argument('--rows', type=int, nargs='+', default=[768, 10_000, 100_000, 1_000_000, 10_000_000])
+    parser.add_argument('--update-fraction', type=float, default=0.01, help='New partition size relative to the dataset')
+    parser.add_argument('--legacy-max-rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'legacy s':>9} {'full s':>8} {'update rows':>12} {'incremental s':>14} {'trees':>6}")
+    for n_rows in args.rows:
+        folder = tempfile.mkdtemp()
+        store_dir = os.path.join(folder, 'store')
+        model_path = os.path.join(folder, 'models', 'diabetes_model.pkl')
+        compiled_path = os.path.join(folder, 'models', 'diabetes_model_forest.npz')
+        os.makedirs(os.path.dirname(model_path))
+        store = PartitionStore(store_dir)
+        fill_store(store, n_rows)
+
+        legacy = legacy_retrain(store, folder) if n_rows <= args.legacy_max_rows else None
+
+        start = time.perf_counter()
+        train_incremental(store_dir=store_dir, model_path=model_path, compiled_path=compiled_path)
+        full = time.perf_counter() - start
+
+        update_rows = max(768, int(n_rows * args.update_fraction))
+        store.append(make_pima_rows(update_rows, seed=10_000))
+        start = time.perf_counter()
+        model = train_incremental(store_dir=store_dir, model_path=model_path, compiled_path=compiled_path)
+        incremental = time.perf_counter() - start
+
+        legacy_text = f"{legacy:9.2f}" if legacy is not None else f"{'-':>9}"
+        print(f"{n_rows:10d} {legacy_text} {full:8.2f} {update_rows:12d} {incremental:14.2f} "
+              f"{len(model.estimators_):6d}")
+
+if __name__ == "__main__":
+    main()
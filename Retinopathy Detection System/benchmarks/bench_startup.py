@@ -0,0 +1,54 @@
+"""
+Cold-start benchmark: app.py import time and time to first prediction per STARTUP_MODE.
+
+Each mode runs in a fresh interpreter so module caches do not leak between runs.
+
+Usage (from the project root):
+    python -m benchmarks.bench_startup --modes eager background lazy
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+PROBE = r'''
+import io, json, time
+t0 = time.perf_counter()
+import app
+t_import = time.perf_counter() - t0
+
+from benchmarks.synthetic import encode, make_fundus
+image = encode(make_fundus(1152, 864))
+client = app.app.test_client()
+
+t1 = time.perf_counter()
+ready_status = client.get('/readyz').status_code
+resp = client.post('/api/retinopathy/predict', data={'file': (io.BytesIO(image), 'bench.png')},
+                   content_type='multipart/form-data')
+t_first = time.perf_counter() - t1
+print(json.dumps({
+    'import_s': t_import,
+    'first_prediction_s': t_first,
+    'ready_at_import': ready_status == 200,
+    'status': resp.status_code,
+    'load_seconds': app.startup_state['load_seconds'],
+}))
+'''
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark app.py cold start')
+    parser.add_argument('--modes', nargs='+', default=['eager', 'background', 'lazy'])
+    args = parser.parse_args()
+
+    print(f"{'mode':>11} {'import s':>9} {'1st pred s':>11} {'total s':>8} {'model load s':>13}")
+    for mode in args.modes:
+        env = dict(os.environ, STARTUP_MODE=mode, SAVE_UPLOADS='0')
+        out = subprocess.run([sys.executable, '-c', PROBE], env=env, capture_output=True, text=True, check=True)
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        total = r['import_s'] + r['first_prediction_s']
+        print(f"{mode:>11} {r['import_s']:9.3f} {r['first_prediction_s']:11.3f} {total:8.3f} "
+              f"{(r['load_seconds'] or 0):13.3f}")
+
+if __name__ == "__main__":
+    main()
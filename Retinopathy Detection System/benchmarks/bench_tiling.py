@@ -0,0 +1,109 @@
+"""
+Peak memory and latency of tiled CV segmentation against the whole-image path.
+
+For each image size the CV stages (segmentation, lesion extraction, grading,
+annotation) run once on the whole image and once per tile size. Peak Python
+heap growth is measured with tracemalloc (NumPy and OpenCV's Python bindings
+allocate through it), with a fresh CVContext per run so scratch buffers are
+counted. Parity columns compare the tiled outputs with the whole-image ones:
+fraction of differing vessel-mask pixels, diagnosis agreement, lesion-count
+difference and mean best-IoU of annotation boxes. Tiles are CLAHE-equalised
+separately, so masks are close to but not byte-identical with the whole
+image; the run exits non-zero when a size/tile pair exceeds the tolerances.
+Tiling is forced here regardless of the model's minimum tiled image size.
+
+Usage (from the project root):
+    python -m benchmarks.bench_tiling --size 12MP 48MP --tile 512 1024 2048
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from retinopathy.context import CVContext
+from retinopathy.model import GRADE_MIN_AREA, RetinopathyModel
+from benchmarks.bench_working_size import mean_best_iou
+from benchmarks.synthetic import RESOLUTIONS, make_fundus
+
+SIZES = dict(RESOLUTIONS, **{"24MP": (5600, 4200), "48MP": (8000, 6000)})
+
+def run_cv(model, img):
+    """Whole-image or tiled CV stages with a fresh context. Returns (vessels, diagnosis, counts, annotations)."""
+    ctx = CVContext()
+    tiled = model._segment_tiled(img, ctx, keep_vessels=True) if model.tile_size else None
+    if tiled is None:
+        contrast_enhanced, vessels = model._segment_vessels(img, ctx)
+        lesions = model._extract_lesions(contrast_enhanced, vessels, 1.0, ctx)
+    else:
+        contrast_enhanced, (vessels, lesions) = None, tiled
+    diagnosis, _, _ = model._predict_cv(img, contrast_enhanced, vessels, lesions)
+    annotations = model._generate_cv_annotations(contrast_enhanced, vessels, lesions)
+    counts = {kind: int(np.count_nonzero(lesions[kind]["areas"] > GRADE_MIN_AREA)) for kind in lesions}
+    return vessels, diagnosis, counts, annotations
+
+def measure(model, img, repeat):
+    """(median ms, peak MB) of the CV stages without keeping the vessel mask, as predict() does when not saving."""
+    def once():
+        ctx = CVContext()
+        tiled = model._segment_tiled(img, ctx) if model.tile_size else None
+        if tiled is None:
+            contrast_enhanced, vessels = model._segment_vessels(img, ctx)
+            lesions = model._extract_lesions(contrast_enhanced, vessels, 1.0, ctx)
+        else:
+            contrast_enhanced, (vessels, lesions) = None, tiled
+        model._predict_cv(img, contrast_enhanced, vessels, lesions)
+        model._generate_cv_annotations(contrast_enhanced, vessels, lesions)
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        once()
+        times.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    once()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return float(np.median(times)), peak / 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark tiled CV processing for very large images')
+    parser.add_argument('--size', nargs='+', choices=list(SIZES), default=['12MP', '24MP', '48MP'])
+    parser.add_argument('--tile', type=int, nargs='+', default=[512, 1024, 2048], help='Tile sizes (px)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per configuration (median reported)')
+    parser.add_argument('--max-mask-diff', type=float, default=1e-4, help='Tolerated fraction of differing vessel pixels')
+    parser.add_argument('--max-count-diff', type=float, default=0.01,
+                        help='Tolerated lesion-count difference, as a fraction of the whole-image count')
+    args = parser.parse_args()
+
+    whole = RetinopathyModel(weights_path='')
+    tiled_models = [RetinopathyModel(weights_path='', tile_size=t, tile_min_pixels=0) for t in args.tile]
+    failures = []
+    print(f"{'size':>6} {'tile':>6} {'ms':>8} {'peak MB':>8} {'vs whole':>9} {'mask d':>8} {'dx':>4} "
+          f"{'hemo d':>7} {'exud d':>7} {'box IoU':>8}")
+    for label in args.size:
+        width, height = SIZES[label]
+        img = make_fundus(width, height)
+        base_ms, base_mb = measure(whole, img, args.repeat)
+        reference = run_cv(whole, img)
+        print(f"{label:>6} {'whole':>6} {base_ms:8.1f} {base_mb:8.1f} {'':>9}")
+        for model in tiled_models:
+            ms, mb = measure(model, img, args.repeat)
+            vessels, diagnosis, counts, annotations = run_cv(model, img)
+            mask_diff = np.count_nonzero(vessels != reference[0]) / vessels.size
+            same_dx = 'yes' if diagnosis == reference[1] else 'no'
+            hemo = counts["hemorrhage"] - reference[2]["hemorrhage"]
+            exud = counts["exudate"] - reference[2]["exudate"]
+            box_iou = mean_best_iou(reference[3], annotations)
+            print(f"{label:>6} {model.tile_size:6d} {ms:8.1f} {mb:8.1f} {mb / base_mb:8.0%} {mask_diff:8.1e} "
+                  f"{same_dx:>4} {hemo:+7d} {exud:+7d} {box_iou:8.2f}")
+            count_ok = all(abs(counts[kind] - reference[2][kind]) <= args.max_count_diff * max(reference[2][kind], 1)
+                           for kind in counts)
+            if mask_diff > args.max_mask_diff or not count_ok or diagnosis != reference[1]:
+                failures.append(f"{label}/{model.tile_size}")
+    if failures:
+        raise SystemExit(f"Tiled results outside tolerance: {', '.join(failures)}")
+
+if __name__ == "__main__":
+    main()
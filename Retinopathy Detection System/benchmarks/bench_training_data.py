@@ -0,0 +1,96 @@
+"""
+Epoch-time comparison of the ImageFolder input pipeline vs. the preprocessed memmap cache.
+
+Builds a small synthetic dataset (train/val, 5 classes) of full-size fundus PNGs,
+then times one pass over the train split for each pipeline. With --model the
+epoch includes a ResNet18 forward/backward pass; otherwise only input loading
+is measured.
+
+Usage (from the project root):
+    python -m benchmarks.bench_training_data --images-per-class 40 --workers 0 4
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import cv2
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader
+from torchvision import datasets, models, transforms
+
+from benchmarks.synthetic import make_fundus
+from train_dl import MemmapDataset, batch_transform, build_tensor_cache, NORM_MEAN, NORM_STD
+
+def make_dataset(root, images_per_class, width, height):
+    for phase, count in (('train', images_per_class), ('val', max(1, images_per_class // 4))):
+        for cls in range(5):
+            folder = os.path.join(root, phase, str(cls))
+            os.makedirs(folder, exist_ok=True)
+            for i in range(count):
+                img = make_fundus(width, height, seed=cls * 1000 + i, n_hemorrhages=cls * 10)
+                cv2.imwrite(os.path.join(folder, f'{i:05d}.png'), img)
+
+def time_epoch(loader, prepare, model=None):
+    optimizer = torch.optim.SGD(model.parameters(), lr=0.001) if model is not None else None
+    start = time.perf_counter()
+    images = 0
+    for inputs, labels in loader:
+        inputs = prepare(inputs)
+        if model is not None:
+            optimizer.zero_grad()
+            loss = nn.functional.cross_entropy(model(inputs), labels)
+            loss.backward()
+            optimizer.step()
+        images += inputs.size(0)
+    elapsed = time.perf_counter() - start
+    return elapsed, images / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark training input pipelines')
+    parser.add_argument('--images-per-class', type=int, default=40)
+    parser.add_argument('--width', type=int, default=2048)
+    parser.add_argument('--height', type=int, default=1536)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 4])
+    parser.add_argument('--model', action='store_true', help='Include ResNet18 forward/backward in the epoch')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp()
+    data_dir, cache_dir = os.path.join(root, 'data'), os.path.join(root, 'cache')
+    print(f"Generating synthetic dataset in {data_dir}...")
+    make_dataset(data_dir, args.images_per_class, args.width, args.height)
+
+    start = time.perf_counter()
+    build_tensor_cache(data_dir, cache_dir)
+    print(f"One-time cache build: {time.perf_counter() - start:.1f}s")
+
+    model = None
+    if args.model:
+        model = models.resnet18(pretrained=False)
+        model.fc = nn.Linear(model.fc.in_features, 5)
+
+    folder_tf = transforms.Compose([
+        transforms.Resize((224, 224)),
+        transforms.RandomHorizontalFlip(),
+        transforms.ToTensor(),
+        transforms.Normalize(NORM_MEAN, NORM_STD)
+    ])
+    cpu = torch.device('cpu')
+    print(f"{'pipeline':>12} {'workers':>8} {'epoch s':>8} {'img/s':>8}")
+    for workers in args.workers:
+        options = {'batch_size': args.batch_size, 'shuffle': True, 'num_workers': workers}
+        if workers > 0:
+            options.update(prefetch_factor=4, persistent_workers=True)
+
+        folder = datasets.ImageFolder(os.path.join(data_dir, 'train'), folder_tf)
+        elapsed, rate = time_epoch(DataLoader(folder, **options), lambda x: x, model)
+        print(f"{'imagefolder':>12} {workers:8d} {elapsed:8.2f} {rate:8.1f}")
+
+        memmap = MemmapDataset(cache_dir, 'train')
+        elapsed, rate = time_epoch(DataLoader(memmap, **options), lambda x: batch_transform(x, True, cpu), model)
+        print(f"{'memmap':>12} {workers:8d} {elapsed:8.2f} {rate:8.1f}")
+
+if __name__ == "__main__":
+    main()
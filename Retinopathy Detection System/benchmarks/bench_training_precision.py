@@ -0,0 +1,67 @@
+"""
+CPU training throughput of train_dl.run_epoch by precision and memory format.
+
+Trains ResNet18 for one epoch over synthetic uint8 NHWC batches (the memmap
+cache format, normalized with batch_transform) in each configuration:
+fp32 NCHW (the previous loop), channels_last, bf16 autocast, and both. Each
+configuration is timed at every --threads value. bf16 only pays off on CPUs
+with native bfloat16 support (AVX512-BF16 / AMX); elsewhere it may be slower.
+
+Usage (from the project root):
+    python -m benchmarks.bench_training_precision --images 256 --threads 4 8 --accumulation-steps 1 4
+"""
+import argparse
+import time
+
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader, TensorDataset
+from torchvision import models
+
+from train_dl import IMAGE_SIZE, batch_transform, run_epoch
+
+CONFIGS = {
+    'fp32': {'bf16': False, 'channels_last': False},
+    'channels_last': {'bf16': False, 'channels_last': True},
+    'bf16': {'bf16': True, 'channels_last': False},
+    'bf16+cl': {'bf16': True, 'channels_last': True},
+}
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark mixed-precision / channels-last CPU training')
+    parser.add_argument('--images', type=int, default=256)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--threads', type=int, nargs='+', default=[torch.get_num_threads()])
+    parser.add_argument('--accumulation-steps', type=int, nargs='+', default=[1])
+    parser.add_argument('--configs', nargs='+', choices=list(CONFIGS), default=list(CONFIGS))
+    args = parser.parse_args()
+
+    generator = torch.Generator().manual_seed(0)
+    images = torch.randint(0, 256, (args.images, IMAGE_SIZE, IMAGE_SIZE, 3), dtype=torch.uint8, generator=generator)
+    labels = torch.randint(0, 5, (args.images,), generator=generator)
+    loader = DataLoader(TensorDataset(images, labels), batch_size=args.batch_size, shuffle=True)
+    device = torch.device('cpu')
+    prepare = lambda inputs, phase: batch_transform(inputs, phase == 'train', device)
+
+    print(f"{'config':>14} {'threads':>8} {'accum':>6} {'img/s':>8} {'data s':>7} {'compute s':>10} {'speedup':>8}")
+    for threads in args.threads:
+        torch.set_num_threads(threads)
+        for steps in args.accumulation_steps:
+            baseline = None
+            for name in args.configs:
+                torch.manual_seed(0)
+                model = models.resnet18(pretrained=False)
+                model.fc = nn.Linear(model.fc.in_features, 5)
+                if CONFIGS[name]['channels_last']:
+                    model = model.to(memory_format=torch.channels_last)
+                optimizer = torch.optim.Adam(model.parameters(), lr=0.001)
+                start = time.perf_counter()
+                _, _, count, timings = run_epoch(model, loader, prepare, nn.CrossEntropyLoss(), optimizer, 'train',
+                                                 device, accumulation_steps=steps, **CONFIGS[name])
+                rate = count / (time.perf_counter() - start)
+                baseline = baseline or rate
+                print(f"{name:>14} {threads:8d} {steps:6d} {rate:8.1f} {timings['data']:7.2f} "
+                      f"{timings['compute']:10.2f} {rate / baseline:7.2f}x")
+
+if __name__ == "__main__":
+    main()
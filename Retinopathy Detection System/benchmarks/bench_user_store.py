@@ -0,0 +1,59 @@
+"""
+Login lookup latency of the CSV user store vs. the indexed SQLite store.
+
+Usage (from the project root):
+    python -m benchmarks.bench_user_store --sizes 1000 100000 1000000 --lookups 200
+"""
+import argparse
+import csv
+import os
+import random
+import tempfile
+import time
+
+from user_store import CsvUserStore, SqliteUserStore
+
+def write_users_csv(path, n_users):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['name', 'dob', 'password'])
+        for i in range(n_users):
+            writer.writerow([f"user{i:07d}", "1990-01-01", f"pw{i}"])
+
+def time_lookups(store, names):
+    latencies = []
+    for name in names:
+        start = time.perf_counter()
+        store.get(name)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99) - 1]
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark login latency per user-store backend')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000])
+    parser.add_argument('--lookups', type=int, default=200)
+    parser.add_argument('--csv-lookups', type=int, default=20, help='CSV scans are slow; fewer samples')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    rng = random.Random(0)
+    print(f"{'users':>9} {'backend':>8} {'p50 ms':>9} {'p99 ms':>9} {'import s':>9}")
+    for n in args.sizes:
+        csv_path = os.path.join(workdir, f"users_{n}.csv")
+        write_users_csv(csv_path, n)
+        names = [f"user{rng.randrange(n):07d}" for _ in range(args.lookups)]
+
+        p50, p99 = time_lookups(CsvUserStore(csv_path), names[:args.csv_lookups])
+        print(f"{n:9d} {'csv':>8} {p50:9.3f} {p99:9.3f} {'-':>9}")
+
+        store = SqliteUserStore(os.path.join(workdir, f"users_{n}.db"))
+        start = time.perf_counter()
+        store.import_csv(csv_path)
+        import_s = time.perf_counter() - start
+        p50, p99 = time_lookups(store, names)
+        print(f"{n:9d} {'sqlite':>8} {p50:9.3f} {p99:9.3f} {import_s:9.2f}")
+        store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Speedup and accuracy drift of the resolution-adaptive CV pipeline.
+
+For each working size the CV stages (resize, segmentation, lesion extraction,
+grading, annotation and optional ROI refinement) are timed against the
+native-resolution run, and the outputs are compared with it: diagnosis
+agreement, lesion-count drift and mean best-IoU of annotation boxes.
+
+Usage (from the project root):
+    python -m benchmarks.bench_working_size --size 12MP --working 2048 1536 1024 768 512
+"""
+import argparse
+import time
+
+import numpy as np
+
+from retinopathy.model import RetinopathyModel
+from benchmarks.synthetic import RESOLUTIONS, make_fundus
+
+def run_cv(model, img):
+    start = time.perf_counter()
+    work_img, scale = model._working_image(img)
+    contrast_enhanced, vessels = model._segment_vessels(work_img, scale=scale)
+    lesions = model._extract_lesions(contrast_enhanced, vessels, scale)
+    diagnosis, _, _ = model._predict_cv(img, contrast_enhanced, vessels, lesions)
+    annotations = model._generate_cv_annotations(contrast_enhanced, vessels, lesions)
+    if model.refine_rois and scale > 1:
+        annotations = model._refine_annotations(img, annotations)
+    elapsed = (time.perf_counter() - start) * 1000
+    counts = {kind: sum(1 for a in lesions[kind]["areas"] if a > 5) for kind in lesions}
+    return elapsed, diagnosis, counts, annotations
+
+def iou(a, b):
+    x0, y0 = max(a["x"], b["x"]), max(a["y"], b["y"])
+    x1 = min(a["x"] + a["w"], b["x"] + b["w"])
+    y1 = min(a["y"] + a["h"], b["y"] + b["h"])
+    inter = max(0, x1 - x0) * max(0, y1 - y0)
+    union = a["w"] * a["h"] + b["w"] * b["h"] - inter
+    return inter / union if union else 0.0
+
+def mean_best_iou(reference, candidate):
+    if not reference:
+        return 1.0 if not candidate else 0.0
+    scores = []
+    for ref in reference:
+        same = [c for c in candidate if c["label"] == ref["label"]]
+        scores.append(max((iou(ref, c) for c in same), default=0.0))
+    return float(np.mean(scores))
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark working-resolution CV processing')
+    parser.add_argument('--size', choices=list(RESOLUTIONS), default='12MP')
+    parser.add_argument('--working', type=int, nargs='+', default=[2048, 1536, 1024, 768, 512])
+    parser.add_argument('--images', type=int, default=3, help='Synthetic images (different seeds)')
+    parser.add_argument('--refine', action='store_true', help='Refine lesion ROIs at full resolution')
+    args = parser.parse_args()
+
+    width, height = RESOLUTIONS[args.size]
+    images = [make_fundus(width, height, seed=s) for s in range(args.images)]
+    native = RetinopathyModel(weights_path='')
+    reference = [run_cv(native, img) for img in images]
+    base_ms = np.mean([r[0] for r in reference])
+
+    print(f"{args.size} ({width}x{height}), native CV: {base_ms:.1f} ms/image")
+    print(f"{'working':>8} {'ms':>8} {'speedup':>8} {'dx agree':>9} {'hemo drift':>11} {'exud drift':>11} {'box IoU':>8}")
+    for size in args.working:
+        model = RetinopathyModel(weights_path='', working_size=size, refine_rois=args.refine)
+        runs = [run_cv(model, img) for img in images]
+        ms = np.mean([r[0] for r in runs])
+        agree = np.mean([r[1] == ref[1] for r, ref in zip(runs, reference)])
+        hemo = np.mean([r[2]["hemorrhage"] - ref[2]["hemorrhage"] for r, ref in zip(runs, reference)])
+        exud = np.mean([r[2]["exudate"] - ref[2]["exudate"] for r, ref in zip(runs, reference)])
+        box_iou = np.mean([mean_best_iou(ref[3], r[3]) for r, ref in zip(runs, reference)])
+        print(f"{size:8d} {ms:8.1f} {base_ms / ms:7.1f}x {agree:9.0%} {hemo:+11.1f} {exud:+11.1f} {box_iou:8.2f}")
+
+if __name__ == "__main__":
+    main()
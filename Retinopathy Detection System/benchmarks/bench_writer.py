@@ -0,0 +1,67 @@
+"""
+Request latency of RetinopathyModel.predict with inline mask writes vs. the ArtifactWriter.
+
+The writer threads encode masks concurrently with the next request, so they
+only help when the machine has cores to spare for them.
+
+Usage (from the project root):
+    python -m benchmarks.bench_writer --size 6MP --requests 20 --workers 2
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from retinopathy.artifacts import ArtifactWriter
+from retinopathy.model import RetinopathyModel
+from benchmarks.synthetic import RESOLUTIONS, encode, make_fundus
+
+def run(model, data, output_dir, requests):
+    latencies = []
+    for i in range(requests):
+        start = time.perf_counter()
+        model.predict(data, filename=f"bench_{i}.png", output_dir=output_dir)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the background artifact writer')
+    parser.add_argument('--size', choices=list(RESOLUTIONS), default='6MP')
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=2, help='Writer threads (0 = inline through the writer)')
+    args = parser.parse_args()
+
+    width, height = RESOLUTIONS[args.size]
+    data = encode(make_fundus(width, height))
+    model = RetinopathyModel(weights_path='')
+    output_dir = tempfile.mkdtemp()
+
+    configs = [("inline", None)]
+    for fmt, level in (("png", 1), ("png", 3), ("png", 9), ("webp", 80), ("webp", 101)):
+        configs.append((f"{fmt}:{level}", (fmt, level)))
+
+    print(f"{args.size} ({width}x{height}), {args.requests} requests, {args.workers} writer thread(s), "
+          f"{os.cpu_count()} CPU(s)")
+    print(f"{'writer':>10} {'p50 ms':>8} {'p99 ms':>8} {'drain ms':>9} {'avg write ms':>13} {'mask KB':>8}")
+    for name, config in configs:
+        writer = None
+        if config is not None:
+            writer = ArtifactWriter(workers=args.workers, max_queue=64, image_format=config[0], compression=config[1])
+        model.writer = writer
+        latencies = run(model, data, output_dir, args.requests)
+
+        drain_start = time.perf_counter()
+        if writer is not None:
+            writer.shutdown(wait=True)
+        drain_ms = (time.perf_counter() - drain_start) * 1000
+
+        ext = config[0] if config else "png"
+        size_kb = os.path.getsize(os.path.join(output_dir, f"segmented_bench_0.{ext}")) / 1024
+        avg_write = writer.stats()["avg_write_ms"] if writer else float('nan')
+        print(f"{name:>10} {np.percentile(latencies, 50):8.1f} {np.percentile(latencies, 99):8.1f} "
+              f"{drain_ms:9.1f} {avg_write:13.1f} {size_kb:8.0f}")
+
+if __name__ == "__main__":
+    main()
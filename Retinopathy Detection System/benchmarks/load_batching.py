@@ -0,0 +1,86 @@
+"""
+Concurrent load test of the DL stage: per-request forward passes vs. the dynamic batcher.
+
+Usage (from the project root):
+    python -m benchmarks.load_batching --clients 16 --requests 400 --max-batch 8 --max-wait-ms 5
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+from torchvision import models
+
+from retinopathy.model import RetinopathyModel
+
+def load_model(weights_path):
+    """Loads the DL model, creating random ResNet18 weights if none are trained yet."""
+    if not os.path.exists(weights_path):
+        net = models.resnet18(pretrained=False)
+        net.fc = nn.Linear(net.fc.in_features, 5)
+        weights_path = os.path.join(tempfile.mkdtemp(), 'random_resnet18.pth')
+        torch.save(net.state_dict(), weights_path)
+    model = RetinopathyModel(weights_path, engine='eager')
+    if not model.dl_active:
+        raise SystemExit("DL model could not be activated (torch/torchvision missing?)")
+    return model
+
+def run_load(model, clients, total_requests):
+    """Fires `total_requests` single-image classifications from `clients` threads."""
+    input_tensor = torch.randn(1, 3, 224, 224)
+    latencies = []
+    lock = threading.Lock()
+    per_client = total_requests // clients
+
+    def client():
+        local = []
+        for _ in range(per_client):
+            start = time.perf_counter()
+            model._classify(input_tensor)
+            local.append((time.perf_counter() - start) * 1000)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return {
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test DL micro-batching')
+    parser.add_argument('--weights', type=str, default='retinopathy_model.pth')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--max-batch', type=int, default=8)
+    parser.add_argument('--max-wait-ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    model = load_model(args.weights)
+    model._classify(torch.randn(1, 3, 224, 224))  # warm-up
+
+    baseline = run_load(model, args.clients, args.requests)
+    batcher = model.enable_batching(max_batch_size=args.max_batch, max_wait_ms=args.max_wait_ms)
+    batched = run_load(model, args.clients, args.requests)
+    batcher.stop()
+
+    print(f"{'mode':>12} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, r in (("per-request", baseline), ("batched", batched)):
+        print(f"{name:>12} {r['throughput']:8.1f} {r['p50_ms']:8.1f} {r['p99_ms']:8.1f}")
+    stats = batcher.stats()
+    print(f"Batches: {stats['batches']}, avg size {stats['avg_batch_size']:.2f}, "
+          f"max queue depth {stats['max_queue_depth']}, sizes {stats['batch_size_histogram']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""
+Benchmark suite for the retinopathy and diabetes pipelines with JSON output
+and regression checks.
+
+Sections:
+    stages    per-stage timings of RetinopathyModel.predict (from its stage
+              metrics) and RetinopathyModel._predict_cv, per image resolution
+    http      end-to-end load test of the Flask app through its test client
+              (concurrent /api/retinopathy/predict and /api/predict requests)
+    training  main.train_model wall time on synthetic PIMA rows
+
+Every result is a named metric with a unit and a direction. Against a
+--baseline file, a metric regresses when it is worse than the baseline by
+more than --tolerance (relative), or the per-metric value in the baseline's
+"thresholds" map; the process then exits with status 1.
+
+Usage (from the project root):
+    python -m benchmarks.suite --output bench.json
+    python -m benchmarks.suite --output bench.json --baseline baseline.json --tolerance 0.15
+    python -m benchmarks.suite --sections stages --sizes 1MP 12MP --repeat 10
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import RESOLUTIONS, encode, make_fundus, make_pima_rows
+
+def metric(value, unit, better='lower'):
+    return {"value": float(value), "unit": unit, "better": better}
+
+def bench_stages(sizes, repeat, weights_path):
+    """Mean per-stage milliseconds of predict() on encoded uploads, plus _predict_cv alone."""
+    from retinopathy.metrics import MetricsRegistry
+    from retinopathy.model import RetinopathyModel
+
+    model = RetinopathyModel(weights_path)
+    results = {}
+    for size in sizes:
+        width, height = RESOLUTIONS[size]
+        img = make_fundus(width, height)
+        data = encode(img)
+        model.predict(data)  # warm-up (pool buffers, DL kernels)
+
+        registry = MetricsRegistry()
+        model.enable_metrics(registry)
+        for _ in range(repeat):
+            model.predict(data)
+        model.metrics = None
+
+        total = registry.snapshot("retinopathy_predict_seconds")[()]
+        results[f"retinopathy.predict.{size}.ms"] = metric(total["sum"] / total["count"] * 1000, "ms")
+        for labels, stats in sorted(registry.snapshot("retinopathy_stage_seconds").items()):
+            stage = dict(labels)["stage"]
+            results[f"retinopathy.stage.{size}.{stage}.ms"] = metric(stats["sum"] / stats["count"] * 1000, "ms")
+
+        # CV grading on its own, given the segmentation it consumes
+        work_img, scale = model._working_image(img)
+        contrast_enhanced, vessels = model._segment_vessels(work_img, scale=scale)
+        lesions = model._extract_lesions(contrast_enhanced, vessels, scale)
+        # predict_cv: grading including its own lesion extraction; predict_cv_with_lesions: given the lesions
+        start = time.perf_counter()
+        for _ in range(repeat):
+            model._predict_cv(img, contrast_enhanced, vessels)
+        results[f"retinopathy.predict_cv.{size}.ms"] = metric((time.perf_counter() - start) / repeat * 1000, "ms")
+        start = time.perf_counter()
+        for _ in range(repeat):
+            model._predict_cv(img, contrast_enhanced, vessels, lesions)
+        results[f"retinopathy.predict_cv_with_lesions.{size}.ms"] = metric(
+            (time.perf_counter() - start) / repeat * 1000, "ms")
+        print(f"stages {size}: {results[f'retinopathy.predict.{size}.ms']['value']:.1f} ms/predict")
+    return results
+
+def _run_clients(clients, requests, send):
+    """Calls send(client, i) `requests` times across `clients` threads. Returns (latencies ms, errors, seconds)."""
+    import app
+
+    latencies, errors = [], []
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker():
+        client = app.app.test_client()
+        local, failed = [], 0
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            start = time.perf_counter()
+            status = send(client, i)
+            local.append((time.perf_counter() - start) * 1000)
+            failed += status != 200
+        with lock:
+            latencies.extend(local)
+            errors.append(failed)
+
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, sum(errors), time.perf_counter() - start
+
+def bench_http(clients, requests, size):
+    """Concurrent requests through Flask's test client (full routing, parsing, caching and serialization)."""
+    # Configure the app before it is imported: synchronous model load, nothing persisted
+    os.environ.setdefault('STARTUP_MODE', 'eager')
+    os.environ.setdefault('SAVE_UPLOADS', '0')
+    import app
+
+    width, height = RESOLUTIONS[size]
+    base = make_fundus(width, height)
+    uploads = []
+    for i in range(requests):
+        # Distinct bytes per request so the result cache never short-circuits the pipeline
+        img = base.copy()
+        img[0, 0, 0] = i % 256
+        img[0, 1, 0] = i // 256 % 256
+        uploads.append(encode(img))
+
+    def send_image(client, i):
+        resp = client.post('/api/retinopathy/predict', data={'file': (io.BytesIO(uploads[i]), f'bench_{i}.png')},
+                           content_type='multipart/form-data')
+        return resp.status_code
+
+    rows = make_pima_rows(requests * 10, seed=1).drop(columns='Outcome').to_numpy()
+    keys = app.FEATURE_KEYS
+
+    def send_patient(client, i):
+        return client.post('/api/predict', json=dict(zip(keys, map(float, rows[i])))).status_code
+
+    results = {}
+    for name, send, n in (("retinopathy", send_image, requests), ("diabetes", send_patient, requests * 10)):
+        latencies, errors, seconds = _run_clients(clients, n, send)
+        results[f"http.{name}.p50.ms"] = metric(np.percentile(latencies, 50), "ms")
+        results[f"http.{name}.p99.ms"] = metric(np.percentile(latencies, 99), "ms")
+        results[f"http.{name}.throughput"] = metric(len(latencies) / seconds, "req/s", better='higher')
+        results[f"http.{name}.errors"] = metric(errors, "requests")
+        print(f"http {name}: {len(latencies) / seconds:.1f} req/s, {errors} errors")
+    return results
+
+def bench_training(row_counts):
+    """main.train_model on synthetic data written to a temporary directory."""
+    import main
+
+    results = {}
+    for n_rows in row_counts:
+        folder = tempfile.mkdtemp()
+        data_path = os.path.join(folder, 'diabetes.csv')
+        make_pima_rows(n_rows).to_csv(data_path, index=False)
+        start = time.perf_counter()
+        main.train_model(data_path, os.path.join(folder, 'model.pkl'), os.path.join(folder, 'forest.npz'))
+        results[f"training.rows_{n_rows}.s"] = metric(time.perf_counter() - start, "s")
+        print(f"training {n_rows} rows: {results[f'training.rows_{n_rows}.s']['value']:.2f} s")
+    return results
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "commit": commit or None,
+    }
+
+def compare(results, baseline, tolerance):
+    """Returns [(name, baseline value, current value, relative change)] for regressed metrics."""
+    thresholds = baseline.get("thresholds", {})
+    regressions = []
+    for name, base in baseline.get("results", {}).items():
+        current = results.get(name)
+        if current is None or base["value"] == 0:
+            continue
+        change = (current["value"] - base["value"]) / abs(base["value"])
+        worse = change if base.get("better", 'lower') == 'lower' else -change
+        if worse > thresholds.get(name, tolerance):
+            regressions.append((name, base["value"], current["value"], change))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the benchmark suite')
+    parser.add_argument('--sections', nargs='+', choices=['stages', 'http', 'training'],
+                        default=['stages', 'http', 'training'])
+    parser.add_argument('--sizes', nargs='+', choices=list(RESOLUTIONS), default=['1MP', '3MP', '12MP'])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--weights', type=str, default='retinopathy_model.pth')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=64, help='Image requests in the HTTP load test')
+    parser.add_argument('--http-size', choices=list(RESOLUTIONS), default='1MP')
+    parser.add_argument('--train-rows', type=int, nargs='+', default=[768, 10000])
+    parser.add_argument('--output', type=str, default='benchmark_results.json')
+    parser.add_argument('--baseline', type=str, default=None, help='Previous results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative slowdown')
+    args = parser.parse_args()
+
+    results = {}
+    if 'stages' in args.sections:
+        results.update(bench_stages(args.sizes, args.repeat, args.weights))
+    if 'http' in args.sections:
+        results.update(bench_http(args.clients, args.requests, args.http_size))
+    if 'training' in args.sections:
+        results.update(bench_training(args.train_rows))
+
+    report = {"environment": environment(), "results": results}
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        report["regressions"] = [{"metric": name, "baseline": base, "current": current, "change": change}
+                                 for name, base, current, change in regressions]
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"\n{len(results)} metrics written to {args.output}")
+    for name, base, current, change in regressions:
+        print(f"REGRESSION {name}: {base:.3f} -> {current:.3f} ({change:+.1%})")
+    if regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import cv2
+import numpy as np
+
+# Common fundus camera resolutions (width, height) from ~1 MP to ~12 MP
+RESOLUTIONS = {
+    "1MP": (1152, 864),
+    "3MP": (2048, 1536),
+    "6MP": (2816, 2112),
+    "12MP": (4000, 3000),
+}
+
+def make_fundus(width, height, seed=0, n_hemorrhages=40, n_exudates=25):
+    """Draws a synthetic fundus-like BGR image with vessels, dark lesions and exudates."""
+    rng = np.random.RandomState(seed)
+    img = np.zeros((height, width, 3), np.uint8)
+    center = (width // 2, height // 2)
+    radius = int(min(width, height) * 0.47)
+
+    # Retina disc (orange/red background with a little texture)
+    cv2.circle(img, center, radius, (40, 90, 170), -1)
+    noise = rng.randint(0, 25, (height, width, 1)).astype(np.uint8)
+    img = cv2.add(img, np.repeat(noise, 3, axis=2))
+
+    # Optic disc
+    disc = (int(width * 0.68), height // 2)
+    cv2.circle(img, disc, max(4, radius // 7), (150, 230, 250), -1)
+
+    # Vessels radiating from the optic disc
+    scale = max(1, min(width, height) // 600)
+    for _ in range(14):
+        pts = [disc]
+        angle = rng.uniform(0, 2 * np.pi)
+        for _ in range(8):
+            angle += rng.uniform(-0.4, 0.4)
+            step = rng.uniform(0.08, 0.14) * radius
+            x, y = pts[-1]
+            pts.append((int(x + step * np.cos(angle)), int(y + step * np.sin(angle))))
+        cv2.polylines(img, [np.array(pts, np.int32)], False, (20, 40, 110), 2 * scale)
+
+    # Hemorrhages / microaneurysms (very dark spots)
+    for _ in range(n_hemorrhages):
+        r = int(rng.uniform(0.3, 0.85) * radius)
+        a = rng.uniform(0, 2 * np.pi)
+        pt = (int(center[0] + r * np.cos(a)), int(center[1] + r * np.sin(a)))
+        cv2.circle(img, pt, int(rng.randint(2, 7) * scale), (0, 0, 5), -1)
+
+    # Hard exudates (bright yellow spots)
+    for _ in range(n_exudates):
+        r = int(rng.uniform(0.2, 0.8) * radius)
+        a = rng.uniform(0, 2 * np.pi)
+        pt = (int(center[0] + r * np.cos(a)), int(center[1] + r * np.sin(a)))
+        cv2.circle(img, pt, int(rng.randint(2, 6) * scale), (120, 255, 255), -1)
+
+    return img
+
+def encode(img, ext=".png"):
+    """Encodes an image the way it would arrive as an upload."""
+    ok, buf = cv2.imencode(ext, img)
+    if not ok:
+        raise ValueError(f"Could not encode image as {ext}")
+    return buf.tobytes()
+
+def make_pima_rows(n_rows, seed=42):
+    """Synthetic PIMA rows (DataFrame with Outcome) from main.create_mock_data, without writing diabetes.csv."""
+    from main import create_mock_data
+    return create_mock_data(n_samples=n_rows, seed=seed, path=None)
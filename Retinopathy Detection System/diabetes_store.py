@@ -0,0 +1,129 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from model_registry import ModelRegistry
+
+FEATURE_COLUMNS = ['Pregnancies', 'Glucose', 'BloodPressure', 'SkinThickness',
+                   'Insulin', 'BMI', 'DiabetesPedigreeFunction', 'Age']
+LABEL_COLUMN = 'Outcome'
+
+def _atomic_write(path, write):
+    """Calls write(tmp_path), then renames the finished file over `path`."""
+    tmp_path = f"{path}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+class PartitionStore:
+    """
+    Append-only columnar store of labelled diabetes records. Every append is
+    one immutable partition (part-000001.npz, ...) holding a float32 array
+    per feature column plus the int8 outcome, so training can read just the
+    partitions it has not seen yet.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def partitions(self):
+        return sorted(f[:-4] for f in os.listdir(self.root) if f.startswith('part-') and f.endswith('.npz'))
+
+    def append(self, df):
+        """Writes the rows of a DataFrame with FEATURE_COLUMNS and Outcome as a new partition. Returns its name."""
+        missing = [c for c in FEATURE_COLUMNS + [LABEL_COLUMN] if c not in df.columns]
+        if missing:
+            raise ValueError(f"Records are missing columns: {missing}")
+        parts = self.partitions()
+        name = f"part-{int(parts[-1][5:]) + 1 if parts else 1:06d}"
+        columns = {c: df[c].to_numpy(np.float32) for c in FEATURE_COLUMNS}
+        columns[LABEL_COLUMN] = df[LABEL_COLUMN].to_numpy(np.int8)
+
+        def write(tmp_path):
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, **columns)
+
+        _atomic_write(os.path.join(self.root, f"{name}.npz"), write)
+        return name
+
+    def import_csv(self, path, chunk_rows=1_000_000):
+        """Appends a CSV in partitions of at most `chunk_rows` rows. Returns the new partition names."""
+        import pandas as pd
+        return [self.append(chunk) for chunk in pd.read_csv(path, chunksize=chunk_rows)]
+
+    def rows(self, partitions=None):
+        total = 0
+        for name in self.partitions() if partitions is None else partitions:
+            with np.load(os.path.join(self.root, f"{name}.npz")) as part:
+                total += len(part[LABEL_COLUMN])
+        return total
+
+    def load(self, partitions=None):
+        """Returns (X float32 (n, 8), y int8) for the given partitions (default: all)."""
+        names = self.partitions() if partitions is None else list(partitions)
+        if not names:
+            return np.empty((0, len(FEATURE_COLUMNS)), np.float32), np.empty(0, np.int8)
+        n_rows = self.rows(names)
+        # Fill one preallocated matrix instead of concatenating per-partition copies
+        X = np.empty((n_rows, len(FEATURE_COLUMNS)), np.float32)
+        y = np.empty(n_rows, np.int8)
+        start = 0
+        for name in names:
+            with np.load(os.path.join(self.root, f"{name}.npz")) as part:
+                count = len(part[LABEL_COLUMN])
+                for j, column in enumerate(FEATURE_COLUMNS):
+                    X[start:start + count, j] = part[column]
+                y[start:start + count] = part[LABEL_COLUMN]
+            start += count
+        return X, y
+
+class ModelVersions(ModelRegistry):
+    """
+    Numbered diabetes model versions: each is a pickle plus its compiled
+    forest export, checksummed in the version manifest. CURRENT.json is only
+    switched after both files are complete, so app.py never loads a
+    half-written model.
+    """
+
+    def current(self):
+        """Manifest of the live version (with model_path/compiled_path), or None."""
+        info = super().current()
+        if info is not None:
+            info["model_path"] = info["paths"]["model"]
+            info["compiled_path"] = info["paths"]["compiled"]
+        return info
+
+    def publish_model(self, model, **metadata):
+        """
+        Writes `model` as the next version and makes it current. `metadata`
+        (e.g. the partitions it was trained on) is stored in the manifest.
+        Returns the manifest.
+        """
+        import joblib
+        from forest import export_forest
+
+        staging = tempfile.mkdtemp(dir=self.root)
+        try:
+            model_path = os.path.join(staging, 'diabetes_model.pkl')
+            compiled_path = os.path.join(staging, 'diabetes_model_forest.npz')
+            joblib.dump(model, model_path)
+            # np.savez appends .npz to bare paths; hand it an open file instead
+            with open(compiled_path, 'wb') as f:
+                export_forest(model, f)
+            self.publish({"model": model_path, "compiled": compiled_path}, move=True,
+                         n_estimators=len(model.estimators_), **metadata)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        return self.current()
+
+    def export_current(self, model_path, compiled_path):
+        """Atomically copies the live version to the fixed paths older tooling reads."""
+        info = self.current()
+        if info is None:
+            return None
+        for src, dst in ((info["model_path"], model_path), (info["compiled_path"], compiled_path)):
+            _atomic_write(dst, lambda tmp, src=src: shutil.copyfile(src, tmp))
+        return info
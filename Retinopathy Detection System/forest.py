@@ -0,0 +1,149 @@
+import importlib.util
+
+import numpy as np
+
+# Optional JIT support for the row-parallel evaluator (numba is imported on first use)
+NUMBA_SUPPORT = importlib.util.find_spec('numba') is not None
+
+TREE_LEAF = -1
+# Without numba the level-by-level NumPy traversal only beats sklearn on small inputs;
+# larger batches go to the sklearn estimator when one is attached (see CompiledForest.fallback)
+FALLBACK_ROWS = 512
+
+def export_forest(model, path):
+    """
+    Flattens a fitted sklearn RandomForestClassifier into contiguous NumPy arrays
+    (all trees concatenated, child indices made global) and saves them as .npz.
+    """
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        if tree.n_outputs != 1:
+            raise ValueError("Only single-output forests can be compiled")
+        left = tree.children_left.astype(np.int32)
+        right = tree.children_right.astype(np.int32)
+        is_leaf = left == TREE_LEAF
+
+        # Same per-leaf normalization sklearn applies in DecisionTreeClassifier.predict_proba
+        value = tree.value[:, 0, :].astype(np.float64)
+        normalizer = value.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        value = value / normalizer
+
+        roots.append(offset)
+        features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+        thresholds.append(tree.threshold.astype(np.float64))
+        lefts.append(np.where(is_leaf, TREE_LEAF, left + offset).astype(np.int32))
+        rights.append(np.where(is_leaf, TREE_LEAF, right + offset).astype(np.int32))
+        values.append(value)
+        max_depth = max(max_depth, tree.max_depth)
+        offset += tree.node_count
+
+    np.savez(
+        path,
+        feature=np.concatenate(features),
+        threshold=np.concatenate(thresholds),
+        left=np.concatenate(lefts),
+        right=np.concatenate(rights),
+        value=np.concatenate(values),
+        roots=np.array(roots, np.int32),
+        classes=np.asarray(model.classes_),
+        max_depth=np.array(max_depth, np.int32),
+        n_features=np.array(model.n_features_in_, np.int32),
+    )
+    return path
+
+_numba_kernel = None
+
+def _get_numba_kernel():
+    """Compiles the row-parallel traversal kernel on first use."""
+    global _numba_kernel
+    if _numba_kernel is None:
+        from numba import njit, prange
+
+        @njit(parallel=True)
+        def kernel(X, feature, threshold, left, right, value, roots):
+            n_rows = X.shape[0]
+            out = np.zeros((n_rows, value.shape[1]))
+            for i in prange(n_rows):
+                for t in range(roots.shape[0]):
+                    node = roots[t]
+                    while left[node] != TREE_LEAF:
+                        if X[i, feature[node]] <= threshold[node]:
+                            node = left[node]
+                        else:
+                            node = right[node]
+                    out[i] += value[node]
+            return out / roots.shape[0]
+
+        _numba_kernel = kernel
+    return _numba_kernel
+
+class CompiledForest:
+    """
+    Array-based evaluator for an exported random forest. Drop-in for the
+    predict/predict_proba/classes_ surface app.py uses, with identical
+    probabilities to sklearn (same float32 inputs, same tree summation order).
+    Without numba, batches above `fallback_rows` are scored by `fallback`
+    (the sklearn model the forest was exported from) when it is set.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, classes, max_depth, n_features, use_numba=True,
+                 fallback=None, fallback_rows=FALLBACK_ROWS):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.classes_ = classes
+        self.max_depth = int(max_depth)
+        self.n_features_in_ = int(n_features)
+        self.n_estimators = len(roots)
+        self.use_numba = use_numba and NUMBA_SUPPORT
+        self.fallback = fallback
+        self.fallback_rows = fallback_rows
+
+    @classmethod
+    def load(cls, path, use_numba=True, fallback=None):
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls(**{name: arrays[name] for name in arrays.files}, use_numba=use_numba, fallback=fallback)
+
+    def predict_proba(self, X, chunk_size=8192):
+        # sklearn trees compare float32 features against float64 thresholds
+        X = np.ascontiguousarray(np.asarray(X, dtype=np.float32))
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {X.shape[1]} features, but the forest expects {self.n_features_in_}")
+        if self.use_numba:
+            return _get_numba_kernel()(X, self.feature, self.threshold, self.left, self.right, self.value, self.roots)
+        if self.fallback is not None and len(X) > self.fallback_rows:
+            return self.fallback.predict_proba(X)
+        if len(X) <= chunk_size:
+            return self._predict_proba_numpy(X)
+        return np.concatenate([self._predict_proba_numpy(X[start:start + chunk_size])
+                               for start in range(0, len(X), chunk_size)])
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    def _predict_proba_numpy(self, X):
+        """Advances every (tree, row) pair one level per step until all reach a leaf."""
+        rows = np.arange(len(X))
+        nodes = np.repeat(self.roots[:, np.newaxis], len(X), axis=1)
+        for _ in range(self.max_depth):
+            left = self.left[nodes]
+            active = left != TREE_LEAF
+            if not active.any():
+                break
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(active, np.where(go_left, left, self.right[nodes]), nodes)
+
+        # Accumulate tree by tree, in estimator order, as sklearn does
+        proba = np.zeros((len(X), self.value.shape[1]))
+        for tree_nodes in nodes:
+            proba += self.value[tree_nodes]
+        return proba / self.n_estimators
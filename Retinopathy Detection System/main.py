@@ -3,6 +3,7 @@ import pandas as pd
 import numpy as np
 import os
 import joblib
+from diabetes_store import ModelVersions, PartitionStore
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import accuracy_score, classification_report
@@ -11,14 +12,21 @@ from sklearn.metrics import accuracy_score, classification_report
 DATA_PATH = 'diabetes.csv'
 MODEL_DIR = os.path.join('Two classes', 'models')
 MODEL_PATH = os.path.join(MODEL_DIR, 'diabetes_model.pkl')
+# Flattened array export of the forest, evaluated by forest.CompiledForest
+COMPILED_MODEL_PATH = os.path.join(MODEL_DIR, 'diabetes_model_forest.npz')
+# Numbered model versions (CURRENT.json names the live one; app.py hot-swaps on change)
+VERSIONS_DIR = os.path.join(MODEL_DIR, 'versions')
+# Columnar partition store of labelled records used by incremental training
+STORE_DIR = 'diabetes_store'
 
 os.makedirs(MODEL_DIR, exist_ok=True)
 
-def create_mock_data():
-    """Creates a synthetic PIMA Diabetes dataset with realistic distributions."""
-    print("Dataset not found. Generating synthetic PIMA-like data...")
-    np.random.seed(42)
-    n_samples = 768
+def create_mock_data(n_samples=768, seed=42, path=DATA_PATH):
+    """
+    Creates a synthetic PIMA Diabetes dataset with realistic distributions.
+    Saved to `path` unless it is None (benchmarks generate rows without touching diabetes.csv).
+    """
+    np.random.seed(seed)
     
     # Generate balanced features with some correlation to outcome
     # Lower glucose/BMI = lower risk
@@ -52,17 +60,19 @@ def create_mock_data():
     }
     
     df = pd.DataFrame(data)
-    df.to_csv(DATA_PATH, index=False)
-    print(f"Synthetic data saved to {DATA_PATH}")
+    if path is not None:
+        df.to_csv(path, index=False)
+        print(f"Synthetic data saved to {path}")
     return df
 
-def train_model():
-    """Loads data, trains a model, and saves it."""
-    if not os.path.exists(DATA_PATH):
-        df = create_mock_data()
+def train_model(data_path=DATA_PATH, model_path=MODEL_PATH, compiled_path=COMPILED_MODEL_PATH):
+    """Loads data, trains a model from scratch, and publishes it as a new version."""
+    if not os.path.exists(data_path):
+        print("Dataset not found. Generating synthetic PIMA-like data...")
+        df = create_mock_data(path=data_path)
     else:
-        print(f"Loading data from {DATA_PATH}...")
-        df = pd.read_csv(DATA_PATH)
+        print(f"Loading data from {data_path}...")
+        df = pd.read_csv(data_path)
     
     X = df.drop('Outcome', axis=1)
     y = df['Outcome']
@@ -70,7 +80,7 @@ def train_model():
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
     
     print("Training Random Forest Classifier...")
-    model = RandomForestClassifier(n_estimators=100, random_state=42)
+    model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1)
     model.fit(X_train, y_train)
     
     y_pred = model.predict(X_test)
@@ -80,8 +90,70 @@ def train_model():
     print("Classification Report:")
     print(classification_report(y_test, y_pred))
     
-    joblib.dump(model, MODEL_PATH)
-    print(f"Model saved to {MODEL_PATH}")
+    publish_model(model, model_path, compiled_path, mode='full')
+    return model
+
+def publish_model(model, model_path=MODEL_PATH, compiled_path=COMPILED_MODEL_PATH, **metadata):
+    """Writes `model` as the next version (atomically) and mirrors it to the fixed model paths."""
+    # Serve single rows without spinning up a thread pool per prediction
+    model.set_params(n_jobs=None, warm_start=False)
+    versions = ModelVersions(os.path.join(os.path.dirname(model_path), 'versions'))
+    info = versions.publish_model(model, **metadata)
+    versions.export_current(model_path, compiled_path)
+    print(f"Model version {info['version']} ({info['n_estimators']} trees) saved to {model_path}")
+    print(f"Compiled forest exported to {compiled_path}")
+    return info
+
+def train_incremental(new_data_path=None, store_dir=STORE_DIR, data_path=DATA_PATH, model_path=MODEL_PATH,
+                      compiled_path=COMPILED_MODEL_PATH, trees_per_update=20, max_estimators=500):
+    """
+    Appends new labelled records to the partition store and grows the current
+    forest by `trees_per_update` trees fitted on the partitions it has not
+    seen yet (warm_start). Falls back to a full parallel refit over every
+    partition when there is no incremental base version, the forest would
+    exceed `max_estimators`, or the new rows do not cover all classes.
+    """
+    store = PartitionStore(store_dir)
+    if not store.partitions():
+        if not os.path.exists(data_path):
+            print("Dataset not found. Generating synthetic PIMA-like data...")
+            create_mock_data(path=data_path)
+        print(f"Seeding partition store {store_dir} from {data_path}...")
+        store.import_csv(data_path)
+    if new_data_path:
+        added = store.import_csv(new_data_path)
+        print(f"Appended {new_data_path} as {len(added)} partition(s)")
+
+    versions = ModelVersions(os.path.join(os.path.dirname(model_path), 'versions'))
+    current = versions.current()
+    trained = set(current.get("partitions", [])) if current else set()
+    new_partitions = [p for p in store.partitions() if p not in trained]
+    if trained and not new_partitions:
+        print(f"Model version {current['version']} already covers every partition. Nothing to train.")
+        return joblib.load(current["model_path"])
+
+    # Only versions trained from the store know which partitions they have seen
+    model = joblib.load(current["model_path"]) if trained else None
+    X_new, y_new = store.load(new_partitions)
+    if model is not None and len(model.estimators_) + trees_per_update <= max_estimators \
+            and set(np.unique(y_new).tolist()) == set(model.classes_.tolist()):
+        # Prequential check: the current model on rows it has never seen
+        accuracy = accuracy_score(y_new, model.predict(X_new))
+        print(f"Current model accuracy on {len(y_new)} new rows: {accuracy:.2f}")
+        print(f"Growing the forest by {trees_per_update} trees on {len(new_partitions)} new partition(s)...")
+        model.set_params(warm_start=True, n_jobs=-1, n_estimators=len(model.estimators_) + trees_per_update)
+        model.fit(X_new, y_new)
+        mode = 'incremental'
+    else:
+        X, y = store.load()
+        print(f"Full retrain on {len(y)} rows from {len(store.partitions())} partition(s)...")
+        model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1)
+        model.fit(X, y)
+        mode = 'full'
+
+    partitions = store.partitions()
+    publish_model(model, model_path, compiled_path, mode=mode, partitions=partitions,
+                  rows=store.rows(partitions))
     return model
 
 def predict_diabetes(model):
@@ -121,9 +193,16 @@ def main():
         model = joblib.load(MODEL_PATH)
     
     while True:
-        choice = input("\nWould you like to (1) Train new model, (2) Predict Risk, or (q) Quit? ").lower()
+        choice = input("\nWould you like to (1) Train new model, (2) Predict Risk, "
+                       "(3) Update model with new records, or (q) Quit? ").lower()
         if choice == '1':
             model = train_model()
+        elif choice == '3':
+            new_data_path = input("CSV of new labelled records (blank = retrain on the stored partitions): ").strip()
+            if new_data_path and not os.path.exists(new_data_path):
+                print(f"File not found: {new_data_path}")
+                continue
+            model = train_incremental(new_data_path or None)
         elif choice == '2':
             predict_diabetes(model)
         elif choice == 'q':
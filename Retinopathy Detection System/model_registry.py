@@ -0,0 +1,275 @@
+"""
+Versioned model artifacts with checksums, and hot reload of served models.
+
+Registry layout (one registry per model):
+    <root>/v0001/<artifact files> + manifest.json   (sha256 and size per file)
+    <root>/CURRENT.json                              (the live version number)
+
+Example usage:
+    python model_registry.py --registry models/retinopathy publish weights=retinopathy_model.pth
+    python model_registry.py --registry models/retinopathy list
+    python model_registry.py --registry models/retinopathy activate 2
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+class ChecksumError(ValueError):
+    pass
+
+def file_sha256(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _write_json(path, data):
+    """Writes JSON next to `path` and renames it into place, so readers never see a partial file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+class ModelRegistry:
+    """
+    Immutable numbered versions of one model's artifacts. A version directory
+    is staged under a temporary name and renamed into place complete with its
+    manifest; CURRENT.json is switched afterwards, so a watcher never loads a
+    partially written version.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+        self.pointer_path = os.path.join(self.root, 'CURRENT.json')
+
+    def versions(self):
+        return sorted(int(d[1:]) for d in os.listdir(self.root)
+                      if d.startswith('v') and d[1:].isdigit() and os.path.isdir(os.path.join(self.root, d)))
+
+    def _version_dir(self, version):
+        return os.path.join(self.root, f"v{version:04d}")
+
+    def publish(self, files, move=False, activate=True, **metadata):
+        """
+        Stores `files` ({role: path}) as the next version and, by default, makes
+        it current. Extra keyword arguments are kept in the manifest. Returns the manifest.
+        """
+        staging = tempfile.mkdtemp(prefix='.staging-', dir=self.root)
+        entries = {}
+        for role, src in files.items():
+            name = os.path.basename(src)
+            dst = os.path.join(staging, name)
+            (shutil.move if move else shutil.copyfile)(src, dst)
+            entries[role] = {"name": name, "sha256": file_sha256(dst), "bytes": os.path.getsize(dst)}
+
+        versions = self.versions()
+        version = versions[-1] + 1 if versions else 1
+        manifest = {"version": version, "created": time.strftime('%Y-%m-%dT%H:%M:%S'), "files": entries, **metadata}
+        _write_json(os.path.join(staging, 'manifest.json'), manifest)
+        os.rename(staging, self._version_dir(version))
+        if activate:
+            self.activate(version)
+        return self.manifest(version)
+
+    def activate(self, version):
+        """Points CURRENT.json at an existing version (also used to roll back)."""
+        if not os.path.exists(os.path.join(self._version_dir(version), 'manifest.json')):
+            raise ValueError(f"Unknown model version {version} in {self.root}")
+        _write_json(self.pointer_path, {"version": version})
+
+    def manifest(self, version):
+        """Manifest of one version with absolute artifact paths under "paths"."""
+        folder = self._version_dir(version)
+        with open(os.path.join(folder, 'manifest.json')) as f:
+            manifest = json.load(f)
+        manifest["paths"] = {role: os.path.join(folder, entry["name"]) for role, entry in manifest["files"].items()}
+        return manifest
+
+    def current(self):
+        """Manifest of the live version, or None when nothing is published."""
+        try:
+            with open(self.pointer_path) as f:
+                version = json.load(f)["version"]
+            return self.manifest(version)
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def verify(self, manifest):
+        """Raises ChecksumError if any artifact of `manifest` is missing or differs from its recorded sha256."""
+        for role, entry in manifest["files"].items():
+            path = manifest["paths"][role]
+            if not os.path.exists(path) or file_sha256(path) != entry["sha256"]:
+                raise ChecksumError(f"Checksum mismatch for {role} ({path}) in version {manifest['version']}")
+        return manifest
+
+class _Loaded:
+    def __init__(self, model, version):
+        self.model = model
+        self.version = version
+        # Requests currently using this model; only changed while holding `done`
+        self.in_flight = 0
+        self.done = threading.Condition()
+
+class ModelSlot:
+    """
+    Active/standby holder of one served model. Requests use acquire(), which
+    pins the active model for the whole request. A new version is loaded into
+    the standby slot and promoted with a single reference swap; the previous
+    model is closed in the background once its in-flight requests finish.
+    """
+
+    def __init__(self, name, close=None, drain_timeout=60.0):
+        self.name = name
+        self.close = close
+        self.drain_timeout = drain_timeout
+        self._active = None
+        self._standby = None
+        self._lock = threading.Lock()
+        self.swaps = 0
+
+    @property
+    def model(self):
+        active = self._active
+        return active.model if active is not None else None
+
+    @property
+    def version(self):
+        active = self._active
+        return active.version if active is not None else None
+
+    @contextmanager
+    def acquire(self):
+        """Yields (model, version) of the active model (None, None before the first load)."""
+        # The count only changes under the entry's own condition lock, which _retire waits on;
+        # taking it inside self._lock means promote() cannot retire an entry between lookup and count
+        with self._lock:
+            loaded = self._active
+            if loaded is not None:
+                with loaded.done:
+                    loaded.in_flight += 1
+        if loaded is None:
+            yield None, None
+            return
+        try:
+            yield loaded.model, loaded.version
+        finally:
+            with loaded.done:
+                loaded.in_flight -= 1
+                loaded.done.notify_all()
+
+    def load(self, model, version):
+        """Places a fully loaded model in the standby slot and promotes it."""
+        self._standby = _Loaded(model, version)
+        return self.promote()
+
+    def promote(self):
+        with self._lock:
+            previous, self._active, self._standby = self._active, self._standby, None
+            self.swaps += 1
+        if previous is not None and self.close is not None:
+            threading.Thread(target=self._retire, args=(previous,), name=f"{self.name}-retire", daemon=True).start()
+        return previous
+
+    def _retire(self, loaded):
+        with loaded.done:
+            loaded.done.wait_for(lambda: loaded.in_flight == 0, self.drain_timeout)
+        try:
+            self.close(loaded.model)
+        except Exception as e:
+            print(f"Closing {self.name} model {loaded.version} failed: {e}")
+
+    def stats(self):
+        active = self._active
+        return {"version": self.version, "in_flight": active.in_flight if active is not None else 0, "swaps": self.swaps}
+
+class RegistryWatcher:
+    """
+    Polls a ModelRegistry and hot-swaps a ModelSlot when CURRENT.json names a
+    new version: checksums are verified, `load(manifest)` builds the model off
+    the request path, and only then is it promoted. A failed load keeps the
+    active model.
+    """
+
+    def __init__(self, registry, slot, load, interval=10.0, on_swap=None):
+        self.registry = registry
+        self.slot = slot
+        self.load = load
+        self.interval = interval
+        self.on_swap = on_swap
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def label(manifest):
+        return f"v{manifest['version']}"
+
+    def check(self):
+        """Loads and promotes the current version if it is not active yet. Returns True on a swap."""
+        manifest = self.registry.current()
+        if manifest is None or self.label(manifest) == self.slot.version:
+            return False
+        self.registry.verify(manifest)
+        model = self.load(manifest)
+        self.slot.load(model, self.label(manifest))
+        print(f"{self.slot.name} model {self.label(manifest)} is now serving.")
+        if self.on_swap is not None:
+            self.on_swap(self.slot.name, self.label(manifest))
+        return True
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"{self.slot.name}-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"{self.slot.name} model reload failed (keeping {self.slot.version}): {e}")
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Manage a versioned model registry')
+    parser.add_argument('--registry', type=str, required=True, help='Registry directory, e.g. models/retinopathy')
+    commands = parser.add_subparsers(dest='command', required=True)
+    publish = commands.add_parser('publish', help='Add artifacts as a new version and make it current')
+    publish.add_argument('files', nargs='+', help='role=path pairs, e.g. weights=retinopathy_model.pth')
+    publish.add_argument('--no-activate', action='store_true')
+    commands.add_parser('list', help='List versions')
+    activate = commands.add_parser('activate', help='Make an existing version current (rollback)')
+    activate.add_argument('version', type=int)
+    commands.add_parser('verify', help='Check the checksums of the current version')
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.registry)
+    if args.command == 'publish':
+        files = dict(pair.split('=', 1) for pair in args.files)
+        manifest = registry.publish(files, activate=not args.no_activate)
+        print(f"Published v{manifest['version']}: {', '.join(f'{r}={p}' for r, p in manifest['paths'].items())}")
+    elif args.command == 'list':
+        current = registry.current()
+        for version in registry.versions():
+            manifest = registry.manifest(version)
+            marker = '*' if current and current['version'] == version else ' '
+            files = ', '.join(f"{role}={entry['name']} ({entry['sha256'][:12]})" for role, entry in manifest['files'].items())
+            print(f"{marker} v{version:<4} {manifest['created']}  {files}")
+    elif args.command == 'activate':
+        registry.activate(args.version)
+        print(f"v{args.version} is now current")
+    elif args.command == 'verify':
+        current = registry.current()
+        if current is None:
+            raise SystemExit("No current version")
+        registry.verify(current)
+        print(f"v{current['version']} checksums OK")
@@ -0,0 +1,155 @@
+import os
+import queue
+import threading
+import time
+
+# Supported encodings for persisted masks: extension -> cv2 imwrite parameter name
+# (resolved lazily so creating a writer does not pull in OpenCV)
+IMAGE_FORMATS = {
+    "png": "IMWRITE_PNG_COMPRESSION",   # level 0 (fast) .. 9 (smallest)
+    "webp": "IMWRITE_WEBP_QUALITY",     # quality 1..100, 101 = lossless
+}
+
+class ArtifactWriter:
+    """
+    Background writer for uploads and segmented vessel masks.
+
+    Writes are queued on a bounded queue and drained by a small thread pool, so
+    image encoding stays off the request path. When the queue is full the
+    producer blocks for up to `put_timeout` seconds and then performs the write
+    itself, which throttles intake instead of growing memory without bound.
+    Callers can `wait(path)` until a queued artifact exists on disk. With
+    `workers=0` every write runs inline in the caller; the background threads
+    only shorten requests when spare cores can do the encoding.
+    """
+
+    def __init__(self, workers=2, max_queue=64, image_format="png", compression=3, put_timeout=1.0):
+        image_format = image_format.lower()
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"Unsupported artifact format '{image_format}' (expected one of {list(IMAGE_FORMATS)})")
+        self.image_format = image_format
+        self.compression = int(compression)
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._pending = {}  # path -> [threading.Event, queued write count]
+        self._lock = threading.Lock()
+        self._threads = []
+
+        # Metrics
+        self.written = 0
+        self.failed = 0
+        self.backpressure_events = 0
+        self._write_seconds = 0.0
+
+        for i in range(workers):
+            t = threading.Thread(target=self._run, name=f"artifact-writer-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def image_path(self, path):
+        """Returns `path` with the extension of the configured image format."""
+        return f"{os.path.splitext(path)[0]}.{self.image_format}"
+
+    def write_image(self, path, image):
+        """Queues an image for encoding; returns the final path (extension follows the format)."""
+        import cv2
+        path = self.image_path(path)
+        params = [getattr(cv2, IMAGE_FORMATS[self.image_format]), self.compression]
+        self._submit(path, self._encode_image, image, params)
+        return path
+
+    def write_bytes(self, path, data):
+        """Queues already-encoded bytes (e.g. the original upload) for writing."""
+        self._submit(path, self._write_raw, data)
+        return path
+
+    def wait(self, path, timeout=None):
+        """Blocks until a queued write for `path` finishes. Returns False on timeout."""
+        with self._lock:
+            entry = self._pending.get(path)
+        if entry is None:
+            return True
+        return entry[0].wait(timeout)
+
+    def is_pending(self, path):
+        with self._lock:
+            return path in self._pending
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "pending": len(self._pending),
+                "written": self.written,
+                "failed": self.failed,
+                "backpressure_events": self.backpressure_events,
+                "avg_write_ms": (self._write_seconds / self.written * 1000) if self.written else 0.0,
+                "format": self.image_format,
+                "compression": self.compression,
+            }
+
+    def shutdown(self, wait=True):
+        """Stops the workers after draining everything already queued."""
+        for _ in self._threads:
+            self._queue.put(None)
+        if wait:
+            for t in self._threads:
+                t.join()
+
+    def _submit(self, path, fn, *args):
+        with self._lock:
+            entry = self._pending.setdefault(path, [threading.Event(), 0])
+            entry[1] += 1
+        if not self._threads:
+            self._execute(path, fn, args)
+            return
+        try:
+            self._queue.put((path, fn, args), timeout=self.put_timeout)
+        except queue.Full:
+            # Backpressure: the request that overflowed the queue pays for its own write
+            with self._lock:
+                self.backpressure_events += 1
+            self._execute(path, fn, args)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            self._execute(*item)
+
+    def _execute(self, path, fn, args):
+        start = time.perf_counter()
+        try:
+            fn(path, *args)
+            ok = True
+        except Exception as e:
+            print(f"Artifact write failed for {path}: {e}")
+            ok = False
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            if ok:
+                self.written += 1
+                self._write_seconds += elapsed
+            else:
+                self.failed += 1
+            entry = self._pending.get(path)
+            if entry is not None:
+                entry[1] -= 1
+                if entry[1] <= 0:
+                    del self._pending[path]
+                    entry[0].set()
+
+    @staticmethod
+    def _encode_image(path, image, params):
+        import cv2
+        if not cv2.imwrite(path, image, params):
+            raise IOError("cv2.imwrite returned False")
+
+    @staticmethod
+    def _write_raw(path, data):
+        # Unique per process and thread: concurrent writes of one path must not share a temp file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
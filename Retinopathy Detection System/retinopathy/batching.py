@@ -0,0 +1,138 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+class DynamicBatcher:
+    """
+    Collects single-image inference requests from many threads and runs them as
+    one batched forward pass, flushing when `max_batch_size` items are pending
+    or the oldest item has waited `max_wait_ms`. `stack` turns the list of
+    queued (3, H, W) inputs into the batch passed to `forward` (torch.stack by default).
+    """
+
+    def __init__(self, forward, max_batch_size=8, max_wait_ms=5.0, max_queue=256, stack=None):
+        self.forward = forward
+        if stack is None:
+            import torch
+            stack = torch.stack
+        self.stack = stack
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._running = False
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._batches = 0
+        self._items = 0
+        self._max_queue_depth = 0
+        self._batch_sizes = {}
+        self._forward_seconds = 0.0
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="dl-batcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._running = False
+        # Wake the worker if it is blocked on an empty queue
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, input_tensor, timeout=None):
+        """
+        Queues one (3, H, W) input and blocks until its probabilities are ready.
+        Raises queue.Full if the scheduler is saturated for longer than `timeout`.
+        """
+        if not self._running:
+            raise RuntimeError("DynamicBatcher is not running")
+        future = Future()
+        self._queue.put((input_tensor, future), timeout=timeout)
+        depth = self._queue.qsize()
+        with self._lock:
+            if depth > self._max_queue_depth:
+                self._max_queue_depth = depth
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+
+    def stats(self):
+        """Returns queue-depth and batch-size metrics for monitoring endpoints."""
+        with self._lock:
+            batches = self._batches
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self._max_queue_depth,
+                "batches": batches,
+                "items": self._items,
+                "avg_batch_size": (self._items / batches) if batches else 0.0,
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+                "avg_forward_ms": (self._forward_seconds / batches * 1000) if batches else 0.0,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+            }
+
+    def _collect(self):
+        """Blocks for the first item, then gathers more until the batch is full or the wait expires."""
+        first = self._queue.get()
+        if first is None:
+            return []
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._running = False
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while self._running:
+            batch = self._collect()
+            if not batch:
+                continue
+            # Skip callers that already gave up waiting
+            batch = [(tensor, future) for tensor, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            start = time.perf_counter()
+            try:
+                probabilities = self.forward(self.stack([tensor for tensor, _ in batch]))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            elapsed = time.perf_counter() - start
+
+            for (_, future), row in zip(batch, probabilities):
+                future.set_result(row)
+
+            with self._lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._batch_sizes[len(batch)] = self._batch_sizes.get(len(batch), 0) + 1
+                self._forward_seconds += elapsed
+
+        # Fail anything still queued after shutdown instead of leaving callers blocked
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None and item[1].set_running_or_notify_cancel():
+                item[1].set_exception(RuntimeError("DynamicBatcher stopped"))
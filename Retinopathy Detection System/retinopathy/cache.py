@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+class ResultCache:
+    """
+    Content-addressed cache of prediction payloads.
+
+    Keys combine a hash of the uploaded image bytes with the model weights
+    version, so a re-upload of the same fundus image returns the stored
+    diagnosis without decoding it again. The in-memory tier is an LRU bounded
+    by entry count and approximate payload bytes; the optional on-disk tier
+    stores one JSON file per key and is bounded by entry count.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, disk_dir=None, disk_max_entries=10000):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_entries = disk_max_entries
+        self._memory = OrderedDict()  # key -> (payload, size)
+        self._memory_bytes = 0
+        self._disk_index = OrderedDict()  # key -> None, oldest first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            entries = [f for f in os.listdir(self.disk_dir) if f.endswith('.json')]
+            entries.sort(key=lambda f: os.path.getmtime(os.path.join(self.disk_dir, f)))
+            for f in entries:
+                self._disk_index[f[:-len('.json')]] = None
+
+    @staticmethod
+    def key(data, version):
+        """
+        Returns the cache key for raw image bytes and a model version string.
+        The key names a file in the disk tier, so path separators and other unsafe characters become '_'.
+        """
+        digest = hashlib.blake2b(data, digest_size=20).hexdigest()
+        return f"{re.sub(r'[^A-Za-z0-9._-]', '_', str(version))}-{digest}"
+
+    def get(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            on_disk = key in self._disk_index
+
+        if on_disk:
+            payload = self._read_disk(key)
+            if payload is not None:
+                with self._lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+                    self._put_memory(key, payload)
+                return payload
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, payload):
+        with self._lock:
+            self._put_memory(key, payload)
+        if self.disk_dir:
+            self._write_disk(key, payload)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._memory),
+                "bytes": self._memory_bytes,
+                "disk_entries": len(self._disk_index),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+            }
+
+    def _put_memory(self, key, payload):
+        # Caller holds self._lock
+        size = len(json.dumps(payload))
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= old[1]
+        self._memory[key] = (payload, size)
+        self._memory_bytes += size
+        while self._memory and (len(self._memory) > self.max_entries or self._memory_bytes > self.max_bytes):
+            _, (_, evicted_size) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted_size
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _read_disk(self, key):
+        path = self._disk_path(key)
+        try:
+            with open(path, 'r') as f:
+                payload = json.load(f)
+            os.utime(path)  # refresh LRU position across restarts
+        except (OSError, ValueError):
+            with self._lock:
+                self._disk_index.pop(key, None)
+            return None
+        with self._lock:
+            if key in self._disk_index:
+                self._disk_index.move_to_end(key)
+        return payload
+
+    def _write_disk(self, key, payload):
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(payload, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Result cache disk write failed: {e}")
+            return
+
+        evicted = []
+        with self._lock:
+            self._disk_index[key] = None
+            self._disk_index.move_to_end(key)
+            while len(self._disk_index) > self.disk_max_entries:
+                evicted.append(self._disk_index.popitem(last=False)[0])
+        for old_key in evicted:
+            try:
+                os.remove(self._disk_path(old_key))
+            except OSError:
+                pass
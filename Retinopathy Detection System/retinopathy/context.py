@@ -0,0 +1,108 @@
+import threading
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+class CVContext:
+    """
+    Preconfigured OpenCV operators plus named scratch buffers for one worker.
+
+    Stages write into `buffer(name, shape)` via `dst=`; a buffer is reused as
+    long as the requested shape matches, so a steady stream of same-sized
+    images performs no per-request mask allocations. Buffers belong to the
+    context: anything that must outlive the request has to be copied.
+    """
+
+    def __init__(self, clip_limit=2.0, tile_grid_size=(8, 8)):
+        self.clip_limit = clip_limit
+        self.tile_grid_size = tuple(tile_grid_size)
+        self.clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tile_grid_size)
+        self._clahe_grids = {}
+        self.kernel = np.ones((2, 2), np.uint8)
+        self._buffers = {}
+        self.allocations = 0
+        self.reuses = 0
+
+    def buffer(self, name, shape, dtype=np.uint8):
+        buf = self._buffers.get(name)
+        if buf is None or buf.shape != tuple(shape) or buf.dtype != dtype:
+            buf = self._buffers[name] = np.empty(shape, dtype)
+            self.allocations += 1
+        else:
+            self.reuses += 1
+        return buf
+
+    def view(self, name, shape, capacity, dtype=np.uint8):
+        """
+        Contiguous `shape` view into a flat buffer of `capacity` elements, so
+        stages whose shape varies a little (e.g. edge tiles) share one allocation.
+        """
+        size = int(np.prod(shape))
+        return self.buffer(name, (capacity,), dtype)[:size].reshape(shape)
+
+    def clahe_for(self, grid):
+        """CLAHE with this context's clip limit and another tile grid (cached per grid)."""
+        grid = tuple(grid)
+        if grid == self.tile_grid_size:
+            return self.clahe
+        clahe = self._clahe_grids.get(grid)
+        if clahe is None:
+            clahe = self._clahe_grids[grid] = cv2.createCLAHE(clipLimit=self.clip_limit, tileGridSize=grid)
+        return clahe
+
+    @property
+    def nbytes(self):
+        return sum(b.nbytes for b in self._buffers.values())
+
+class CVContextPool:
+    """
+    Hands out CVContexts to in-flight requests. The threaded Flask server runs
+    each request on a fresh thread, so contexts are checked out per request
+    (most recently returned first, to keep buffers warm) rather than kept in
+    thread-locals that would die with the thread.
+    """
+
+    def __init__(self, max_idle=8):
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+        self.created = 0
+        self.in_use = 0
+        self.requests = 0
+        self._retired_allocations = 0
+        self._retired_reuses = 0
+
+    @contextmanager
+    def acquire(self):
+        with self._lock:
+            ctx = self._idle.pop() if self._idle else None
+            if ctx is None:
+                self.created += 1
+            self.in_use += 1
+            self.requests += 1
+        if ctx is None:
+            ctx = CVContext()
+        try:
+            yield ctx
+        finally:
+            with self._lock:
+                self.in_use -= 1
+                if len(self._idle) < self.max_idle:
+                    self._idle.append(ctx)
+                else:
+                    self._retired_allocations += ctx.allocations
+                    self._retired_reuses += ctx.reuses
+
+    def stats(self):
+        with self._lock:
+            idle = list(self._idle)
+            return {
+                "contexts_created": self.created,
+                "idle": len(idle),
+                "in_use": self.in_use,
+                "requests": self.requests,
+                "buffer_allocations": self._retired_allocations + sum(c.allocations for c in idle),
+                "buffer_reuses": self._retired_reuses + sum(c.reuses for c in idle),
+                "buffer_bytes": sum(c.nbytes for c in idle),
+            }
@@ -0,0 +1,162 @@
+"""
+Export and loading of the five-class ResNet18 grader in different CPU inference engines.
+
+    eager         fp32 torchvision module (the original path)
+    torchscript   traced and frozen fp32 graph
+    int8_dynamic  dynamically quantized classifier head (weights int8, activations quantized on the fly)
+    int8_static   fully int8 network: fused Conv/BN/ReLU, observers calibrated on sample images
+
+The exported variants are TorchScript archives stored next to the weights
+(retinopathy_model.pth -> retinopathy_model.<engine>.pt).
+
+Example usage:
+    python -m retinopathy.engines --weights retinopathy_model.pth --calibration-dir archive/colored_images
+"""
+import os
+
+import cv2
+import numpy as np
+import torch
+import torch.nn as nn
+from torchvision import models
+
+from retinopathy.model import DL_INPUT_SIZE, to_dl_input
+
+ENGINES = ('eager', 'torchscript', 'int8_dynamic', 'int8_static')
+NUM_CLASSES = 5
+CALIBRATION_PATTERNS = ('.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp')
+
+def engine_path(weights_path, engine):
+    """Default location of an exported engine archive for `weights_path`."""
+    return f"{os.path.splitext(weights_path)[0]}.{engine}.pt"
+
+def _example_input(batch_size=1):
+    return torch.zeros(batch_size, 3, DL_INPUT_SIZE, DL_INPUT_SIZE)
+
+def _quantized_backend():
+    """Picks fbgemm (x86) when available, otherwise qnnpack (ARM)."""
+    supported = torch.backends.quantized.supported_engines
+    backend = 'fbgemm' if 'fbgemm' in supported else 'qnnpack'
+    torch.backends.quantized.engine = backend
+    return backend
+
+def load_eager(weights_path):
+    model = models.resnet18(pretrained=False)
+    model.fc = nn.Linear(model.fc.in_features, NUM_CLASSES)
+    model.load_state_dict(torch.load(weights_path, map_location=torch.device('cpu')))
+    return model.eval()
+
+def trace(model):
+    """Traces and freezes an eval-mode module into a standalone TorchScript graph."""
+    with torch.no_grad():
+        traced = torch.jit.trace(model, _example_input())
+    return torch.jit.freeze(traced)
+
+def quantize_dynamic(model):
+    """
+    Dynamic int8 quantization. PyTorch only supports it for Linear/RNN layers,
+    so in ResNet18 it covers the classifier head; the convolutions stay fp32.
+    """
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+def iter_calibration_batches(folder, limit=256, batch_size=16):
+    """Yields preprocessed (N, 3, 224, 224) batches from up to `limit` images under `folder`."""
+    paths = sorted(os.path.join(root, name) for root, _, files in os.walk(folder)
+                   for name in files if name.lower().endswith(CALIBRATION_PATTERNS))[:limit]
+    batch = []
+    for path in paths:
+        img = cv2.imread(path)
+        if img is None:
+            continue
+        batch.append(to_dl_input(img))
+        if len(batch) >= batch_size:
+            yield torch.from_numpy(np.stack(batch))
+            batch = []
+    if batch:
+        yield torch.from_numpy(np.stack(batch))
+
+def quantize_static(weights_path, calibration_dir, limit=256):
+    """
+    Post-training static int8 quantization: loads the weights into torchvision's
+    quantizable ResNet18, fuses Conv/BN/ReLU, calibrates the activation observers
+    on images from `calibration_dir` and converts to int8 kernels.
+    """
+    from torchvision.models.quantization import resnet18 as quantizable_resnet18
+
+    backend = _quantized_backend()
+    model = quantizable_resnet18(pretrained=False, quantize=False)
+    model.fc = nn.Linear(model.fc.in_features, NUM_CLASSES)
+    model.load_state_dict(torch.load(weights_path, map_location=torch.device('cpu')))
+    model.eval()
+    model.fuse_model()
+    model.qconfig = torch.ao.quantization.get_default_qconfig(backend)
+    torch.ao.quantization.prepare(model, inplace=True)
+
+    seen = 0
+    with torch.no_grad():
+        for batch in iter_calibration_batches(calibration_dir, limit):
+            model(batch)
+            seen += len(batch)
+    if seen == 0:
+        raise ValueError(f"No calibration images found in {calibration_dir}")
+    print(f"Calibrated int8 observers on {seen} images ({backend})")
+    return torch.ao.quantization.convert(model, inplace=True)
+
+def export_engine(engine, weights_path, output_path=None, calibration_dir=None, calibration_limit=256):
+    """Builds the requested engine and saves it as a TorchScript archive. Returns the path."""
+    if engine == 'int8_static':
+        if calibration_dir is None:
+            raise ValueError("int8_static needs a calibration folder")
+        module = quantize_static(weights_path, calibration_dir, calibration_limit)
+    elif engine == 'int8_dynamic':
+        module = quantize_dynamic(load_eager(weights_path))
+    elif engine == 'torchscript':
+        module = load_eager(weights_path)
+    else:
+        raise ValueError(f"Engine '{engine}' cannot be exported (choose from {ENGINES[1:]})")
+
+    output_path = output_path or engine_path(weights_path, engine)
+    tmp_path = f"{output_path}.tmp"
+    torch.jit.save(trace(module), tmp_path)
+    os.replace(tmp_path, output_path)
+    print(f"Exported {engine} engine to {output_path}")
+    return output_path
+
+def load_engine(engine, weights_path, path=None):
+    """
+    Returns (module, engine actually loaded). Exported archives are used when
+    present; torchscript and int8_dynamic are otherwise built from the weights
+    on the fly, while int8_static falls back to eager (it needs calibration).
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown DL engine '{engine}' (choose from {ENGINES})")
+    if engine == 'eager':
+        return load_eager(weights_path), engine
+
+    path = path or engine_path(weights_path, engine)
+    if os.path.exists(path):
+        if engine.startswith('int8'):
+            _quantized_backend()
+        return torch.jit.load(path, map_location='cpu').eval(), engine
+    if engine == 'torchscript':
+        return trace(load_eager(weights_path)), engine
+    if engine == 'int8_dynamic':
+        return trace(quantize_dynamic(load_eager(weights_path))), engine
+    print(f"No calibrated int8 engine at {path} (run python -m retinopathy.engines). Using eager fp32.")
+    return load_eager(weights_path), 'eager'
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Export TorchScript / int8 variants of the DR grader')
+    parser.add_argument('--weights', type=str, default='retinopathy_model.pth')
+    parser.add_argument('--engines', nargs='+', choices=ENGINES[1:], default=list(ENGINES[1:]))
+    parser.add_argument('--calibration-dir', type=str, default=None, help='Sample images for int8_static calibration')
+    parser.add_argument('--calibration-limit', type=int, default=256)
+    args = parser.parse_args()
+
+    for name in args.engines:
+        if name == 'int8_static' and args.calibration_dir is None:
+            print("Skipping int8_static: --calibration-dir not given")
+            continue
+        export_engine(name, args.weights, calibration_dir=args.calibration_dir,
+                      calibration_limit=args.calibration_limit)
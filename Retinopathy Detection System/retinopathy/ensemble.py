@@ -0,0 +1,141 @@
+import copy
+
+import numpy as np
+
+# Test-time views of normalized (..., 3, H, W) inputs; all of them keep the grade invariant for fundus photos
+TTA_VIEWS = {
+    "identity": lambda x: x,
+    "hflip": lambda x: x[..., ::-1],
+    "vflip": lambda x: x[..., ::-1, :],
+    "rot90": lambda x: np.rot90(x, 1, axes=(-2, -1)),
+    "rot180": lambda x: np.rot90(x, 2, axes=(-2, -1)),
+    "rot270": lambda x: np.rot90(x, 3, axes=(-2, -1)),
+}
+
+def augment(inputs, views):
+    """(N, 3, H, W) inputs -> contiguous (N * len(views), 3, H, W) batch, grouped per image in `views` order."""
+    stacked = np.stack([TTA_VIEWS[v](inputs) for v in views], axis=1)
+    return np.ascontiguousarray(stacked.reshape((-1,) + inputs.shape[1:]), dtype=np.float32)
+
+def stack_members(modules, engine):
+    """
+    One callable running every torch member on a batch: (B, 3, H, W) -> (members, B, classes) logits.
+    Eager members with identical architectures are vectorized with torch.func (one pass
+    over stacked weights); traced/quantized modules, which torch.func cannot call
+    functionally, run one after another on the same batch.
+    """
+    import torch
+    if engine == 'eager' and len(modules) > 1:
+        from torch.func import functional_call, stack_module_state, vmap
+        params, buffers = stack_module_state(modules)
+        base = copy.deepcopy(modules[0]).to('meta')
+
+        def call(p, b, x):
+            return functional_call(base, (p, b), (x,))
+
+        batched = vmap(call, in_dims=(0, 0, None))
+        return lambda x: batched(params, buffers, x)
+    return lambda x: torch.stack([m(x) for m in modules])
+
+class TTAEnsemble:
+    """
+    Grades images over several test-time views and ensemble members in one
+    batched pass: the N x views batch goes through every member at once and
+    the softmax outputs are averaged. With `exit_confidence`, images whose
+    plain single-model pass is already that confident skip the extra work,
+    and the others reuse that pass as member 0's identity view.
+    """
+
+    def __init__(self, members, engine, views=("identity", "hflip"), exit_confidence=None, labels=None):
+        unknown = [v for v in views if v not in TTA_VIEWS]
+        if unknown:
+            raise ValueError(f"Unknown TTA views: {unknown}. Expected any of {list(TTA_VIEWS)}")
+        self.members = list(members)
+        self.engine = engine
+        self.views = tuple(views)
+        self.exit_confidence = exit_confidence
+        self.labels = labels
+        # Stacked torch forwards keyed by the first member they run
+        self._torch_forwards = {}
+
+    def run(self, batch, start=0):
+        """(B, 3, H, W) NumPy batch -> (members, B, classes) softmax probabilities of members[start:]."""
+        if self.engine == 'onnx':
+            return np.stack([m(batch) for m in self.members[start:]])
+        import torch
+        if start not in self._torch_forwards:
+            self._torch_forwards[start] = stack_members(self.members[start:], self.engine)
+        with torch.no_grad():
+            logits = self._torch_forwards[start](torch.from_numpy(batch))
+            return torch.nn.functional.softmax(logits, dim=-1).numpy()
+
+    def grade(self, inputs, first=None):
+        """
+        inputs: (N, 3, H, W) array; first: optional (N, classes) probabilities of
+        the plain pass (member 0, identity view), used for early exit and reused
+        in the grid of the remaining images. Returns ((N, classes) probabilities,
+        per-image summaries).
+        """
+        inputs = np.asarray(inputs, dtype=np.float32)
+        probabilities = [None] * len(inputs)
+        summaries = [None] * len(inputs)
+        todo = np.arange(len(inputs))
+        if first is not None and self.exit_confidence is not None:
+            first = np.asarray(first)
+            confident = first.max(axis=1) >= self.exit_confidence
+            for i in np.flatnonzero(confident):
+                probabilities[i] = first[i]
+                summaries[i] = self._summary(first[i][np.newaxis, np.newaxis], first[i], ("identity",), True)
+            todo = np.flatnonzero(~confident)
+
+        if len(todo):
+            probs = self._grid(inputs[todo], None if first is None else first[todo])
+            for row, i in enumerate(todo):
+                grid = probs[:, row]
+                probabilities[i] = grid.mean(axis=(0, 1))
+                summaries[i] = self._summary(grid, probabilities[i], self.views, False)
+        return np.stack(probabilities), summaries
+
+    def _grid(self, inputs, first=None):
+        """
+        (members, N, views, classes) probabilities. With the plain-pass `first`,
+        member 0 only runs the non-identity views and the other members run all
+        of them, so no (member, view) pair is computed twice.
+        """
+        n_members, n_views = len(self.members), len(self.views)
+        if first is None or "identity" not in self.views:
+            probs = self.run(augment(inputs, self.views))
+            return probs.reshape(n_members, len(inputs), n_views, -1)
+
+        identity = self.views.index("identity")
+        others = [j for j, v in enumerate(self.views) if v != "identity"]
+        grid = np.empty((n_members, len(inputs), n_views, first.shape[1]), np.float32)
+        grid[0, :, identity] = first
+        if n_members > 1:
+            grid[1:, :, identity] = self.run(np.ascontiguousarray(inputs), start=1)
+        if others:
+            probs = self.run(augment(inputs, [self.views[j] for j in others]))
+            grid[:, :, others] = probs.reshape(n_members, len(inputs), len(others), -1)
+        return grid
+
+    def _summary(self, grid, final, views, early_exit):
+        """Per-(member, view) grades of one image and how many agree with the final grade."""
+        grade = int(np.argmax(final))
+        per_view = []
+        for member, row in enumerate(grid):
+            for view, probs in zip(views, row):
+                pred = int(np.argmax(probs))
+                per_view.append({
+                    "member": member,
+                    "view": view,
+                    "grade": self.labels[pred] if self.labels else pred,
+                    "confidence": float(probs[pred]),
+                    "agrees": pred == grade,
+                })
+        return {
+            "early_exit": early_exit,
+            "members": len(grid),
+            "views": list(views),
+            "agreement": sum(v["agrees"] for v in per_view) / len(per_view),
+            "per_view": per_view,
+        }
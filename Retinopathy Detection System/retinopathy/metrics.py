@@ -0,0 +1,111 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+class MetricsRegistry:
+    """
+    Minimal in-process counters and histograms rendered in the Prometheus text
+    exposition format. Series are keyed by their sorted label pairs; a single
+    lock keeps updates cheap enough for per-stage timing on the request path.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._collectors = []
+
+    def counter(self, name, help_text):
+        self._declare(name, 'counter', help_text)
+
+    def gauge(self, name, help_text):
+        self._declare(name, 'gauge', help_text)
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self._declare(name, 'histogram', help_text, tuple(sorted(buckets)))
+
+    def _declare(self, name, kind, help_text, buckets=None):
+        with self._lock:
+            self._metrics.setdefault(name, {"type": kind, "help": help_text, "buckets": buckets, "series": {}})
+
+    def inc(self, name, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._metrics[name]["series"]
+            series[key] = series.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._metrics[name]["series"][tuple(sorted(labels.items()))] = value
+
+    def clear(self, name):
+        """Drops every series of one metric (for gauges rebuilt at scrape time)."""
+        with self._lock:
+            self._metrics[name]["series"].clear()
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            metric = self._metrics[name]
+            state = metric["series"].get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, sum, count
+                state = metric["series"][key] = [[0] * len(metric["buckets"]), 0.0, 0]
+            index = bisect.bisect_left(metric["buckets"], value)
+            if index < len(metric["buckets"]):
+                state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self, name):
+        """Current series of one metric as {labels dict as tuple: value}; histograms give {"count", "sum"}."""
+        with self._lock:
+            metric = self._metrics[name]
+            if metric["type"] != 'histogram':
+                return dict(metric["series"])
+            return {labels: {"count": count, "sum": total} for labels, (_, total, count) in metric["series"].items()}
+
+    def add_collector(self, collect):
+        """Registers a callable run at scrape time that updates gauges (e.g. from stats() dicts)."""
+        self._collectors.append(collect)
+
+    def render(self):
+        for collect in self._collectors:
+            try:
+                collect(self)
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+        lines = []
+        with self._lock:
+            for name, metric in sorted(self._metrics.items()):
+                lines.append(f"# HELP {name} {metric['help']}")
+                lines.append(f"# TYPE {name} {metric['type']}")
+                for labels, value in sorted(metric["series"].items()):
+                    if metric["type"] != 'histogram':
+                        lines.append(f"{name}{_format_labels(labels)} {value}")
+                        continue
+                    counts, total, count = value
+                    cumulative = 0
+                    for bound, n in zip(metric["buckets"], counts):
+                        cumulative += n
+                        lines.append(f"{name}_bucket{_format_labels(labels + (('le', repr(float(bound))),))} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
@@ -1,148 +1,715 @@
+import hashlib
+import importlib.util
 import os
+import contextlib
 import random
 import time
 import cv2
 import numpy as np
 
-# Optional DL support
-try:
-    import torch
-    import torch.nn as nn
-    from torchvision import models, transforms
-    from PIL import Image as PILImage
-    DL_SUPPORT = True
-except ImportError:
-    DL_SUPPORT = False
+from retinopathy.context import CVContext, CVContextPool
+from retinopathy.tiling import ComponentMerger, edge_ids, plan_tiles
+
+# Optional DL support. torch/torchvision are only imported once weights are
+# actually loaded, so CV-only deployments and cold starts skip that cost.
+DL_SUPPORT = all(importlib.util.find_spec(m) is not None for m in ('torch', 'torchvision'))
+# ONNX Runtime serves an exported grader without torch/torchvision (see train_dl.py --onnx)
+ONNX_SUPPORT = importlib.util.find_spec('onnxruntime') is not None
+
+DR_STAGES = [
+    "No DR (Healthy)", 
+    "Mild Nonproliferative DR", 
+    "Moderate Nonproliferative DR", 
+    "Severe Nonproliferative DR", 
+    "Proliferative DR"
+]
+
+# ImageNet normalization used when the ResNet18 was trained (see train_dl.py)
+DL_INPUT_SIZE = 224
+IMAGENET_MEAN = np.array([0.485, 0.456, 0.406], np.float32)
+IMAGENET_STD = np.array([0.229, 0.224, 0.225], np.float32)
+
+# CV segmentation parameters (shared by the whole-image and tiled paths)
+VESSEL_BLOCK_SIZE = 11
+VESSEL_C = 2
+DARK_THRESHOLD = 20
+BRIGHT_THRESHOLD = 220
+# Smallest working image (pixels) that is tiled: from about 24MP the whole-image pass needs over
+# 300 MB of scratch memory; 2048 px tiles cut the peak by 40-45% for 1.5-2x the time (benchmarks/bench_tiling.py)
+TILE_MIN_PIXELS = 24_000_000
+# Lesion areas (component pixel counts, original-image pixels) counted for grading, and shown as
+# annotations. Calibrated against the earlier cv2.contourArea cut-offs (5 and 10), which come out
+# smaller than the pixel count: about (w-1)*(h-1) for a w x h blob, and 0 for 1 px wide specks
+GRADE_MIN_AREA = 21
+ANNOTATION_MIN_AREA = 30
+
+def vessel_block_size(scale=1.0):
+    """Adaptive-threshold block (odd, at least 3 px) covering VESSEL_BLOCK_SIZE original pixels at a working scale."""
+    return max(3, int(round(VESSEL_BLOCK_SIZE / scale)) | 1)
+
+def to_dl_input(img):
+    """Decoded BGR image -> normalized float32 CHW array (224x224, RGB, ImageNet statistics)."""
+    resized = cv2.resize(img, (DL_INPUT_SIZE, DL_INPUT_SIZE), interpolation=cv2.INTER_AREA)
+    rgb = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
+    normalized = (rgb.astype(np.float32) / 255.0 - IMAGENET_MEAN) / IMAGENET_STD
+    return np.ascontiguousarray(normalized.transpose(2, 0, 1))
+
+def _file_digest(path, chunk_size=1 << 20):
+    """Short content hash of a weights file."""
+    h = hashlib.blake2b(digest_size=8)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
 
 class RetinopathyModel:
-    def __init__(self, weights_path='retinopathy_model.pth'):
+    def __init__(self, weights_path='retinopathy_model.pth', working_size=None, refine_rois=False,
+                 reuse_buffers=False, engine='auto', engine_path=None, intra_op_threads=None,
+                 inter_op_threads=None, tile_size=None, tile_min_pixels=TILE_MIN_PIXELS):
         self.weights_path = weights_path
+        # DL inference engine: onnx, or a torch engine (eager, torchscript, int8_dynamic, int8_static;
+        # see retinopathy/engines.py). 'auto' prefers an exported .onnx next to the weights, then eager torch.
+        onnx_path = self._onnx_path(engine, engine_path)
+        if engine in ('auto', 'onnx') and ONNX_SUPPORT and os.path.exists(onnx_path):
+            engine = 'onnx'
+        elif engine == 'auto':
+            engine = 'eager'
+        self.engine = engine
+        # Longest side (px) the CV stages run at; None keeps native resolution. Lesion areas and
+        # the threshold neighbourhood are scaled to original pixels, but speckle-sized lesions
+        # do not survive downscaling, so red-lesion counts are approximate
+        self.working_size = working_size
+        # Re-fit downscaled lesion boxes on the full-resolution image
+        self.refine_rois = refine_rois
+        # Working images whose longest side exceeds tile_size (px) and that have at least
+        # tile_min_pixels pixels are segmented in tiles with bounded scratch memory;
+        # None always processes the whole image at once
+        self.tile_size = tile_size
+        self.tile_min_pixels = tile_min_pixels
         self.dl_active = False
         self.model = None
+        self.batcher = None
+        # Optional TTAEnsemble (see enable_ensemble)
+        self.ensemble = None
+        # Identifies the weights behind a prediction (used in result cache keys)
+        self.weights_version = "cv"
+        # Optional ArtifactWriter that takes mask encoding off the request path
+        self.writer = None
+        # URL prefix under which persisted masks are served
+        self.artifact_url_prefix = "/static/uploads"
+        # Pooled CLAHE/kernels and scratch buffers reused across same-sized requests (opt-in: it
+        # keeps ~10 bytes/pixel resident per context without a measurable latency gain)
+        self.cv_pool = CVContextPool() if reuse_buffers else None
+        # Optional MetricsRegistry receiving per-stage timings and mode counters (see enable_metrics)
+        self.metrics = None
         
         print("Initializing Retinopathy Detection Model...")
         
-        if DL_SUPPORT and os.path.exists(self.weights_path):
+        if engine == 'onnx' and ONNX_SUPPORT and os.path.exists(onnx_path):
             try:
-                print(f"Loading Deep Learning weights from {self.weights_path}...")
-                self.model = models.resnet18(pretrained=False)
-                num_ftrs = self.model.fc.in_features
-                self.model.fc = nn.Linear(num_ftrs, 5) # 5 DR Stages
-                
-                # Load weights (CPU fallback)
-                state_dict = torch.load(self.weights_path, map_location=torch.device('cpu'))
-                self.model.load_state_dict(state_dict)
-                self.model.eval()
+                print(f"Loading ONNX model from {onnx_path}...")
+                from retinopathy.onnx_backend import OnnxGrader
+                self.model = OnnxGrader(onnx_path, intra_op_threads, inter_op_threads)
+                self.dl_active = True
+                self.weights_version = f"{_file_digest(onnx_path)}-onnx"
+                print("Deep Learning model activated successfully (ONNX Runtime).")
+            except Exception as e:
+                print(f"Failed to load ONNX model: {e}. Falling back to CV.")
+        elif engine != 'onnx' and DL_SUPPORT and os.path.exists(self.weights_path):
+            try:
+                print(f"Loading Deep Learning weights from {self.weights_path} ({engine} engine)...")
+                from retinopathy.engines import load_engine
+
+                # ResNet18 with a 5-way head (5 DR Stages), on CPU
+                self.model, self.engine = load_engine(engine, self.weights_path, engine_path)
+                if intra_op_threads:
+                    import torch
+                    torch.set_num_threads(intra_op_threads)
                 
                 self.dl_active = True
-                self.transform = transforms.Compose([
-                    transforms.Resize((224, 224)),
-                    transforms.ToTensor(),
-                    transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
-                ])
+                # Quantized/traced engines can differ slightly from fp32, so they get their own cache keys
+                self.weights_version = _file_digest(self.weights_path)
+                if self.engine != 'eager':
+                    self.weights_version += f"-{self.engine}"
                 print("Deep Learning model activated successfully.")
             except Exception as e:
                 print(f"Failed to load DL model: {e}. Falling back to CV.")
         else:
             print("No DL weights found or dependencies missing. Using Hybrid AI/CV Mode.")
         
-        time.sleep(1)
         print(f"Model initialized ({'DL' if self.dl_active else 'Hybrid CV'} Mode)")
         
-    def predict(self, image_path):
+    def predict(self, image, filename=None, output_dir=None):
         """
         Performs diagnosis, vessel segmentation, and lesion detection.
+
+        `image` may be a file path, the raw encoded bytes of an upload, or an
+        already decoded BGR ndarray. The segmented vessel mask is written to
+        `output_dir` (defaults to the image's folder when a path is given);
+        with in-memory input and no `output_dir` nothing touches the disk.
         """
-        print(f"Analyzing image: {image_path}")
+        if isinstance(image, str):
+            print(f"Analyzing image: {image}")
+            filename = filename or os.path.basename(image)
+            if output_dir is None:
+                output_dir = os.path.dirname(image)
+        else:
+            print(f"Analyzing image: {filename or '<in-memory>'}")
         
-        # Load image
-        img = cv2.imread(image_path)
+        start = time.perf_counter()
+        # Load image (decoded exactly once, shared by the CV and DL paths)
+        with self._stage("decode"):
+            img = self._load_image(image)
         if img is None:
+            self._count("retinopathy_decode_failures_total")
             return {"error": "Could not read image"}
 
-        # 1. Vessel Segmentation Simulation (Computer Vision approach)
-        # Extract green channel (vessels have highest contrast here)
-        green_ch = img[:, :, 1]
-        
-        # Apply CLAHE to enhance contrast
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-        contrast_enhanced = clahe.apply(green_ch)
+        # Buffers from the pooled CV context are only valid inside this block
+        with self._cv_context() as ctx:
+            # 1. Vessel Segmentation Simulation (Computer Vision approach)
+            with self._stage("resize"):
+                work_img, scale = self._working_image(img, ctx)
+            save = output_dir is not None and bool(filename)
+            with self._stage("segment"):
+                tiled = self._segment_tiled(work_img, ctx, scale, keep_vessels=save) if self.tile_size else None
+                if tiled is None:
+                    contrast_enhanced, vessels = self._segment_vessels(work_img, ctx, scale)
+                else:
+                    # Tiled path: lesion statistics come out of the same pass
+                    contrast_enhanced, (vessels, lesions) = None, tiled
+
+            # Save segmented image
+            segmented_url = None
+            if save:
+                with self._stage("write"):
+                    segmented_path = self._save_image(os.path.join(output_dir, f"segmented_{filename}"), vessels,
+                                                      owned=tiled is not None)
+                segmented_url = f"{self.artifact_url_prefix}/{os.path.basename(segmented_path)}"
+
+            # Lesion masks/components are shared by grading and annotation
+            if tiled is None:
+                with self._stage("lesions"):
+                    lesions = self._extract_lesions(contrast_enhanced, vessels, scale, ctx)
+
+            # 2. DIAGNOSIS LOGIC
+            mode = "cv"
+            if self.dl_active:
+                try:
+                    # B. DEEP LEARNING INFERENCE
+                    print("Performing Deep Learning Inference...")
+                    with self._stage("dl_preprocess"):
+                        input_tensor = self._preprocess_dl(img)
+                    ensemble = None
+                    if self.ensemble is None or self.ensemble.exit_confidence is not None:
+                        with self._stage("dl_forward"):
+                            probabilities = self._classify(input_tensor)
+                    else:
+                        probabilities = None
+                    if self.ensemble is not None:
+                        with self._stage("dl_ensemble"):
+                            probabilities, summaries = self.ensemble.grade(
+                                np.asarray(input_tensor), None if probabilities is None else probabilities[np.newaxis])
+                        probabilities, ensemble = probabilities[0], summaries[0]
+                    prediction, confidence, details = self._grade_dl(probabilities, ensemble)
+                    mode = "dl"
+                
+                except Exception as e:
+                    print(f"DL Inference failed: {e}. Falling back to CV.")
+                    self._count("retinopathy_dl_fallbacks_total")
+                    with self._stage("grade_cv"):
+                        prediction, confidence, details = self._predict_cv(img, contrast_enhanced, vessels, lesions)
+            else:
+                # B. COMPUTER VISION HEURISTIC (Fallback)
+                with self._stage("grade_cv"):
+                    prediction, confidence, details = self._predict_cv(img, contrast_enhanced, vessels, lesions)
+
+            # 3. Annotation Generation (Using CV detection coordinates)
+            # We still use CV to find the "blobs" for the user interface
+            with self._stage("annotate"):
+                annotations = self._generate_cv_annotations(contrast_enhanced, vessels, lesions)
+            if self.refine_rois and scale > 1:
+                with self._stage("refine"):
+                    annotations = self._refine_annotations(img, annotations)
+
+            self._record_prediction(mode, img, time.perf_counter() - start)
+            result = {
+                "diagnosis": prediction,
+                "confidence": confidence,
+                "details": details,
+                "segmented_url": segmented_url,
+                "annotations": annotations,
+                "image_size": {"width": img.shape[1], "height": img.shape[0]}
+            }
+            if mode == "dl" and ensemble is not None:
+                result["ensemble"] = ensemble
+            return result
+
+    def predict_batch(self, images, filenames=None, output_dir=None, timings=None):
+        """
+        Batched variant of predict() for bulk screening: the CV stages run per
+        image and the DL path runs a single forward pass over the whole batch.
+        Per-stage seconds are accumulated into `timings` when a dict is given.
+        """
+        timings = timings if timings is not None else {}
+
+        def timed(stage, fn, *args):
+            start = time.perf_counter()
+            out = fn(*args)
+            elapsed = time.perf_counter() - start
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+            if self.metrics is not None:
+                self.metrics.observe("retinopathy_stage_seconds", elapsed, stage=stage)
+            return out
+
+        results = [None] * len(images)
+        analyzed = []
+        # One pooled context serves the whole batch; its buffers are overwritten per image,
+        # so only the lesion statistics (areas/boxes) are carried past each iteration.
+        with self._cv_context() as ctx:
+            for i, image in enumerate(images):
+                img = timed("decode", self._load_image, image)
+                if img is None:
+                    self._count("retinopathy_decode_failures_total")
+                    results[i] = {"error": "Could not read image"}
+                    continue
+                work_img, scale = timed("resize", self._working_image, img, ctx)
+                filename = filenames[i] if filenames else None
+                save = output_dir is not None and bool(filename)
+                tiled = timed("segment", self._segment_tiled, work_img, ctx, scale, save) if self.tile_size else None
+                if tiled is None:
+                    contrast_enhanced, vessels = timed("segment", self._segment_vessels, work_img, ctx, scale)
+                else:
+                    contrast_enhanced, (vessels, lesions) = None, tiled
+                segmented_url = None
+                if save:
+                    path = timed("write", self._save_image, os.path.join(output_dir, f"segmented_{filename}"),
+                                 vessels, tiled is not None)
+                    segmented_url = f"{self.artifact_url_prefix}/{os.path.basename(path)}"
+                if tiled is None:
+                    lesions = timed("lesions", self._extract_lesions, contrast_enhanced, vessels, scale, ctx)
+                annotations = timed("annotate", self._generate_cv_annotations, contrast_enhanced, vessels, lesions)
+                if self.refine_rois and scale > 1:
+                    annotations = timed("refine", self._refine_annotations, img, annotations)
+                analyzed.append((i, img, lesions, annotations, segmented_url))
+
+        probabilities = None
+        ensembles = [None] * len(analyzed)
+        if self.dl_active and analyzed:
+            try:
+                batch = timed("dl_preprocess", lambda: self._stack_inputs([self._preprocess_dl(a[1])[0] for a in analyzed]))
+                if self.ensemble is None or self.ensemble.exit_confidence is not None:
+                    probabilities = np.asarray(timed("dl_forward", self._forward, batch))
+                if self.ensemble is not None:
+                    # Every view x member of the images that did not exit early runs as one batch
+                    probabilities, ensembles = timed("dl_ensemble", self.ensemble.grade, np.asarray(batch), probabilities)
+            except Exception as e:
+                print(f"DL Inference failed: {e}. Falling back to CV.")
+                self._count("retinopathy_dl_fallbacks_total", len(analyzed))
+                probabilities = None
+
+        for row, (i, img, lesions, annotations, segmented_url) in enumerate(analyzed):
+            self._record_prediction("dl" if probabilities is not None else "cv", img)
+            if probabilities is not None:
+                prediction, confidence, details = self._grade_dl(probabilities[row], ensembles[row])
+            else:
+                prediction, confidence, details = timed("grade_cv", self._predict_cv, img, None, None, lesions)
+            results[i] = {
+                "diagnosis": prediction,
+                "confidence": confidence,
+                "details": details,
+                "segmented_url": segmented_url,
+                "annotations": annotations,
+                "image_size": {"width": img.shape[1], "height": img.shape[0]}
+            }
+            if probabilities is not None and ensembles[row] is not None:
+                results[i]["ensemble"] = ensembles[row]
+        return results
+
+    def _grade_dl(self, probabilities, ensemble=None):
+        """Maps a softmax row to (stage, confidence, details)."""
+        pred = int(np.argmax(probabilities))
+        confidence = float(probabilities[pred])
+        details = f"Deep Learning Inference (ResNet18) complete. Confidence: {confidence:.2%}"
+        if ensemble is not None and not ensemble["early_exit"]:
+            details += (f" (averaged over {ensemble['members']} model(s) x {len(ensemble['views'])} view(s), "
+                        f"agreement {ensemble['agreement']:.0%})")
+        return DR_STAGES[pred], confidence, details
+
+    def enable_batching(self, max_batch_size=8, max_wait_ms=5.0, max_queue=256):
+        """
+        Routes DL forward passes through a dynamic batching scheduler so that
+        concurrent requests share one batched ResNet18 pass.
+        """
+        if not self.dl_active:
+            print("Batching requested but DL model is not active. Ignoring.")
+            return None
+        from retinopathy.batching import DynamicBatcher
+        self.batcher = DynamicBatcher(self._forward, max_batch_size=max_batch_size,
+                                      max_wait_ms=max_wait_ms, max_queue=max_queue, stack=self._stack_inputs)
+        self.batcher.start()
+        print(f"DL batching enabled (max_batch_size={max_batch_size}, max_wait_ms={max_wait_ms})")
+        return self.batcher
+
+    def enable_ensemble(self, views=("identity", "hflip"), member_paths=(), exit_confidence=None):
+        """
+        Grades with test-time augmentation (`views`, see retinopathy/ensemble.py)
+        and optional extra checkpoints loaded with the same engine; all of them
+        run as one batched pass. With `exit_confidence`, the plain pass runs
+        first and images at least that confident skip the ensemble.
+        """
+        if not self.dl_active:
+            print("Ensemble requested but DL model is not active. Ignoring.")
+            return None
+        from retinopathy.ensemble import TTAEnsemble
+        members = [self.model]
+        for path in member_paths:
+            if self.engine == 'onnx':
+                from retinopathy.onnx_backend import OnnxGrader
+                members.append(OnnxGrader(path, self.model.intra_op_threads, self.model.inter_op_threads))
+            else:
+                from retinopathy.engines import load_engine
+                members.append(load_engine(self.engine, path)[0])
+        self.ensemble = TTAEnsemble(members, self.engine, views, exit_confidence, labels=DR_STAGES)
+        # Ensembled grades differ from single-model ones, so they get their own cache keys
+        config = repr((self.ensemble.views, [_file_digest(p) for p in member_paths], exit_confidence))
+        self.weights_version += "-tta" + hashlib.blake2b(config.encode(), digest_size=4).hexdigest()
+        print(f"Ensemble grading enabled ({len(members)} model(s) x {len(self.ensemble.views)} view(s), "
+              f"exit_confidence={exit_confidence})")
+        return self.ensemble
+
+    def enable_metrics(self, registry):
+        """Declares this model's series on a MetricsRegistry and starts recording into it."""
+        registry.histogram("retinopathy_stage_seconds", "Time spent in each stage of the retinopathy pipeline")
+        registry.histogram("retinopathy_predict_seconds", "End-to-end RetinopathyModel.predict time")
+        registry.histogram("retinopathy_image_megapixels", "Decoded input image size",
+                           buckets=(0.25, 0.5, 1, 2, 3, 4, 6, 8, 12, 16, 24))
+        registry.counter("retinopathy_predictions_total", "Graded images by mode (dl or cv)")
+        registry.counter("retinopathy_dl_fallbacks_total", "DL inferences that failed and fell back to CV grading")
+        registry.counter("retinopathy_decode_failures_total", "Inputs that could not be decoded")
+        self.metrics = registry
+        return registry
+
+    def _stage(self, name):
+        """Times a block into the stage histogram (no-op without a registry)."""
+        if self.metrics is None:
+            return contextlib.nullcontext()
+        return self.metrics.time("retinopathy_stage_seconds", stage=name)
+
+    def _count(self, name, amount=1):
+        if self.metrics is not None:
+            self.metrics.inc(name, amount)
+
+    def _record_prediction(self, mode, img, seconds=None):
+        if self.metrics is None:
+            return
+        self.metrics.inc("retinopathy_predictions_total", mode=mode)
+        self.metrics.observe("retinopathy_image_megapixels", img.shape[0] * img.shape[1] / 1e6)
+        if seconds is not None:
+            self.metrics.observe("retinopathy_predict_seconds", seconds)
+
+    @staticmethod
+    def _load_image(image):
+        """Decodes a path, encoded bytes or ndarray into a BGR uint8 image (None if unreadable)."""
+        if isinstance(image, np.ndarray):
+            if image.ndim == 2:
+                return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+            return image
+        if isinstance(image, str):
+            return cv2.imread(image)
+        buf = np.frombuffer(image, np.uint8)
+        if buf.size == 0:
+            return None
+        return cv2.imdecode(buf, cv2.IMREAD_COLOR)
+
+    def _save_image(self, path, image, owned=True):
+        """
+        Writes an image via self.writer when configured, otherwise inline. Returns the final path.
+        Pass owned=False for pooled buffers: they are copied before being queued.
+        """
+        if self.writer is not None:
+            return self.writer.write_image(path, image if owned else image.copy())
+        cv2.imwrite(path, image)
+        return path
+
+    def _onnx_path(self, engine, engine_path):
+        if engine == 'onnx' and engine_path:
+            return engine_path
+        if self.weights_path.endswith('.onnx'):
+            return self.weights_path
+        return f"{os.path.splitext(self.weights_path)[0]}.onnx"
+
+    def _preprocess_dl(self, img):
+        """
+        Returns the normalized (1, 3, 224, 224) input for a decoded BGR image:
+        a NumPy array for ONNX Runtime, a tensor for the torch engines.
+        """
+        inputs = to_dl_input(img)[np.newaxis]
+        if self.engine == 'onnx':
+            return inputs
+        import torch
+        return torch.from_numpy(inputs)
+
+    def _stack_inputs(self, inputs):
+        """Stacks (3, 224, 224) inputs into one batch of the engine's array type."""
+        if self.engine == 'onnx':
+            return np.stack(inputs)
+        import torch
+        return torch.stack(inputs)
+
+    def _forward(self, batch):
+        """Runs one forward pass over an (N, 3, 224, 224) batch and returns softmax probabilities."""
+        if self.engine == 'onnx':
+            return self.model(batch)
+        import torch
+        with torch.no_grad():
+            outputs = self.model(batch)
+            return torch.nn.functional.softmax(outputs, dim=1)
+
+    def _classify(self, input_tensor):
+        """Returns the class probabilities (NumPy) for a single preprocessed image."""
+        if self.batcher is not None:
+            return np.asarray(self.batcher.submit(input_tensor[0]))
+        return np.asarray(self._forward(input_tensor)[0])
+
+    def _cv_context(self):
+        """Checks out a pooled CVContext (or a throwaway one when buffer reuse is off)."""
+        if self.cv_pool is not None:
+            return self.cv_pool.acquire()
+        return contextlib.nullcontext(CVContext())
+
+    def _segment_vessels(self, img, ctx=None, scale=1.0):
+        """
+        Returns the CLAHE-enhanced green channel and the cleaned vessel mask.
+        `scale` (original / working pixels) shrinks the threshold neighbourhood
+        so a downscaled image is thresholded over the same retina area.
+        """
+        ctx = ctx if ctx is not None else CVContext()
+        shape = img.shape[:2]
+
+        with self._stage("clahe"):
+            # Extract green channel (vessels have highest contrast here)
+            green_ch = cv2.extractChannel(img, 1, dst=ctx.buffer("green", shape))
+            
+            # Apply CLAHE to enhance contrast
+            contrast_enhanced = ctx.clahe.apply(green_ch, dst=ctx.buffer("contrast", shape))
         
         # Simple vessel extraction using adaptive thresholding
-        vessels = cv2.adaptiveThreshold(
-            contrast_enhanced, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-            cv2.THRESH_BINARY_INV, 11, 2
-        )
+        with self._stage("threshold"):
+            vessels = cv2.adaptiveThreshold(
+                contrast_enhanced, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
+                cv2.THRESH_BINARY_INV, vessel_block_size(scale), VESSEL_C, dst=ctx.buffer("adaptive", shape)
+            )
         
         # Clean up noise
-        kernel = np.ones((2,2), np.uint8)
-        vessels = cv2.morphologyEx(vessels, cv2.MORPH_OPEN, kernel)
+        with self._stage("morphology"):
+            vessels = cv2.morphologyEx(vessels, cv2.MORPH_OPEN, ctx.kernel, dst=ctx.buffer("vessels", shape))
+        return contrast_enhanced, vessels
 
-        # Save segmented image
-        filename = os.path.basename(image_path)
-        segmented_name = f"segmented_{filename}"
-        segmented_path = os.path.join(os.path.dirname(image_path), segmented_name)
-        cv2.imwrite(segmented_path, vessels)
+    def _working_image(self, img, ctx=None):
+        """
+        Downscales `img` so its longest side is at most working_size.
+        Returns (image, scale) where scale maps working coordinates back to the original.
+        """
+        longest = max(img.shape[:2])
+        if not self.working_size or longest <= self.working_size:
+            return img, 1.0
+        scale = longest / float(self.working_size)
+        size = (max(1, round(img.shape[1] / scale)), max(1, round(img.shape[0] / scale)))
+        dst = ctx.buffer("working", (size[1], size[0]) + img.shape[2:]) if ctx is not None else None
+        return cv2.resize(img, size, dst=dst, interpolation=cv2.INTER_AREA), scale
 
-        # 2. DIAGNOSIS LOGIC
-        if self.dl_active:
-            try:
-                # B. DEEP LEARNING INFERENCE
-                print("Performing Deep Learning Inference...")
-                pil_img = PILImage.open(image_path).convert('RGB')
-                input_tensor = self.transform(pil_img).unsqueeze(0)
-                
-                with torch.no_grad():
-                    outputs = self.model(input_tensor)
-                    probabilities = torch.nn.functional.softmax(outputs[0], dim=0)
-                    confidence, preds = torch.max(probabilities, 0)
-                
-                stages = [
-                    "No DR (Healthy)", 
-                    "Mild Nonproliferative DR", 
-                    "Moderate Nonproliferative DR", 
-                    "Severe Nonproliferative DR", 
-                    "Proliferative DR"
-                ]
-                
-                prediction = stages[preds.item()]
-                confidence = confidence.item()
-                details = f"Deep Learning Inference (ResNet18) complete. Confidence: {confidence:.2%}"
-                
-            except Exception as e:
-                print(f"DL Inference failed: {e}. Falling back to CV.")
-                prediction, confidence, details = self._predict_cv(img, contrast_enhanced, vessels)
-        else:
-            # B. COMPUTER VISION HEURISTIC (Fallback)
-            prediction, confidence, details = self._predict_cv(img, contrast_enhanced, vessels)
-
-        # 3. Annotation Generation (Using CV detection coordinates)
-        # We still use CV to find the "blobs" for the user interface
-        annotations = self._generate_cv_annotations(contrast_enhanced, vessels)
-
-        return {
-            "diagnosis": prediction,
-            "confidence": confidence,
-            "details": details,
-            "segmented_url": f"/static/uploads/{segmented_name}",
-            "annotations": annotations,
-            "image_size": {"width": img.shape[1], "height": img.shape[0]}
-        }
-
-    def _predict_cv(self, img, contrast_enhanced, vessels):
+    def _refine_annotations(self, img, annotations, margin=4):
+        """
+        Re-fits each lesion box on the full-resolution green channel: Otsu
+        threshold inside the (padded) ROI, keep the component nearest the ROI centre.
+        """
+        green = img[:, :, 1]
+        height, width = green.shape
+        refined = []
+        for ann in annotations:
+            x0, y0 = max(0, ann["x"] - margin), max(0, ann["y"] - margin)
+            x1, y1 = min(width, ann["x"] + ann["w"] + margin), min(height, ann["y"] + ann["h"] + margin)
+            roi = green[y0:y1, x0:x1]
+            if roi.size == 0:
+                refined.append(ann)
+                continue
+            mode = cv2.THRESH_BINARY_INV if ann["label"] == "Hemorrhage" else cv2.THRESH_BINARY
+            _, mask = cv2.threshold(roi, 0, 255, mode | cv2.THRESH_OTSU)
+            n, labels, stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=8)
+            if n <= 1:
+                refined.append(ann)
+                continue
+            center = np.array([(x1 - x0) / 2.0, (y1 - y0) / 2.0])
+            best = 1 + int(np.argmin(np.linalg.norm(centroids[1:] - center, axis=1)))
+            x, y, w, h, area = stats[best]
+            cx, cy = centroids[best]
+            refined.append({**ann, "x": int(x0 + x), "y": int(y0 + y), "w": int(w), "h": int(h),
+                            "area": float(area), "cx": round(float(x0 + cx), 1), "cy": round(float(y0 + cy), 1)})
+        return refined
+
+    def _extract_lesions(self, contrast_enhanced, vessels, scale=1.0, ctx=None):
+        """
+        Single lesion-extraction pass shared by grading and annotation.
+        Returns, per lesion type, the mask plus NumPy arrays of component
+        areas (n,), bounding boxes (n, 4) and centroids (n, 2) from
+        connectedComponentsWithStats. The mask is in working-resolution
+        pixels; areas, boxes and centroids are mapped back to the original
+        image by `scale`.
+        """
+        ctx = ctx if ctx is not None else CVContext()
+        shape = contrast_enhanced.shape
+        lesions_mask, bright_spots = self._lesion_masks(
+            contrast_enhanced, vessels, ctx.buffer("dark", shape), ctx.buffer("lesions", shape),
+            ctx.buffer("bright", shape))
+        
+        lesions = {}
+        for kind, mask in (("hemorrhage", lesions_mask), ("exudate", bright_spots)):
+            _, _, stats, centroids = cv2.connectedComponentsWithStats(
+                mask, labels=ctx.buffer("labels", shape, np.int32), connectivity=8)
+            # Row 0 is the background
+            lesions[kind] = self._lesion_stats(stats[1:], centroids[1:], scale)
+            lesions[kind]["mask"] = mask
+        return lesions
+
+    @staticmethod
+    def _lesion_masks(contrast_enhanced, vessels, dark, lesions, bright):
+        """Red-lesion and exudate masks, written into the given dark/lesions/bright buffers."""
         # A. Hemorrhage/Microaneurysm Detection (Dark spots in Green channel)
-        _, dark_spots = cv2.threshold(contrast_enhanced, 20, 255, cv2.THRESH_BINARY_INV)
-        lesions_mask = cv2.subtract(dark_spots, vessels)
+        _, dark_spots = cv2.threshold(contrast_enhanced, DARK_THRESHOLD, 255, cv2.THRESH_BINARY_INV, dst=dark)
+        lesions_mask = cv2.subtract(dark_spots, vessels, dst=lesions)
         
         # B. Exudate Detection (Bright spots)
-        _, bright_spots = cv2.threshold(contrast_enhanced, 220, 255, cv2.THRESH_BINARY)
+        _, bright_spots = cv2.threshold(contrast_enhanced, BRIGHT_THRESHOLD, 255, cv2.THRESH_BINARY, dst=bright)
+        return lesions_mask, bright_spots
+
+    @staticmethod
+    def _lesion_stats(stats, centroids, scale=1.0):
+        """
+        Component stats rows (x, y, w, h, area) and centroids at working
+        resolution -> areas, boxes and centroids in original-image pixels.
+        """
+        areas = stats[:, cv2.CC_STAT_AREA].astype(np.float64)
+        boxes = stats[:, :4].astype(np.int64)
+        centroids = np.asarray(centroids, np.float64)
+        if scale != 1.0:
+            areas *= scale * scale
+            boxes = np.rint(boxes * scale).astype(np.int64)
+            boxes[:, 2:] = np.maximum(boxes[:, 2:], 1)
+            # Pixel centres map to pixel centres
+            centroids = (centroids + 0.5) * scale - 0.5
+        return {"areas": areas, "boxes": boxes, "centroids": centroids}
+
+    def _segment_tiled(self, img, ctx, scale=1.0, keep_vessels=False):
+        """
+        Tiled equivalent of _segment_vessels + _extract_lesions for very large
+        images (geometry in retinopathy/tiling.py). Scratch memory is bounded by
+        the tile size; the full-size vessel mask is only assembled when
+        `keep_vessels` is set, e.g. to save it. Lesions carry global areas,
+        boxes and centroids like _extract_lesions, with mask None. Results are
+        close to, not identical with, the whole-image pass: per-tile CLAHE can
+        round a few pixels differently, which moves vessel mask pixels and
+        occasionally a lesion (see benchmarks/bench_tiling.py for the parity check).
+        Returns (vessels, lesions), or None when the image should not be tiled.
+        """
+        height, width = img.shape[:2]
+        if max(height, width) <= self.tile_size or height * width < self.tile_min_pixels:
+            return None
+        tiles = plan_tiles(height, width, self.tile_size, ctx.tile_grid_size)
+        if tiles is None or len(tiles) == 1:
+            return None
+
+        capacity = max((t.ey1 - t.ey0 + t.pad_bottom) * (t.ex1 - t.ex0 + t.pad_right) for t in tiles)
+        block = vessel_block_size(scale)
+        vessels_full = np.empty((height, width), np.uint8) if keep_vessels else None
+        kinds = ("hemorrhage", "exudate")
+        # Stats rows and centroids of components that lie inside one tile
+        found = {kind: ([], []) for kind in kinds}
+        mergers = {kind: ComponentMerger() for kind in kinds}
+        # Seam label ids: right column of the previous tile, bottom rows of the previous and current tile rows
+        left = dict.fromkeys(kinds)
+        above = {kind: None for kind in kinds}
+        below = {kind: np.zeros(width, np.int64) for kind in kinds}
+        next_id = 0
+
+        for tile in tiles:
+            eh, ew = tile.ey1 - tile.ey0, tile.ex1 - tile.ex0
+            h, w = tile.y1 - tile.y0, tile.x1 - tile.x0
+            cy, cx = tile.y0 - tile.ey0, tile.x0 - tile.ex0
+            if tile.x0 == 0:
+                for kind in kinds:
+                    above[kind], below[kind] = below[kind], np.zeros(width, np.int64)
+
+            # 1. CLAHE over the halo window, padded at the image edge exactly as the whole-image pass pads
+            green = cv2.extractChannel(img[tile.ey0:tile.ey1, tile.ex0:tile.ex1], 1,
+                                       dst=ctx.view("tile_green", (eh, ew), capacity))
+            if tile.pad_bottom or tile.pad_right:
+                green = cv2.copyMakeBorder(green, 0, tile.pad_bottom, 0, tile.pad_right, cv2.BORDER_REFLECT_101,
+                                           dst=ctx.view("tile_padded", (eh + tile.pad_bottom, ew + tile.pad_right),
+                                                        capacity))
+            contrast = ctx.clahe_for(tile.grid).apply(green, dst=ctx.view("tile_contrast", green.shape, capacity))
+            contrast = contrast[:eh, :ew]
+
+            # 2. Vessel mask over the window; the core is unaffected by the window edges
+            vessels = cv2.adaptiveThreshold(contrast, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV,
+                                            block, VESSEL_C,
+                                            dst=ctx.view("tile_adaptive", (eh, ew), capacity))
+            vessels = cv2.morphologyEx(vessels, cv2.MORPH_OPEN, ctx.kernel,
+                                       dst=ctx.view("tile_vessels", (eh, ew), capacity))
+            core_vessels = vessels[cy:cy + h, cx:cx + w]
+            if vessels_full is not None:
+                vessels_full[tile.y0:tile.y1, tile.x0:tile.x1] = core_vessels
+
+            # 3. Lesion masks of the core
+            masks = self._lesion_masks(contrast[cy:cy + h, cx:cx + w], core_vessels,
+                                       ctx.view("tile_dark", (h, w), capacity),
+                                       ctx.view("tile_lesions", (h, w), capacity),
+                                       ctx.view("tile_bright", (h, w), capacity))
+
+            # 4. Components clear of internal seams are final; pieces touching one are merged later
+            seams = (tile.y0 > 0, tile.y1 < height, tile.x0 > 0, tile.x1 < width)
+            for kind, mask in zip(kinds, masks):
+                n, labels, stats, centroids = cv2.connectedComponentsWithStats(
+                    mask, labels=ctx.view("tile_labels", (h, w), capacity, np.int32), connectivity=8)
+                top, bottom, first_col, last_col = edge_ids(labels, next_id)
+                on_seam = np.zeros(n, bool)
+                for edge, internal in zip((labels[0, :], labels[-1, :], labels[:, 0], labels[:, -1]), seams):
+                    if internal:
+                        on_seam[edge] = True
+                on_seam[0] = False
+                for label in np.flatnonzero(on_seam).tolist():
+                    x, y, bw, bh, area = (int(v) for v in stats[label])
+                    px, py = centroids[label]
+                    mergers[kind].add(next_id + label,
+                                      (tile.x0 + x, tile.y0 + y, tile.x0 + x + bw, tile.y0 + y + bh),
+                                      area, (tile.x0 + px, tile.y0 + py))
+                inside = ~on_seam
+                inside[0] = False
+                found[kind][0].append(stats[inside] + np.array([tile.x0, tile.y0, 0, 0, 0]))
+                found[kind][1].append(centroids[inside] + np.array([tile.x0, tile.y0]))
+                if tile.x0 > 0:
+                    mergers[kind].stitch(first_col, left[kind], 0)
+                if tile.y0 > 0:
+                    mergers[kind].stitch(top, above[kind], tile.x0)
+                left[kind] = last_col
+                below[kind][tile.x0:tile.x1] = bottom
+                next_id += n
+
+        lesions = {}
+        for kind in kinds:
+            merged_stats, merged_centroids = mergers[kind].components()
+            stats = np.concatenate(found[kind][0] + [merged_stats])
+            centroids = np.concatenate(found[kind][1] + [merged_centroids])
+            lesions[kind] = self._lesion_stats(stats, centroids, scale)
+            lesions[kind]["mask"] = None
+        return vessels_full, lesions
+
+    def _predict_cv(self, img, contrast_enhanced, vessels, lesions=None):
+        if lesions is None:
+            lesions = self._extract_lesions(contrast_enhanced, vessels)
         
         # Count "Blobs"
-        hemo_contours, _ = cv2.findContours(lesions_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        exud_contours, _ = cv2.findContours(bright_spots, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        hemo_count = len([c for c in hemo_contours if cv2.contourArea(c) > 5])
-        exud_count = len([c for c in exud_contours if cv2.contourArea(c) > 5])
+        hemo_count = int(np.count_nonzero(lesions["hemorrhage"]["areas"] > GRADE_MIN_AREA))
+        exud_count = int(np.count_nonzero(lesions["exudate"]["areas"] > GRADE_MIN_AREA))
         
         # C. Diagnosis Logic base on feature counts
         if hemo_count == 0 and exud_count == 0:
@@ -163,22 +730,21 @@ class RetinopathyModel:
             
         return prediction, confidence, f"CV Heuristic Analysis: Found {hemo_count} red lesions, {exud_count} exudates."
 
-    def _generate_cv_annotations(self, contrast_enhanced, vessels):
-        _, dark_spots = cv2.threshold(contrast_enhanced, 20, 255, cv2.THRESH_BINARY_INV)
-        lesions_mask = cv2.subtract(dark_spots, vessels)
-        _, bright_spots = cv2.threshold(contrast_enhanced, 220, 255, cv2.THRESH_BINARY)
-        
-        hemo_contours, _ = cv2.findContours(lesions_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        exud_contours, _ = cv2.findContours(bright_spots, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    def _generate_cv_annotations(self, contrast_enhanced, vessels, lesions=None):
+        if lesions is None:
+            lesions = self._extract_lesions(contrast_enhanced, vessels)
         
         annotations = []
-        for c in hemo_contours[:15]:
-            if cv2.contourArea(c) > 10:
-                x, y, w, h = cv2.boundingRect(c)
-                annotations.append({"x": x, "y": y, "w": w, "h": h, "label": "Hemorrhage"})
-                
-        for c in exud_contours[:10]:
-            if cv2.contourArea(c) > 10:
-                x, y, w, h = cv2.boundingRect(c)
-                annotations.append({"x": x, "y": y, "w": w, "h": h, "label": "Exudate"})
+        for kind, label, limit in (("hemorrhage", "Hemorrhage", 15), ("exudate", "Exudate", 10)):
+            found = lesions[kind]
+            areas = found["areas"]
+            # Largest `limit` lesions above the minimum area, biggest first
+            keep = np.flatnonzero(areas > ANNOTATION_MIN_AREA)
+            if len(keep) > limit:
+                keep = keep[np.argpartition(-areas[keep], limit - 1)[:limit]]
+            keep = keep[np.argsort(-areas[keep], kind="stable")]
+            for (x, y, w, h), area, (cx, cy) in zip(found["boxes"][keep].tolist(), areas[keep].tolist(),
+                                                    found["centroids"][keep].tolist()):
+                annotations.append({"x": x, "y": y, "w": w, "h": h, "label": label,
+                                    "area": round(area, 1), "cx": round(cx, 1), "cy": round(cy, 1)})
         return annotations
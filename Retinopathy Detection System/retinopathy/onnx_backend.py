@@ -0,0 +1,36 @@
+import numpy as np
+import onnxruntime as ort
+
+class OnnxGrader:
+    """
+    ResNet18 DR grader on ONNX Runtime. Takes the same normalized
+    (N, 3, 224, 224) float32 batch as the torch path and returns softmax
+    probabilities as a NumPy array, so serving needs neither torch nor torchvision.
+    """
+
+    def __init__(self, path, intra_op_threads=None, inter_op_threads=None):
+        self.path = path
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        if inter_op_threads:
+            options.inter_op_num_threads = inter_op_threads
+            if inter_op_threads > 1:
+                options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+        self.session = ort.InferenceSession(path, sess_options=options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch):
+        logits = self.session.run(None, {self.input_name: np.ascontiguousarray(batch, dtype=np.float32)})[0]
+        # Numerically stable softmax over the class axis
+        logits = logits - logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def with_threads(self, intra_op_threads, inter_op_threads=None):
+        """New session on the same graph (ORT sessions must not be shared across fork)."""
+        return OnnxGrader(self.path, intra_op_threads, inter_op_threads or self.inter_op_threads)
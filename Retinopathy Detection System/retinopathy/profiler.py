@@ -0,0 +1,67 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+class SamplingProfiler:
+    """
+    Samples the Python stack of one thread at a fixed interval from a helper
+    thread and aggregates it as folded stacks ("outer;inner count" per line),
+    the input format of flamegraph.pl, speedscope and inferno.
+
+    Native code (OpenCV, torch kernels) shows up as time spent in the Python
+    frame that called it.
+    """
+
+    def __init__(self, thread_id=None, interval=0.005):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self.started = None
+        self.elapsed = 0.0
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+
+    def folded(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def dump(self, path):
+        """Writes the folded stacks to `path`. Returns the number of samples."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.folded())
+        os.replace(tmp_path, path)
+        return sum(self.samples.values())
@@ -0,0 +1,114 @@
+from collections import namedtuple
+
+import numpy as np
+
+# One processing tile: the core it is responsible for, the extended (halo) window it
+# reads, the reflect padding that reproduces OpenCV's CLAHE border handling at the
+# bottom/right image edge, and the CLAHE grid covering the padded window.
+Tile = namedtuple("Tile", "y0 y1 x0 x1 ey0 ey1 ex0 ex1 pad_bottom pad_right grid")
+
+def clahe_cell_size(length, cells):
+    """Cell size OpenCV's CLAHE uses along one axis (it pads the image up to a multiple of the grid)."""
+    return length // cells if length % cells == 0 else length // cells + 1
+
+def plan_tiles(height, width, tile_size, grid=(8, 8)):
+    """
+    Splits an image into tiles aligned to the whole-image CLAHE cells, each
+    extended by one cell of halo on every side. Per-tile CLAHE then sees the
+    same cell histograms as the whole-image pass, and every core pixel plus
+    half a cell around it gets the same interpolated value, up to the float
+    rounding of OpenCV's per-tile lookup tables. That margin also
+    covers the adaptive-threshold (11 px) and opening (2 px) neighbourhoods.
+    Returns None when the cells are too small for that margin.
+    """
+    cell_w, cell_h = clahe_cell_size(width, grid[0]), clahe_cell_size(height, grid[1])
+    if min(cell_w, cell_h) < 16:
+        return None
+    step_x = max(1, tile_size // cell_w) * cell_w
+    step_y = max(1, tile_size // cell_h) * cell_h
+    pad_right = grid[0] * cell_w - width
+    pad_bottom = grid[1] * cell_h - height
+
+    tiles = []
+    for y0 in range(0, height, step_y):
+        y1 = min(height, y0 + step_y)
+        ey0, ey1 = max(0, y0 - cell_h), min(height, y1 + cell_h)
+        pb = pad_bottom if ey1 == height else 0
+        for x0 in range(0, width, step_x):
+            x1 = min(width, x0 + step_x)
+            ex0, ex1 = max(0, x0 - cell_w), min(width, x1 + cell_w)
+            pr = pad_right if ex1 == width else 0
+            tile_grid = ((ex1 - ex0 + pr) // cell_w, (ey1 - ey0 + pb) // cell_h)
+            tiles.append(Tile(y0, y1, x0, x1, ey0, ey1, ex0, ex1, pb, pr, tile_grid))
+    return tiles
+
+class ComponentMerger:
+    """
+    Joins lesion pieces that touch internal tile seams into global components
+    (union-find over per-tile labels, 8-connected across the seam). Each piece
+    carries its box, pixel area and centroid in global pixels, so a merged
+    component has exactly the area and centroid of the whole-image component.
+    """
+
+    def __init__(self):
+        self._parent = {}
+        self._pieces = {}
+
+    def add(self, node, box, area, centroid):
+        self._parent[node] = node
+        self._pieces[node] = (box, area, centroid)
+
+    def _find(self, node):
+        root = node
+        while self._parent[root] != root:
+            root = self._parent[root]
+        while self._parent[node] != root:
+            self._parent[node], node = root, self._parent[node]
+        return root
+
+    def union(self, a, b):
+        ra, rb = self._find(a), self._find(b)
+        if ra != rb:
+            self._parent[max(ra, rb)] = min(ra, rb)
+
+    def stitch(self, mine, theirs, start):
+        """Unions node ids in `mine` with 8-connected ids in `theirs`, where theirs[start + i] borders mine[i]."""
+        for d in (-1, 0, 1):
+            offset = start + d
+            lo, hi = max(0, -offset), min(len(mine), len(theirs) - offset)
+            if hi <= lo:
+                continue
+            a, b = mine[lo:hi], theirs[lo + offset:hi + offset]
+            both = (a > 0) & (b > 0)
+            for x, y in set(zip(a[both].tolist(), b[both].tolist())):
+                self.union(x, y)
+
+    def components(self):
+        """
+        Merged components as connectedComponentsWithStats-style arrays:
+        (n, 5) stats rows (x, y, w, h, area) and (n, 2) centroids.
+        """
+        merged = {}
+        for node, ((x0, y0, x1, y1), area, (cx, cy)) in self._pieces.items():
+            root = self._find(node)
+            entry = merged.get(root)
+            if entry is None:
+                merged[root] = [x0, y0, x1, y1, area, cx * area, cy * area]
+                continue
+            entry[0], entry[1] = min(entry[0], x0), min(entry[1], y0)
+            entry[2], entry[3] = max(entry[2], x1), max(entry[3], y1)
+            entry[4] += area
+            entry[5] += cx * area
+            entry[6] += cy * area
+        if not merged:
+            return np.zeros((0, 5), np.int64), np.zeros((0, 2))
+        rows = np.array(list(merged.values()), np.float64)
+        stats = np.column_stack([rows[:, 0], rows[:, 1], rows[:, 2] - rows[:, 0], rows[:, 3] - rows[:, 1],
+                                 rows[:, 4]]).astype(np.int64)
+        return stats, rows[:, 5:7] / rows[:, 4:5]
+
+def edge_ids(labels, base):
+    """Global node ids along the four edges of a tile's label image (0 = background)."""
+    def ids(edge):
+        return np.where(edge > 0, edge.astype(np.int64) + base, 0)
+    return ids(labels[0, :]), ids(labels[-1, :]), ids(labels[:, 0]), ids(labels[:, -1])
@@ -0,0 +1,189 @@
+import copy
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from retinopathy.context import CVContextPool
+from retinopathy.model import RetinopathyModel
+
+# The worker's model, rebuilt by _init_worker from the state the parent sends
+_WORKER_MODEL = None
+
+def _pack_module(module):
+    """
+    Picklable form of a DL engine. Eager torch modules are moved to shared memory, so pickling
+    sends the storage handles rather than the weights; TorchScript archives and ONNX sessions
+    cannot be pickled and are reloaded in each worker.
+    """
+    if module is None:
+        return None
+    from retinopathy.onnx_backend import OnnxGrader
+    if isinstance(module, OnnxGrader):
+        return ('onnx', module.path, module.inter_op_threads)
+    import torch
+    import torch.multiprocessing  # registers the shared-memory tensor reductions
+    if isinstance(module, torch.jit.ScriptModule):
+        buffer = io.BytesIO()
+        torch.jit.save(module, buffer)
+        return ('script', buffer.getvalue())
+    return ('module', module.share_memory())
+
+def _unpack_module(packed, threads):
+    if packed is None:
+        return None
+    kind, payload = packed[0], packed[1]
+    if kind == 'onnx':
+        from retinopathy.onnx_backend import OnnxGrader
+        return OnnxGrader(payload, threads, packed[2])
+    if kind == 'script':
+        import torch
+        return torch.jit.load(io.BytesIO(payload), map_location='cpu').eval()
+    return payload
+
+def worker_state(model):
+    """
+    Picklable copy of a RetinopathyModel's attributes for the workers. Thread-bound
+    parts are left out: workers write masks inline, skip batching, keep no metrics
+    (they would never reach the parent's /metrics) and start with a fresh CV pool.
+    """
+    state = dict(vars(model), writer=None, batcher=None, metrics=None,
+                 cv_pool=None if model.cv_pool is None else model.cv_pool.max_idle,
+                 model=_pack_module(model.model))
+    if model.ensemble is not None:
+        ensemble = copy.copy(model.ensemble)
+        # Member 0 is the model itself; the stacked torch forwards are rebuilt on first use
+        ensemble.members = [None] + [_pack_module(m) for m in ensemble.members[1:]]
+        ensemble._torch_forwards = {}
+        state['ensemble'] = ensemble
+    return state
+
+def _init_worker(state, threads):
+    """Rebuilds the model and pins per-worker intra-op threads so N workers do not oversubscribe the cores."""
+    global _WORKER_MODEL
+    cv2.setNumThreads(threads)
+    model = RetinopathyModel.__new__(RetinopathyModel)
+    vars(model).update(state)
+    if model.cv_pool is not None:
+        model.cv_pool = CVContextPool(model.cv_pool)
+    model.model = _unpack_module(model.model, threads)
+    if model.ensemble is not None:
+        model.ensemble.members = [model.model] + [_unpack_module(m, threads) for m in model.ensemble.members[1:]]
+    if model.dl_active and model.engine != 'onnx':
+        import torch
+        torch.set_num_threads(threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass  # already fixed for this process
+    _WORKER_MODEL = model
+
+def _worker_ping():
+    return os.getpid()
+
+def _worker_predict(shm_name, kind, shape, dtype, filename, output_dir):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    img = None
+    try:
+        if kind == 'bytes':
+            encoded = np.frombuffer(shm.buf, np.uint8, count=shape[0])
+            img = cv2.imdecode(encoded, cv2.IMREAD_COLOR)
+            del encoded
+            if img is None:
+                return {"error": "Could not read image"}
+        else:
+            # Zero-copy view; the parent keeps the segment alive until this call returns
+            img = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        return _WORKER_MODEL.predict(img, filename=filename, output_dir=output_dir)
+    finally:
+        del img
+        try:
+            shm.close()
+        except BufferError:
+            pass  # a view is still referenced (e.g. by a traceback); the mapping goes away with it
+
+class ProcessPoolBackend:
+    """
+    Executes RetinopathyModel.predict in a pool of worker processes.
+
+    The model (including the ResNet18 state dict) is loaded once in the parent.
+    Workers are started from a forkserver rather than forked from the parent:
+    the parent is usually multithreaded by the time a pool is built (background
+    warm-up, registry hot swaps, torch/OpenCV thread pools), and forking such a
+    process can deadlock the child. Eager torch weights are moved to shared
+    memory and reach the workers as storage handles, so every worker maps the
+    same weight pages instead of holding its own copy. Image payloads travel
+    through multiprocessing.shared_memory segments; only the segment name and
+    shape are pickled per request. A pool whose worker died is replaced.
+    """
+
+    def __init__(self, model, workers=2, threads_per_worker=1):
+        self.model = model
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        self._state = worker_state(model)
+        self._lock = threading.Lock()
+        self.restarts = 0
+        self.pool = self._start_pool()
+        print(f"Inference worker pool started ({workers} processes x {threads_per_worker} threads)")
+
+    def _start_pool(self):
+        context = multiprocessing.get_context('forkserver')
+        # Imported once in the fork server instead of once per worker
+        context.set_forkserver_preload(['retinopathy.workers'])
+        pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                   initializer=_init_worker, initargs=(self._state, self.threads_per_worker))
+        # Start every worker now rather than on the first requests
+        wait([pool.submit(_worker_ping) for _ in range(self.workers)])
+        return pool
+
+    def _replace_pool(self, broken):
+        """Starts a new pool unless another request already replaced `broken`."""
+        with self._lock:
+            if self.pool is broken:
+                print("Inference worker pool broke (a worker died); starting a new one")
+                broken.shutdown(wait=False, cancel_futures=True)
+                self.pool = self._start_pool()
+                self.restarts += 1
+
+    def predict(self, image, filename=None, output_dir=None, timeout=None):
+        """Same contract as RetinopathyModel.predict for encoded bytes or a decoded ndarray."""
+        if isinstance(image, str):
+            filename = filename or os.path.basename(image)
+            if output_dir is None:
+                output_dir = os.path.dirname(image)
+            with open(image, 'rb') as f:
+                image = f.read()
+        if isinstance(image, np.ndarray):
+            kind, shape, dtype, nbytes = 'array', image.shape, image.dtype.str, image.nbytes
+        else:
+            image = memoryview(image).cast('B')
+            kind, shape, dtype, nbytes = 'bytes', (image.nbytes,), '|u1', image.nbytes
+        if nbytes == 0:
+            return {"error": "Could not read image"}
+
+        shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        pool = self.pool
+        try:
+            if kind == 'array':
+                np.ndarray(shape, dtype=image.dtype, buffer=shm.buf)[...] = image
+            else:
+                shm.buf[:nbytes] = image
+            future = pool.submit(_worker_predict, shm.name, kind, shape, dtype, filename, output_dir)
+            return future.result(timeout)
+        except BrokenProcessPool:
+            # Not retried: the image may be what killed the worker
+            self._replace_pool(pool)
+            return {"error": "Inference worker failed"}
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def shutdown(self, wait=True):
+        self.pool.shutdown(wait=wait)
@@ -0,0 +1,203 @@
+"""
+Bulk retinopathy screening over an image archive.
+
+Streams image paths through a generator pipeline: paths are decoded by a pool
+of prefetching threads, grouped into batches for a single DL forward pass, and
+results are appended to JSONL or Parquet as each batch completes. Re-running
+with the same output resumes after the last completed image.
+
+Example usage:
+    python screen.py --input archive/colored_images --output screening.jsonl
+    python screen.py --input archive/colored_images --output screening_parquet --format parquet
+"""
+import argparse
+import fnmatch
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from retinopathy.model import RetinopathyModel
+
+IMAGE_PATTERNS = ('*.png', '*.jpg', '*.jpeg', '*.tif', '*.tiff', '*.bmp')
+
+def iter_image_paths(root, patterns=IMAGE_PATTERNS):
+    """Yields image paths under `root` in a stable (sorted) order without listing everything up front."""
+    entries = sorted(os.scandir(root), key=lambda e: e.name)
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            yield from iter_image_paths(entry.path, patterns)
+        elif any(fnmatch.fnmatch(entry.name.lower(), p) for p in patterns):
+            yield entry.path
+
+def _decode(path):
+    start = time.perf_counter()
+    img = cv2.imread(path)
+    return path, img, time.perf_counter() - start
+
+def iter_decoded(paths, threads=4, prefetch=32):
+    """Decodes images on a thread pool, keeping up to `prefetch` in flight, in input order."""
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix='decode') as pool:
+        in_flight = deque()
+        for path in paths:
+            in_flight.append(pool.submit(_decode, path))
+            if len(in_flight) >= prefetch:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+def iter_batches(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _flatten(path, result):
+    """One output row per image; annotations are kept as a JSON string for columnar formats."""
+    size = result.get("image_size", {})
+    return {
+        "path": path,
+        "diagnosis": result.get("diagnosis"),
+        "confidence": result.get("confidence"),
+        "details": result.get("details"),
+        "lesion_count": len(result.get("annotations", [])),
+        "annotations": json.dumps(result.get("annotations", [])),
+        "width": size.get("width"),
+        "height": size.get("height"),
+        "error": result.get("error"),
+    }
+
+class JsonlSink:
+    def __init__(self, path):
+        self.path = path
+
+    def completed(self):
+        """
+        Paths already written. A truncated trailing line from a crash is cut
+        off, so rows appended on resume start on a line of their own.
+        """
+        done = set()
+        if not os.path.exists(self.path):
+            return done
+        valid_bytes = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    done.add(json.loads(line)["path"])
+                except (ValueError, KeyError):
+                    break
+                valid_bytes += len(line)
+        if valid_bytes < os.path.getsize(self.path):
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid_bytes)
+        return done
+
+    def write(self, rows):
+        with open(self.path, 'a') as f:
+            for row in rows:
+                f.write(json.dumps(row) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+class ParquetSink:
+    """Writes one part file per flush into a directory, so resuming never rewrites earlier parts."""
+
+    def __init__(self, path):
+        import pandas as pd
+        self.pd = pd
+        self.path = path
+        os.makedirs(self.path, exist_ok=True)
+
+    def _parts(self):
+        return sorted(f for f in os.listdir(self.path) if f.startswith('part-') and f.endswith('.parquet'))
+
+    def completed(self):
+        done = set()
+        for part in self._parts():
+            done.update(self.pd.read_parquet(os.path.join(self.path, part), columns=['path'])['path'])
+        return done
+
+    def write(self, rows):
+        index = len(self._parts())
+        final = os.path.join(self.path, f"part-{index:06d}.parquet")
+        tmp = f"{final}.tmp"
+        self.pd.DataFrame(rows).to_parquet(tmp, index=False)
+        os.replace(tmp, final)
+
+def screen(input_dir, output, fmt='jsonl', batch_size=16, decode_threads=4, prefetch=64,
+           flush_every=256, weights_path='retinopathy_model.pth', limit=None):
+    model = RetinopathyModel(weights_path)
+    sink = ParquetSink(output) if fmt == 'parquet' else JsonlSink(output)
+
+    done = sink.completed()
+    if done:
+        print(f"Resuming: {len(done)} images already screened in {output}")
+
+    paths = (p for p in iter_image_paths(input_dir) if p not in done)
+    if limit:
+        paths = (p for _, p in zip(range(limit), paths))
+
+    timings = {"decode": 0.0}
+    processed = 0
+    pending_rows = []
+    start = time.perf_counter()
+    last_report = start
+
+    for batch in iter_batches(iter_decoded(paths, decode_threads, prefetch), batch_size):
+        batch_paths = [path for path, _, _ in batch]
+        images = [img for _, img, _ in batch]
+        timings["decode"] += sum(seconds for _, _, seconds in batch)
+
+        # Undecodable files come back as None; predict_batch reports them as errors
+        results = model.predict_batch([img if img is not None else b'' for img in images], timings=timings)
+        pending_rows.extend(_flatten(path, result) for path, result in zip(batch_paths, results))
+        processed += len(batch)
+
+        if len(pending_rows) >= flush_every:
+            t = time.perf_counter()
+            sink.write(pending_rows)
+            timings["output"] = timings.get("output", 0.0) + time.perf_counter() - t
+            pending_rows = []
+
+        now = time.perf_counter()
+        if now - last_report >= 10:
+            print(f"{processed} images, {processed / (now - start):.1f} img/s")
+            last_report = now
+
+    if pending_rows:
+        t = time.perf_counter()
+        sink.write(pending_rows)
+        timings["output"] = timings.get("output", 0.0) + time.perf_counter() - t
+
+    elapsed = time.perf_counter() - start
+    print(f"\nScreened {processed} images in {elapsed:.1f}s ({processed / elapsed if elapsed else 0:.1f} img/s)")
+    if processed:
+        print("Per-stage time (decode is summed across decode threads):")
+        for stage, seconds in sorted(timings.items(), key=lambda kv: -kv[1]):
+            print(f"  {stage:<14} {seconds:8.2f}s  {seconds / processed * 1000:8.2f} ms/img")
+    return processed, timings
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Bulk retinopathy screening')
+    parser.add_argument('--input', type=str, required=True, help='Root folder of fundus images (searched recursively)')
+    parser.add_argument('--output', type=str, required=True, help='JSONL file or Parquet directory')
+    parser.add_argument('--format', choices=['jsonl', 'parquet'], default='jsonl')
+    parser.add_argument('--weights', type=str, default='retinopathy_model.pth')
+    parser.add_argument('--batch-size', type=int, default=16, help='Images per DL forward pass')
+    parser.add_argument('--decode-threads', type=int, default=4)
+    parser.add_argument('--prefetch', type=int, default=64, help='Decoded images kept in flight')
+    parser.add_argument('--flush-every', type=int, default=256, help='Rows buffered before writing (checkpoint granularity)')
+    parser.add_argument('--limit', type=int, default=None, help='Stop after N new images')
+
+    args = parser.parse_args()
+    screen(args.input, args.output, args.format, args.batch_size, args.decode_threads,
+           args.prefetch, args.flush_every, args.weights, args.limit)
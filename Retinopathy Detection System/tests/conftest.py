@@ -0,0 +1,53 @@
+import os
+import sys
+import threading
+
+import pytest
+
+# Tests import the project modules the way app.py does, from the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture(scope="session")
+def app_module(tmp_path_factory):
+    # Lazy startup keeps the import from loading models; nothing is written to static/uploads
+    env = pytest.MonkeyPatch()
+    env.setenv('STARTUP_MODE', 'lazy')
+    env.setenv('SAVE_UPLOADS', '0')
+    env.setenv('MODEL_RELOAD_SECONDS', '0')
+    env.setenv('USER_STORE_PATH', str(tmp_path_factory.mktemp('users') / 'users.db'))
+    import app
+    yield app
+    env.undo()
+
+@pytest.fixture
+def startup(app_module, monkeypatch):
+    """Fresh startup state; returns a function setting (mode, state, models loaded)."""
+    ready = threading.Event()
+    state = {'mode': 'lazy', 'state': 'pending', 'error': None, 'load_seconds': None}
+    monkeypatch.setattr(app_module, '_models_ready', ready)
+    monkeypatch.setattr(app_module, 'startup_state', state)
+
+    def set_state(mode, status, loaded=False):
+        monkeypatch.setattr(app_module, 'STARTUP_MODE', mode)
+        state.update(mode=mode, state=status)
+        if loaded:
+            ready.set()
+    return set_state
+
+@pytest.fixture(scope="session")
+def diabetes_forest():
+    """A small forest fitted on synthetic PIMA rows."""
+    from sklearn.ensemble import RandomForestClassifier
+    from benchmarks.synthetic import make_pima_rows
+    df = make_pima_rows(500)
+    return RandomForestClassifier(n_estimators=10, random_state=0).fit(df.drop(columns='Outcome').to_numpy(), df['Outcome'].to_numpy())
+
+@pytest.fixture
+def served(app_module, startup, monkeypatch, diabetes_forest):
+    """Marks models as loaded and serves `diabetes_forest` from a fresh diabetes slot."""
+    from model_registry import ModelSlot
+    slot = ModelSlot('diabetes')
+    slot.load(diabetes_forest, 'test')
+    monkeypatch.setattr(app_module, 'diabetes_slot', slot)
+    startup('eager', 'ready', loaded=True)
+    return app_module
@@ -0,0 +1,96 @@
+import io
+import json
+import threading
+
+import pytest
+
+@pytest.mark.parametrize("mode", ["eager", "background"])
+def test_preloading_modes_are_ready_once_models_load(app_module, startup, mode):
+    client = app_module.app.test_client()
+    startup(mode, 'loading')
+    assert client.get('/readyz').status_code == 503
+
+    startup(mode, 'ready', loaded=True)
+    response = client.get('/readyz')
+    assert response.status_code == 200 and response.get_json()['models_loaded']
+
+def test_lazy_mode_is_ready_before_the_first_prediction(app_module, startup):
+    client = app_module.app.test_client()
+    startup('lazy', 'pending')
+
+    response = client.get('/readyz')
+    assert response.status_code == 200
+    assert response.get_json()['ready'] and not response.get_json()['models_loaded']
+    assert not app_module._models_ready.is_set()
+
+def test_lazy_mode_is_not_ready_after_a_failed_load(app_module, startup):
+    startup('lazy', 'failed')
+    assert app_module.app.test_client().get('/readyz').status_code == 503
+
+def test_liveness_does_not_depend_on_models(app_module, startup):
+    startup('background', 'loading')
+    assert app_module.app.test_client().get('/healthz').status_code == 200
+
+def test_profiler_is_stopped_and_dumped_when_the_handler_fails(served, monkeypatch, tmp_path):
+    monkeypatch.setattr(served, 'PROFILING_ENABLED', True)
+    monkeypatch.setattr(served, 'PROFILE_DIR', str(tmp_path))
+    monkeypatch.setattr(served, 'diabetes_prediction', lambda data: 1 / 0)
+
+    response = served.app.test_client().post('/api/predict?profile=1', json={'glucose': 120})
+    assert response.status_code == 500
+    assert not [t for t in threading.enumerate() if t.name == 'sampling-profiler']
+    assert len(list(tmp_path.glob('*.folded'))) == 1
+
+def test_model_load_metrics_do_not_grow_with_versions(served):
+    before = served.metrics.snapshot("app_model_loads_total").get((('model', 'diabetes'),), 0)
+    for version in ('v1', 'v2', 'v3'):
+        served.count_model_load('diabetes', version)
+    series = served.metrics.snapshot("app_model_loads_total")
+    assert series[(('model', 'diabetes'),)] == before + 3
+    assert all(dict(labels).keys() == {'model'} for labels in series)
+
+    info = [line for line in served.app.test_client().get('/metrics').text.splitlines()
+            if line.startswith('app_model_info{')]
+    assert info == ['app_model_info{model="diabetes",version="test"} 1']
+
+def _patients(n):
+    return [{'pregnancies': i % 5, 'glucose': 80 + i % 120, 'bp': 70, 'skin': 20,
+             'insulin': 80, 'bmi': 22 + i % 20, 'dpf': 0.5, 'age': 21 + i % 50} for i in range(n)]
+
+@pytest.mark.parametrize("n", [1, 5000, 5001, 10001])
+def test_batch_streams_whole_chunks_in_input_order(served, n):
+    response = served.app.test_client().post('/api/predict/batch', json=_patients(n), buffered=False)
+    assert response.status_code == 200 and response.mimetype == 'application/x-ndjson'
+    chunks = [chunk.decode() for chunk in response.response]
+    full, rest = divmod(n, served.BATCH_STREAM_CHUNK)
+    assert [chunk.count('\n') for chunk in chunks] == [served.BATCH_STREAM_CHUNK] * full + ([rest] if rest else [])
+    assert [json.loads(line)['index'] for line in ''.join(chunks).splitlines()] == list(range(n))
+
+def test_batch_matches_single_predictions(served):
+    client = served.app.test_client()
+    patients = _patients(50)
+    batch = [json.loads(line) for line in client.post('/api/predict/batch', json={'patients': patients}).text.splitlines()]
+    for row, patient in zip(batch, patients):
+        single = client.post('/api/predict', json=patient).get_json()
+        assert row['prediction'] == single['prediction'] and row['risk_level'] == single['risk_level']
+        assert row['probability'] == pytest.approx(single['probability'])
+        assert row['model_version'] == single['model_version']
+
+@pytest.mark.parametrize("bad_row", [{'glucose': 'high'}, 42, None])
+def test_malformed_row_mid_batch_rejects_the_whole_batch(served, bad_row):
+    patients = _patients(10)
+    patients[5] = bad_row
+    response = served.app.test_client().post('/api/predict/batch', json=patients)
+    assert response.status_code == 400 and 'error' in response.get_json()
+
+def test_malformed_csv_value_mid_file_is_rejected(served):
+    csv = 'glucose,bmi,age\n120,30,40\nnot-a-number,31,41\n130,32,42\n'
+    response = served.app.test_client().post('/api/predict/batch', data={'file': (io.BytesIO(csv.encode()), 'rows.csv')})
+    assert response.status_code == 400
+
+def test_batch_row_limit(served, monkeypatch):
+    monkeypatch.setattr(served, 'MAX_BATCH_ROWS', 10)
+    client = served.app.test_client()
+    assert client.post('/api/predict/batch', json=_patients(10)).status_code == 200
+    response = client.post('/api/predict/batch', json=_patients(11))
+    assert response.status_code == 413 and 'max 10' in response.get_json()['error']
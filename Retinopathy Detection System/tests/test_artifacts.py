@@ -0,0 +1,43 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from retinopathy.artifacts import ArtifactWriter
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_written_artifacts_exist_after_wait(tmp_path, workers):
+    writer = ArtifactWriter(workers=workers, image_format="png")
+    mask = writer.write_image(str(tmp_path / "segmented_a.jpg"), np.zeros((32, 32), np.uint8))
+    upload = writer.write_bytes(str(tmp_path / "a.jpg"), b"upload")
+
+    assert mask.endswith(".png")
+    assert writer.wait(mask, timeout=5) and writer.wait(upload, timeout=5)
+    assert os.path.exists(mask)
+    with open(upload, 'rb') as f:
+        assert f.read() == b"upload"
+    writer.shutdown()
+    assert writer.stats()["written"] == 2
+
+def test_inline_writer_has_nothing_pending(tmp_path):
+    writer = ArtifactWriter(workers=0)
+    path = writer.write_bytes(str(tmp_path / "a.bin"), b"x")
+    assert not writer.is_pending(path)
+    assert writer.stats()["queue_depth"] == 0
+
+def test_concurrent_writes_to_one_path_do_not_collide(tmp_path):
+    # Inline writer: each caller thread writes the same path itself, as two uploads named alike would
+    writer = ArtifactWriter(workers=0)
+    path = str(tmp_path / "eye.jpg")
+    payloads = [bytes([i]) * (1 << 20) for i in range(8)]
+    threads = [threading.Thread(target=writer.write_bytes, args=(path, p)) for p in payloads]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert writer.stats()["failed"] == 0
+    with open(path, 'rb') as f:
+        assert f.read() in payloads
+    assert os.listdir(tmp_path) == ["eye.jpg"]
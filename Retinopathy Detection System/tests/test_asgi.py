@@ -0,0 +1,56 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+pytest.importorskip('starlette')
+pytest.importorskip('a2wsgi')
+from starlette.testclient import TestClient
+
+from benchmarks.synthetic import encode, make_fundus
+
+@pytest.fixture
+def asgi(served):
+    import asgi
+    return asgi
+
+@pytest.fixture
+def client(asgi):
+    # Not entered as a context manager: the lifespan would shut the shared inference pool down
+    return TestClient(asgi.application)
+
+def test_batch_scoring_is_served_natively_through_admission_control(asgi, client, monkeypatch):
+    rows = [{'glucose': 90 + i, 'bmi': 30, 'age': 40} for i in range(10)]
+    response = client.post('/api/predict/batch', json=rows)
+    assert response.status_code == 200 and response.headers['content-type'] == 'application/x-ndjson'
+    assert [json.loads(line)['index'] for line in response.text.splitlines()] == list(range(10))
+    assert client.post('/api/predict/batch', json={'rows': []}).status_code == 400
+
+    # No free slot: the batch waits for QUEUE_TIMEOUT_SECONDS, then gets a 503
+    monkeypatch.setattr(asgi, '_slots', asyncio.Semaphore(0))
+    monkeypatch.setattr(asgi, 'QUEUE_TIMEOUT_SECONDS', 0.05)
+    response = client.post('/api/predict/batch', json=rows)
+    assert response.status_code == 503 and response.json()['reason'] == 'queue_timeout'
+
+def test_large_upload_is_saved_only_on_a_cache_miss(asgi, client, monkeypatch, tmp_path):
+    from model_registry import ModelSlot
+    from retinopathy.cache import ResultCache
+    from retinopathy.model import RetinopathyModel
+    slot = ModelSlot('retinopathy')
+    slot.load((RetinopathyModel(weights_path=''), None), 'cv')
+    monkeypatch.setattr(asgi.flask_app, 'retinopathy_slot', slot)
+    monkeypatch.setattr(asgi.flask_app, 'result_cache', ResultCache(max_entries=8))
+    monkeypatch.setattr(asgi.flask_app, 'SAVE_UPLOADS', True)
+    monkeypatch.setitem(asgi.flask_app.app.config, 'UPLOAD_FOLDER', str(tmp_path))
+
+    # Past MMAP_THRESHOLD, so the upload reaches the model as a memory map
+    image = encode(make_fundus(1600, 1200))
+    assert len(image) > asgi.MMAP_THRESHOLD
+    first = client.post('/api/retinopathy/predict', files={'file': ('eye.png', image, 'image/png')}).json()
+    assert 'error' not in first and not first.get('cached')
+    assert (tmp_path / 'eye.png').read_bytes() == image
+
+    os.remove(tmp_path / 'eye.png')
+    second = client.post('/api/retinopathy/predict', files={'file': ('eye.png', image, 'image/png')}).json()
+    assert second['cached'] and not (tmp_path / 'eye.png').exists()
@@ -0,0 +1,57 @@
+import threading
+
+import numpy as np
+import pytest
+
+from retinopathy.batching import DynamicBatcher
+
+def run_clients(batcher, n):
+    results = [None] * n
+    barrier = threading.Barrier(n)
+
+    def client(i):
+        barrier.wait()
+        results[i] = batcher.submit(np.full(3, i, np.float32), timeout=10)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+def test_each_caller_gets_its_own_row():
+    sizes = []
+
+    def forward(batch):
+        sizes.append(len(batch))
+        return batch * 2
+
+    batcher = DynamicBatcher(forward, max_batch_size=4, max_wait_ms=20, stack=np.stack)
+    batcher.start()
+    try:
+        results = run_clients(batcher, 16)
+    finally:
+        batcher.stop()
+
+    for i, row in enumerate(results):
+        np.testing.assert_array_equal(row, np.full(3, 2 * i))
+    assert max(sizes) <= 4 and sum(sizes) == 16
+    assert batcher.stats()["items"] == 16
+
+def test_forward_errors_reach_every_caller_in_the_batch():
+    def forward(batch):
+        raise ValueError("bad batch")
+
+    batcher = DynamicBatcher(forward, max_batch_size=2, max_wait_ms=1, stack=np.stack)
+    batcher.start()
+    try:
+        with pytest.raises(ValueError, match="bad batch"):
+            batcher.submit(np.zeros(3, np.float32), timeout=10)
+    finally:
+        batcher.stop()
+
+def test_submit_requires_a_running_batcher():
+    batcher = DynamicBatcher(lambda batch: batch, stack=np.stack)
+    with pytest.raises(RuntimeError):
+        batcher.submit(np.zeros(3, np.float32))
@@ -0,0 +1,47 @@
+import json
+import os
+
+from retinopathy.cache import ResultCache
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResultCache(max_entries=2)
+    cache.put("a", {"diagnosis": "No DR"})
+    cache.put("b", {"diagnosis": "Mild"})
+    assert cache.get("a") is not None  # "b" is now the oldest
+    cache.put("c", {"diagnosis": "Severe"})
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"diagnosis": "No DR"} and cache.get("c") == {"diagnosis": "Severe"}
+    assert cache.stats()["entries"] == 2
+
+def test_byte_budget_evicts_oldest_entries():
+    payload = {"annotations": "x" * 100}
+    size = len(json.dumps(payload))
+    cache = ResultCache(max_entries=100, max_bytes=3 * size)
+    for key in "abcd":
+        cache.put(key, payload)
+
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] == 3 * size
+
+def test_disk_tier_survives_restart_and_is_bounded(tmp_path):
+    cache = ResultCache(max_entries=1, disk_dir=str(tmp_path), disk_max_entries=2)
+    for key in "abc":
+        cache.put(key, {"key": key})
+
+    assert sorted(os.listdir(tmp_path)) == ["b.json", "c.json"]
+    restarted = ResultCache(disk_dir=str(tmp_path))
+    assert restarted.get("b") == {"key": "b"}
+    assert restarted.stats()["disk_hits"] == 1
+
+def test_key_depends_on_bytes_and_version():
+    assert ResultCache.key(b"image", "v1") == ResultCache.key(b"image", "v1")
+    assert ResultCache.key(b"image", "v1") != ResultCache.key(b"image", "v2")
+    assert ResultCache.key(b"image", "v1") != ResultCache.key(b"other", "v1")
+
+def test_registry_version_keys_are_written_to_the_disk_tier(tmp_path):
+    key = ResultCache.key(b"image", "v12/3f9a1c-onnx")
+    ResultCache(disk_dir=str(tmp_path)).put(key, {"diagnosis": "Mild"})
+
+    assert os.listdir(tmp_path) == [f"{key}.json"]
+    assert ResultCache(disk_dir=str(tmp_path)).get(key) == {"diagnosis": "Mild"}
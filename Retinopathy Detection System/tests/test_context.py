@@ -0,0 +1,27 @@
+from retinopathy.context import CVContext, CVContextPool
+from retinopathy.model import RetinopathyModel
+from benchmarks.synthetic import make_fundus
+
+def test_buffers_are_reused_for_the_same_shape():
+    ctx = CVContext()
+    first = ctx.buffer("mask", (4, 4))
+    assert ctx.buffer("mask", (4, 4)) is first
+    assert ctx.buffer("mask", (8, 4)) is not first
+    assert (ctx.allocations, ctx.reuses) == (2, 1)
+
+def test_pool_hands_back_returned_contexts():
+    pool = CVContextPool(max_idle=1)
+    with pool.acquire() as ctx:
+        pass
+    with pool.acquire() as again:
+        assert again is ctx
+
+def test_pooled_and_fresh_contexts_give_the_same_result():
+    img = make_fundus(1152, 864)
+    fresh = RetinopathyModel(weights_path='')
+    pooled = RetinopathyModel(weights_path='', reuse_buffers=True)
+    assert fresh.cv_pool is None
+    expected = fresh.predict(img)
+    for _ in range(2):
+        result = pooled.predict(img)
+        assert (result["diagnosis"], result["annotations"]) == (expected["diagnosis"], expected["annotations"])
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+
+from diabetes_store import FEATURE_COLUMNS, LABEL_COLUMN, ModelVersions, PartitionStore
+
+def records(n, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.random((n, len(FEATURE_COLUMNS))) * 100, columns=FEATURE_COLUMNS)
+    df[LABEL_COLUMN] = rng.integers(0, 2, n)
+    return df
+
+def test_partitions_load_in_append_order(tmp_path):
+    store = PartitionStore(str(tmp_path))
+    first, second = records(5, seed=1), records(3, seed=2)
+
+    assert [store.append(first), store.append(second)] == ["part-000001", "part-000002"]
+    X, y = store.load()
+    np.testing.assert_allclose(X, pd.concat([first, second])[FEATURE_COLUMNS].to_numpy(np.float32))
+    assert y.tolist() == pd.concat([first, second])[LABEL_COLUMN].tolist()
+    assert store.rows(["part-000002"]) == 3
+
+def test_published_models_are_versioned_and_exported(tmp_path):
+    df = records(40)
+    model = RandomForestClassifier(n_estimators=3, random_state=0).fit(df[FEATURE_COLUMNS], df[LABEL_COLUMN])
+    versions = ModelVersions(str(tmp_path / "versions"))
+
+    versions.publish_model(model, partitions=["part-000001"])
+    current = versions.verify(versions.publish_model(model, partitions=["part-000001", "part-000002"]))
+
+    assert versions.versions() == [1, 2]
+    assert current["version"] == 2 and current["n_estimators"] == 3
+    assert current["partitions"] == ["part-000001", "part-000002"]
+    model_path, compiled_path = str(tmp_path / "model.pkl"), str(tmp_path / "forest.npz")
+    assert versions.export_current(model_path, compiled_path)["version"] == 2
+    with open(model_path, 'rb') as exported, open(current["model_path"], 'rb') as published:
+        assert exported.read() == published.read()
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("sklearn")
+from sklearn.ensemble import RandomForestClassifier
+
+from forest import NUMBA_SUPPORT, CompiledForest, export_forest
+
+@pytest.fixture(scope="module")
+def forest(tmp_path_factory):
+    rng = np.random.RandomState(0)
+    X = rng.normal(size=(400, 8)).astype(np.float32)
+    y = (X[:, 0] + X[:, 1] * X[:, 2] > 0).astype(int)
+    model = RandomForestClassifier(n_estimators=25, max_depth=8, random_state=0).fit(X, y)
+    path = tmp_path_factory.mktemp("forest") / "forest.npz"
+    with open(path, 'wb') as f:
+        export_forest(model, f)
+    return model, str(path), rng.normal(size=(300, 8))
+
+def test_numpy_evaluator_matches_sklearn(forest):
+    model, path, X = forest
+    compiled = CompiledForest.load(path, use_numba=False)
+    np.testing.assert_allclose(compiled.predict_proba(X, chunk_size=64), model.predict_proba(X.astype(np.float32)),
+                               rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(compiled.predict(X), model.predict(X.astype(np.float32)))
+
+@pytest.mark.skipif(not NUMBA_SUPPORT, reason="numba is not installed")
+def test_numba_evaluator_matches_sklearn(forest):
+    model, path, X = forest
+    compiled = CompiledForest.load(path)
+    np.testing.assert_allclose(compiled.predict_proba(X), model.predict_proba(X.astype(np.float32)), rtol=0, atol=1e-12)
+
+class Recorder:
+    def __init__(self, model):
+        self.model = model
+        self.rows = []
+
+    def predict_proba(self, X):
+        self.rows.append(len(X))
+        return self.model.predict_proba(X)
+
+def test_large_batches_use_the_fallback_without_numba(forest):
+    model, path, X = forest
+    fallback = Recorder(model)
+    compiled = CompiledForest.load(path, use_numba=False, fallback=fallback)
+    compiled.fallback_rows = 100
+
+    compiled.predict_proba(X[:100])
+    assert fallback.rows == []
+    np.testing.assert_allclose(compiled.predict_proba(X), model.predict_proba(X.astype(np.float32)), atol=1e-12)
+    assert fallback.rows == [300]
+
+def test_feature_count_is_checked(forest):
+    _, path, X = forest
+    with pytest.raises(ValueError):
+        CompiledForest.load(path, use_numba=False).predict_proba(X[:, :5])
@@ -0,0 +1,46 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from retinopathy.context import CVContext
+from retinopathy.model import RetinopathyModel
+from benchmarks.synthetic import make_fundus
+
+UPLOADS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static', 'uploads')
+
+@pytest.fixture(scope="module")
+def model():
+    return RetinopathyModel(weights_path='')
+
+def test_extracted_lesions_are_the_mask_components(model):
+    img = make_fundus(800, 600)
+    ctx = CVContext()
+    contrast_enhanced, vessels = model._segment_vessels(img, ctx)
+    lesions = model._extract_lesions(contrast_enhanced, vessels, 1.0, ctx)
+
+    for kind in ("hemorrhage", "exudate"):
+        _, _, stats, centroids = cv2.connectedComponentsWithStats(lesions[kind]["mask"], connectivity=8)
+        assert len(lesions[kind]["areas"]) == len(stats) - 1 > 0
+        np.testing.assert_array_equal(lesions[kind]["areas"], stats[1:, cv2.CC_STAT_AREA])
+        np.testing.assert_array_equal(lesions[kind]["boxes"], stats[1:, :4])
+        np.testing.assert_allclose(lesions[kind]["centroids"], centroids[1:])
+
+def test_scaled_areas_and_boxes_are_in_original_pixels():
+    stats = np.array([[10, 20, 3, 4, 9]])
+    scaled = RetinopathyModel._lesion_stats(stats, np.array([[11.0, 21.5]]), scale=2.0)
+    assert scaled["areas"].tolist() == [36.0]
+    assert scaled["boxes"].tolist() == [[20, 40, 6, 8]]
+    assert scaled["centroids"].tolist() == [[22.5, 43.5]]
+
+@pytest.mark.parametrize("name, details", [
+    ("2E8A87AE-8791-40C5-8E11-26F37FA598A0.png", "Found 5 red lesions, 6 exudates."),
+    ("BAC0E772-63E1-4C75-BAF3-D10F8DB33437.jpeg", "Found 3 red lesions, 5 exudates."),
+    ("Fundus_-_diabetic_retinopathy.png", "Found 11 red lesions, 8 exudates."),
+])
+def test_sample_images_keep_their_cv_grades(model, name, details):
+    with open(os.path.join(UPLOADS, name), 'rb') as f:
+        result = model.predict(f.read())
+    assert result["diagnosis"] == "Moderate Nonproliferative DR"
+    assert result["details"].endswith(details)
@@ -0,0 +1,76 @@
+import threading
+
+import pytest
+
+from model_registry import ChecksumError, ModelRegistry, ModelSlot, RegistryWatcher
+
+def publish(registry, tmp_path, content, **metadata):
+    path = tmp_path / "weights.pth"
+    path.write_bytes(content)
+    return registry.publish({"weights": str(path)}, **metadata)
+
+def test_publish_activate_and_rollback(tmp_path):
+    registry = ModelRegistry(str(tmp_path / "registry"))
+    assert registry.current() is None
+    publish(registry, tmp_path, b"one", note="first")
+    publish(registry, tmp_path, b"two")
+
+    assert registry.versions() == [1, 2]
+    assert registry.current()["version"] == 2
+    registry.activate(1)
+    current = registry.verify(registry.current())
+    assert current["note"] == "first"
+    with open(current["paths"]["weights"], 'rb') as f:
+        assert f.read() == b"one"
+    with pytest.raises(ValueError):
+        registry.activate(3)
+
+def test_verify_detects_modified_and_missing_artifacts(tmp_path):
+    registry = ModelRegistry(str(tmp_path / "registry"))
+    manifest = publish(registry, tmp_path, b"weights")
+    path = manifest["paths"]["weights"]
+
+    with open(path, 'ab') as f:
+        f.write(b"corrupt")
+    with pytest.raises(ChecksumError):
+        registry.verify(manifest)
+
+    (tmp_path / "registry" / "v0001" / "weights.pth").unlink()
+    with pytest.raises(ChecksumError):
+        registry.verify(manifest)
+
+def test_swap_closes_the_previous_model_after_its_requests(tmp_path):
+    closed = []
+    done = threading.Event()
+    slot = ModelSlot("test", close=lambda model: (closed.append(model), done.set()))
+    with slot.acquire() as (model, version):
+        assert (model, version) == (None, None)
+
+    slot.load("model-a", "v1")
+    with slot.acquire() as (model, version):
+        assert (model, version) == ("model-a", "v1")
+        slot.load("model-b", "v2")
+        assert not done.wait(0.2)  # model-a is still pinned by this request
+        assert slot.version == "v2"
+    assert done.wait(5)
+    assert closed == ["model-a"]
+    assert slot.stats() == {"version": "v2", "in_flight": 0, "swaps": 2}
+
+def test_watcher_swaps_verified_versions_and_keeps_the_active_one_on_failure(tmp_path):
+    registry = ModelRegistry(str(tmp_path / "registry"))
+    slot = ModelSlot("test")
+    swaps = []
+    watcher = RegistryWatcher(registry, slot, load=lambda manifest: manifest["version"],
+                              on_swap=lambda name, label: swaps.append(label))
+    assert not watcher.check()
+
+    publish(registry, tmp_path, b"one")
+    assert watcher.check() and not watcher.check()
+    assert (slot.model, slot.version) == (1, "v1")
+
+    manifest = publish(registry, tmp_path, b"two")
+    with open(manifest["paths"]["weights"], 'wb') as f:
+        f.write(b"tampered")
+    with pytest.raises(ChecksumError):
+        watcher.check()
+    assert slot.version == "v1" and swaps == ["v1"]
@@ -0,0 +1,60 @@
+import json
+import os
+
+import cv2
+
+from screen import JsonlSink, iter_decoded, iter_image_paths, screen
+from benchmarks.synthetic import make_fundus
+
+def make_archive(root):
+    os.makedirs(os.path.join(root, "b"))
+    for i, name in enumerate(["a1.png", "b/b1.jpg", "b/b2.png", "c.png"]):
+        cv2.imwrite(os.path.join(root, name), make_fundus(320, 240, seed=i))
+    with open(os.path.join(root, "b", "broken.png"), 'wb') as f:
+        f.write(b"not an image")
+    with open(os.path.join(root, "notes.txt"), 'w') as f:
+        f.write("skipped")
+
+def read_rows(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+def test_paths_are_sorted_and_decoded_in_order(tmp_path):
+    make_archive(str(tmp_path))
+    paths = list(iter_image_paths(str(tmp_path)))
+    assert [os.path.relpath(p, tmp_path) for p in paths] == ["a1.png", os.path.join("b", "b1.jpg"),
+                                                            os.path.join("b", "b2.png"),
+                                                            os.path.join("b", "broken.png"), "c.png"]
+    decoded = list(iter_decoded(paths, threads=3, prefetch=2))
+    assert [path for path, _, _ in decoded] == paths
+    assert [img is None for _, img, _ in decoded] == [False, False, False, True, False]
+
+def test_rerun_resumes_after_completed_images(tmp_path):
+    archive, output = str(tmp_path / "archive"), str(tmp_path / "screening.jsonl")
+    make_archive(archive)
+
+    first, _ = screen(archive, output, batch_size=2, flush_every=1, weights_path='', limit=3)
+    rest, _ = screen(archive, output, batch_size=2, flush_every=1, weights_path='')
+
+    rows = read_rows(output)
+    assert (first, rest) == (3, 2)
+    assert [row["path"] for row in rows] == list(iter_image_paths(archive))
+    broken = next(row for row in rows if row["path"].endswith("broken.png"))
+    assert broken["error"] and all(row["diagnosis"] for row in rows if row is not broken)
+
+def test_truncated_trailing_line_is_not_counted_as_done(tmp_path):
+    path = str(tmp_path / "out.jsonl")
+    JsonlSink(path).write([{"path": "a.png"}])
+    with open(path, 'a') as f:
+        f.write('{"path": "b.p')
+    assert JsonlSink(path).completed() == {"a.png"}
+
+def test_rows_after_a_truncated_line_are_kept(tmp_path):
+    path = str(tmp_path / "out.jsonl")
+    JsonlSink(path).write([{"path": "a.png"}])
+    with open(path, 'a') as f:
+        f.write('{"path": "b.p')
+    sink = JsonlSink(path)
+    sink.completed()
+    sink.write([{"path": "b.png"}, {"path": "c.png"}])
+    assert JsonlSink(path).completed() == {"a.png", "b.png", "c.png"}
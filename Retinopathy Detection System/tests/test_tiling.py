@@ -0,0 +1,28 @@
+import numpy as np
+
+from retinopathy.context import CVContext
+from retinopathy.model import RetinopathyModel
+from benchmarks.synthetic import make_fundus
+
+def test_tiled_segmentation_matches_whole_image():
+    img = make_fundus(1600, 1200)
+    whole = RetinopathyModel(weights_path='')
+    ctx = CVContext()
+    contrast_enhanced, vessels = whole._segment_vessels(img, ctx)
+    lesions = whole._extract_lesions(contrast_enhanced, vessels, 1.0, ctx)
+
+    tiled = RetinopathyModel(weights_path='', tile_size=512, tile_min_pixels=0)
+    tiled_vessels, tiled_lesions = tiled._segment_tiled(img, CVContext(), keep_vessels=True)
+
+    # Per-tile CLAHE may round a few pixels differently, so parity is checked within a tolerance
+    assert np.mean(tiled_vessels != vessels) <= 1e-4
+    for kind in lesions:
+        expected, got = np.sort(lesions[kind]["areas"]), np.sort(tiled_lesions[kind]["areas"])
+        assert abs(len(got) - len(expected)) <= 0.01 * len(expected)
+        if len(got) == len(expected):
+            np.testing.assert_array_equal(got, expected)
+
+def test_small_images_are_not_tiled():
+    img = make_fundus(1600, 1200)
+    model = RetinopathyModel(weights_path='', tile_size=512)
+    assert model._segment_tiled(img, CVContext()) is None
@@ -0,0 +1,65 @@
+import csv
+import sqlite3
+
+import pytest
+
+from user_store import CsvUserStore, SqliteUserStore, create_user_store
+
+def write_users_csv(path, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['name', 'dob', 'password'])
+        writer.writerows(rows)
+
+@pytest.fixture(params=['csv', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'csv':
+        yield CsvUserStore(str(tmp_path / 'users.csv'))
+    else:
+        store = SqliteUserStore(str(tmp_path / 'users.db'))
+        yield store
+        store.close()
+
+def test_add_get_and_update_password(store):
+    assert store.add('alice', '1990-01-01', 'secret')
+    assert store.get('alice') == {'name': 'alice', 'dob': '1990-01-01', 'password': 'secret'}
+    assert store.get('bob') is None
+
+    assert not store.update_password('alice', '2000-01-01', 'wrong dob')
+    assert store.update_password('alice', '1990-01-01', 'changed')
+    assert store.get('alice')['password'] == 'changed'
+
+def test_names_are_unique(store):
+    assert store.add('alice', '1990-01-01', 'secret')
+    assert not store.add('alice', '1985-05-05', 'other')
+    assert store.get('alice')['dob'] == '1990-01-01'
+
+def test_unique_index_rejects_duplicate_rows(tmp_path):
+    store = SqliteUserStore(str(tmp_path / 'users.db'))
+    store.add('alice', '1990-01-01', 'secret')
+    with store._connection() as conn, pytest.raises(sqlite3.IntegrityError):
+        conn.execute("INSERT INTO users (name, dob, password) VALUES ('alice', 'x', 'y')")
+    store.close()
+
+def test_csv_import_keeps_the_first_row_per_name(tmp_path):
+    csv_path = str(tmp_path / 'users.csv')
+    write_users_csv(csv_path, [('alice', '1990-01-01', 'first'), ('bob', '1980-02-02', 'pw'),
+                               ('alice', '1991-01-01', 'second')])
+    store = SqliteUserStore(str(tmp_path / 'users.db'))
+
+    assert store.import_csv(csv_path, batch_size=2) == 3
+    assert store.get('alice')['password'] == 'first'
+    assert store.get('bob') is not None
+    store.close()
+
+def test_new_sqlite_store_is_seeded_from_csv_once(tmp_path):
+    csv_path, db_path = str(tmp_path / 'users.csv'), str(tmp_path / 'users.db')
+    write_users_csv(csv_path, [('alice', '1990-01-01', 'secret')])
+    store = create_user_store('sqlite', db_path, csv_path)
+    assert store.get('alice') is not None
+    store.update_password('alice', '1990-01-01', 'changed')
+    store.close()
+
+    reopened = create_user_store('sqlite', db_path, csv_path)
+    assert reopened.get('alice')['password'] == 'changed'
+    reopened.close()
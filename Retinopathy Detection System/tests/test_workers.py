@@ -0,0 +1,57 @@
+import importlib.util
+import os
+
+import pytest
+
+from retinopathy import workers
+from retinopathy.model import RetinopathyModel
+from retinopathy.workers import ProcessPoolBackend
+from benchmarks.synthetic import encode, make_fundus
+
+def worker_weights_shared():
+    """Runs in a worker: whether every parameter of its model lives in shared memory."""
+    return all(p.is_shared() for p in workers._WORKER_MODEL.model.parameters())
+
+@pytest.fixture(scope="module")
+def image():
+    return encode(make_fundus(640, 480))
+
+def test_pool_predictions_match_in_process(image):
+    model = RetinopathyModel(weights_path='')
+    backend = ProcessPoolBackend(model, workers=1)
+    try:
+        expected, got = model.predict(image), backend.predict(image)
+        assert got["diagnosis"] == expected["diagnosis"] and got["annotations"] == expected["annotations"]
+        assert backend.predict(b"not an image") == {"error": "Could not read image"}
+    finally:
+        backend.shutdown()
+
+def test_pool_is_replaced_after_a_worker_dies(image):
+    model = RetinopathyModel(weights_path='')
+    backend = ProcessPoolBackend(model, workers=1)
+    try:
+        backend.pool.submit(os._exit, 1)
+        assert backend.predict(image) == {"error": "Inference worker failed"}
+        assert backend.restarts == 1
+        assert backend.predict(image)["diagnosis"] == model.predict(image)["diagnosis"]
+    finally:
+        backend.shutdown()
+
+@pytest.mark.skipif(importlib.util.find_spec('torchvision') is None, reason="torch/torchvision not installed")
+def test_eager_weights_reach_workers_through_shared_memory(tmp_path, image):
+    import torch
+    import torch.nn as nn
+    from torchvision import models
+    resnet = models.resnet18()
+    resnet.fc = nn.Linear(resnet.fc.in_features, 5)
+    torch.save(resnet.state_dict(), tmp_path / "weights.pth")
+
+    model = RetinopathyModel(weights_path=str(tmp_path / "weights.pth"), engine='eager')
+    backend = ProcessPoolBackend(model, workers=1)
+    try:
+        assert backend.pool.submit(worker_weights_shared).result()
+        expected, got = model.predict(image), backend.predict(image)
+        assert got["diagnosis"] == expected["diagnosis"]
+        assert got["confidence"] == pytest.approx(expected["confidence"], abs=1e-6)
+    finally:
+        backend.shutdown()
@@ -2,10 +2,147 @@ import torch
 import torch.nn as nn
 import torch.optim as optim
 from torchvision import datasets, models, transforms
-from torch.utils.data import DataLoader
+from torch.utils.data import DataLoader, Dataset
+import json
 import os
+import time
+import numpy as np
+from PIL import Image
 
-def train_model(data_dir, model_save_path='retinopathy_model.pth', num_epochs=10, batch_size=32):
+IMAGE_SIZE = 224
+NORM_MEAN = [0.485, 0.456, 0.406]
+NORM_STD = [0.229, 0.224, 0.225]
+
+def build_tensor_cache(data_dir, cache_dir, image_size=IMAGE_SIZE):
+    """
+    One-time preprocessing: decodes and resizes every image of the train/val
+    splits into a uint8 (N, H, W, 3) memory-mapped .npy shard per split, plus
+    a labels array and the class list. Training then never decodes JPEG/PNG.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    classes = None
+    for phase in ['train', 'val']:
+        folder = datasets.ImageFolder(os.path.join(data_dir, phase))
+        classes = classes or folder.classes
+        n = len(folder.samples)
+        print(f"Caching {n} {phase} images to {cache_dir}...")
+
+        images = np.lib.format.open_memmap(os.path.join(cache_dir, f'{phase}_images.npy'), mode='w+',
+                                           dtype=np.uint8, shape=(n, image_size, image_size, 3))
+        labels = np.empty(n, dtype=np.int64)
+        for i, (path, label) in enumerate(folder.samples):
+            with Image.open(path) as img:
+                # Same resize as transforms.Resize((224, 224)) on a PIL image
+                images[i] = np.asarray(img.convert('RGB').resize((image_size, image_size), Image.BILINEAR))
+            labels[i] = label
+        images.flush()
+        del images
+        np.save(os.path.join(cache_dir, f'{phase}_labels.npy'), labels)
+
+    with open(os.path.join(cache_dir, 'meta.json'), 'w') as f:
+        json.dump({'classes': classes, 'image_size': image_size, 'source': os.path.abspath(data_dir)}, f)
+
+class MemmapDataset(Dataset):
+    """
+    Serves uint8 HWC images straight from a memory-mapped shard. The mapping is
+    copy-on-write, so each sample is a zero-copy view until the DataLoader
+    collates it; normalization and flips run later on the whole batch.
+    """
+
+    def __init__(self, cache_dir, phase):
+        self.images_path = os.path.join(cache_dir, f'{phase}_images.npy')
+        self.labels = np.load(os.path.join(cache_dir, f'{phase}_labels.npy'))
+        with open(os.path.join(cache_dir, 'meta.json')) as f:
+            self.classes = json.load(f)['classes']
+        # Opened lazily in each DataLoader worker so the mapping is never pickled
+        self.images = None
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, idx):
+        if self.images is None:
+            self.images = np.load(self.images_path, mmap_mode='c')
+        return torch.from_numpy(self.images[idx]), int(self.labels[idx])
+
+def batch_transform(inputs, train, device):
+    """uint8 NHWC batch -> normalized float NCHW batch (random horizontal flip for training)."""
+    inputs = inputs.to(device, non_blocking=True).permute(0, 3, 1, 2).float().div_(255)
+    if train:
+        flip = torch.rand(inputs.size(0), device=device) < 0.5
+        inputs[flip] = inputs[flip].flip(3)
+    mean = torch.tensor(NORM_MEAN, device=device).view(1, 3, 1, 1)
+    std = torch.tensor(NORM_STD, device=device).view(1, 3, 1, 1)
+    return (inputs - mean) / std
+
+def _cache_ready(cache_dir):
+    return all(os.path.exists(os.path.join(cache_dir, f)) for f in
+               ['meta.json', 'train_images.npy', 'val_images.npy', 'train_labels.npy', 'val_labels.npy'])
+
+def run_epoch(model, loader, prepare, criterion, optimizer, phase, device, bf16=False, channels_last=False,
+              accumulation_steps=1):
+    """
+    One pass over `loader` in the given phase. With accumulation_steps > 1 the
+    gradients of that many batches are summed before each optimizer step.
+    Returns (loss, corrects, images, timings) with timings in seconds for
+    'data' (waiting on the loader) and 'compute'.
+    """
+    train = phase == 'train'
+    model.train(train)
+    # Accumulate on the device and read back once per epoch instead of syncing every batch
+    running_loss = torch.zeros((), device=device)
+    running_corrects = torch.zeros((), dtype=torch.long, device=device)
+    images = 0
+    timings = {'data': 0.0, 'compute': 0.0}
+    optimizer.zero_grad(set_to_none=True)
+
+    batches = iter(loader)
+    step = 0
+    while True:
+        start = time.perf_counter()
+        try:
+            inputs, labels = next(batches)
+        except StopIteration:
+            break
+        inputs = prepare(inputs, phase)
+        labels = labels.to(device)
+        if channels_last:
+            inputs = inputs.contiguous(memory_format=torch.channels_last)
+        ready = time.perf_counter()
+        timings['data'] += ready - start
+
+        with torch.set_grad_enabled(train), \
+                torch.autocast(device_type=device.type, dtype=torch.bfloat16, enabled=bf16):
+            outputs = model(inputs)
+            loss = criterion(outputs, labels)
+
+        if train:
+            (loss / accumulation_steps).backward()
+            step += 1
+            if step % accumulation_steps == 0:
+                optimizer.step()
+                optimizer.zero_grad(set_to_none=True)
+
+        running_loss += loss.detach().float() * inputs.size(0)
+        running_corrects += (outputs.argmax(1) == labels).sum()
+        images += inputs.size(0)
+        timings['compute'] += time.perf_counter() - ready
+
+    if train and step % accumulation_steps:
+        # Apply the gradients of a final partial accumulation window
+        optimizer.step()
+        optimizer.zero_grad(set_to_none=True)
+    return running_loss.item(), running_corrects.item(), images, timings
+
+def save_checkpoint(path, model, optimizer, epoch, class_names):
+    tmp_path = f"{path}.tmp"
+    torch.save({'epoch': epoch, 'model': model.state_dict(), 'optimizer': optimizer.state_dict(),
+                'classes': class_names}, tmp_path)
+    os.replace(tmp_path, path)
+
+def train_model(data_dir, model_save_path='retinopathy_model.pth', num_epochs=10, batch_size=32,
+                cache_dir=None, num_workers=0, threads=None, bf16=False, channels_last=False,
+                accumulation_steps=1, checkpoint_path=None):
     # 1. Data Augmentation and Normalization
     data_transforms = {
         'train': transforms.Compose([
@@ -28,9 +165,26 @@ def train_model(data_dir, model_save_path='retinopathy_model.pth', num_epochs=10
         print("Please ensure you have a dataset with 'train' and 'val' subfolders.")
         return
 
-    image_datasets = {x: datasets.ImageFolder(os.path.join(data_dir, x), data_transforms[x])
-                      for x in ['train', 'val']}
-    dataloaders = {x: DataLoader(image_datasets[x], batch_size=batch_size, shuffle=True)
+    device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+    if threads:
+        torch.set_num_threads(threads)
+
+    if cache_dir:
+        # Preprocessed memmap shards: decode/resize happened once, batches are normalized in bulk
+        if not _cache_ready(cache_dir):
+            build_tensor_cache(data_dir, cache_dir)
+        image_datasets = {x: MemmapDataset(cache_dir, x) for x in ['train', 'val']}
+        prepare = lambda inputs, phase: batch_transform(inputs, phase == 'train', device)
+    else:
+        image_datasets = {x: datasets.ImageFolder(os.path.join(data_dir, x), data_transforms[x])
+                          for x in ['train', 'val']}
+        prepare = lambda inputs, phase: inputs.to(device)
+
+    # Worker processes prefetch batches; pinned host memory only helps when copying to a GPU
+    loader_options = {'num_workers': num_workers, 'pin_memory': device.type == 'cuda'}
+    if num_workers > 0:
+        loader_options.update(prefetch_factor=4, persistent_workers=True)
+    dataloaders = {x: DataLoader(image_datasets[x], batch_size=batch_size, shuffle=True, **loader_options)
                   for x in ['train', 'val']}
     
     dataset_sizes = {x: len(image_datasets[x]) for x in ['train', 'val']}
@@ -44,61 +198,111 @@ def train_model(data_dir, model_save_path='retinopathy_model.pth', num_epochs=10
     num_ftrs = model.fc.in_features
     model.fc = nn.Linear(num_ftrs, num_classes) # Adjusted for the number of DR stages
 
-    device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
     model = model.to(device)
+    if channels_last:
+        # NHWC activations let the CPU convolution kernels skip layout conversions
+        model = model.to(memory_format=torch.channels_last)
 
     criterion = nn.CrossEntropyLoss()
     optimizer = optim.Adam(model.parameters(), lr=0.001)
 
+    # Resume after the last completed epoch
+    start_epoch = 0
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        checkpoint = torch.load(checkpoint_path, map_location=device)
+        model.load_state_dict(checkpoint['model'])
+        optimizer.load_state_dict(checkpoint['optimizer'])
+        start_epoch = checkpoint['epoch'] + 1
+        print(f"Resuming from {checkpoint_path} after epoch {start_epoch}")
+
     # 4. Training Loop
-    print("Starting Training...")
-    for epoch in range(num_epochs):
+    print(f"Starting Training... (threads={torch.get_num_threads()}, bf16={bf16}, channels_last={channels_last}, "
+          f"effective batch={batch_size * accumulation_steps})")
+    for epoch in range(start_epoch, num_epochs):
         print(f'Epoch {epoch+1}/{num_epochs}')
         print('-' * 10)
 
         for phase in ['train', 'val']:
-            if phase == 'train':
-                model.train()
-            else:
-                model.eval()
-
-            running_loss = 0.0
-            running_corrects = 0
-
-            for inputs, labels in dataloaders[phase]:
-                inputs = inputs.to(device)
-                labels = labels.to(device)
-
-                optimizer.zero_grad()
-
-                with torch.set_grad_enabled(phase == 'train'):
-                    outputs = model(inputs)
-                    _, preds = torch.max(outputs, 1)
-                    loss = criterion(outputs, labels)
-
-                    if phase == 'train':
-                        loss.backward()
-                        optimizer.step()
-
-                running_loss += loss.item() * inputs.size(0)
-                running_corrects += torch.sum(preds == labels.data)
+            start = time.perf_counter()
+            running_loss, running_corrects, images, timings = run_epoch(
+                model, dataloaders[phase], prepare, criterion, optimizer, phase, device,
+                bf16=bf16, channels_last=channels_last, accumulation_steps=accumulation_steps)
+            elapsed = time.perf_counter() - start
 
             epoch_loss = running_loss / dataset_sizes[phase]
-            epoch_acc = running_corrects.double() / dataset_sizes[phase]
+            epoch_acc = running_corrects / dataset_sizes[phase]
 
-            print(f'{phase} Loss: {epoch_loss:.4f} Acc: {epoch_acc:.4f}')
+            print(f'{phase} Loss: {epoch_loss:.4f} Acc: {epoch_acc:.4f} | {images / elapsed:.1f} img/s, '
+                  f'{elapsed:.1f}s (data {timings["data"]:.1f}s, compute {timings["compute"]:.1f}s)')
+
+        if checkpoint_path:
+            save_checkpoint(checkpoint_path, model, optimizer, epoch, class_names)
 
     # 5. Save Model
     torch.save(model.state_dict(), model_save_path)
     print(f"Model saved to {model_save_path}")
 
+def export_onnx(weights_path, onnx_path, opset_version=17):
+    """
+    Exports trained weights to ONNX (dynamic batch axis, logits output) so the
+    web tier can grade with ONNX Runtime instead of importing torch/torchvision.
+    """
+    state_dict = torch.load(weights_path, map_location=torch.device('cpu'))
+    model = models.resnet18(pretrained=False)
+    model.fc = nn.Linear(model.fc.in_features, state_dict['fc.weight'].shape[0])
+    model.load_state_dict(state_dict)
+    model.eval()
+
+    dummy = torch.randn(2, 3, IMAGE_SIZE, IMAGE_SIZE)
+    tmp_path = f"{onnx_path}.tmp"
+    torch.onnx.export(model, dummy, tmp_path, input_names=['input'], output_names=['logits'],
+                      dynamic_axes={'input': {0: 'batch'}, 'logits': {0: 'batch'}},
+                      opset_version=opset_version, do_constant_folding=True)
+    os.replace(tmp_path, onnx_path)
+    print(f"ONNX model exported to {onnx_path}")
+
+    # Parity check against the torch model when ONNX Runtime is installed
+    try:
+        import onnxruntime as ort
+    except ImportError:
+        return onnx_path
+    session = ort.InferenceSession(onnx_path, providers=['CPUExecutionProvider'])
+    with torch.no_grad():
+        expected = model(dummy).numpy()
+    actual = session.run(None, {'input': dummy.numpy()})[0]
+    print(f"ONNX Runtime max |logit diff| vs torch: {np.abs(actual - expected).max():.2e}")
+    return onnx_path
+
 if __name__ == "__main__":
-    # Example usage: python train_dl.py ./dataset
+    # Example usage: python train_dl.py --data ./dataset --onnx retinopathy_model.onnx
+    #                python train_dl.py --data ./dataset --cache-dir cache --fast --threads 8 \
+    #                    --accumulation-steps 4 --checkpoint retinopathy_ckpt.pt
+    #                python train_dl.py --onnx retinopathy_model.onnx   (export existing weights only)
     import argparse
     parser = argparse.ArgumentParser(description='Train Retinopathy DL Model')
-    parser.add_argument('--data', type=str, required=True, help='Path to dataset directory')
+    parser.add_argument('--data', type=str, default=None, help='Path to dataset directory')
     parser.add_argument('--output', type=str, default='retinopathy_model.pth', help='Path to save weights')
     parser.add_argument('--epochs', type=int, default=5, help='Number of epochs')
+    parser.add_argument('--cache-dir', type=str, default=None, help='Preprocessed memmap cache (built on first use)')
+    parser.add_argument('--workers', type=int, default=0, help='DataLoader worker processes')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--threads', type=int, default=None, help='torch.set_num_threads for training')
+    parser.add_argument('--bf16', action='store_true', help='bfloat16 autocast (weights stay fp32)')
+    parser.add_argument('--channels-last', action='store_true', help='NHWC memory format for model and inputs')
+    parser.add_argument('--accumulation-steps', type=int, default=1,
+                        help='Batches per optimizer step (effective batch = batch size x steps)')
+    parser.add_argument('--checkpoint', type=str, default=None,
+                        help='Per-epoch checkpoint; training resumes from it when it exists')
+    parser.add_argument('--fast', action='store_true', help='Shorthand for --bf16 --channels-last')
+    parser.add_argument('--onnx', type=str, default=None, help='Also export the weights to this ONNX file')
     
     args = parser.parse_args()
-    train_model(args.data, args.output, args.epochs)
+    if args.data is None and args.onnx is None:
+        parser.error('--data is required unless only exporting with --onnx')
+    if args.data is not None:
+        train_model(args.data, args.output, args.epochs, batch_size=args.batch_size, cache_dir=args.cache_dir,
+                    num_workers=args.workers, threads=args.threads, bf16=args.bf16 or args.fast,
+                    channels_last=args.channels_last or args.fast, accumulation_steps=args.accumulation_steps,
+                    checkpoint_path=args.checkpoint)
+    if args.onnx is not None:
+        export_onnx(args.output, args.onnx)
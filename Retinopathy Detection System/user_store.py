@@ -0,0 +1,161 @@
+import csv
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+CSV_FIELDS = ['name', 'dob', 'password']
+
+class CsvUserStore:
+    """Original flat-file backend: every lookup scans users.csv."""
+
+    def __init__(self, path='users.csv'):
+        self.path = path
+        self._lock = threading.Lock()
+        if not os.path.exists(self.path):
+            with open(self.path, 'w', newline='') as f:
+                csv.writer(f).writerow(CSV_FIELDS)
+
+    def get(self, name):
+        with open(self.path, 'r', newline='') as f:
+            for user in csv.DictReader(f):
+                if user['name'] == name:
+                    return user
+        return None
+
+    def add(self, name, dob, password):
+        """Adds a user. Returns False if the name is already registered."""
+        with self._lock:
+            if self.get(name) is not None:
+                return False
+            with open(self.path, 'a', newline='') as f:
+                csv.writer(f).writerow([name, dob, password])
+            return True
+
+    def update_password(self, name, dob, new_password):
+        """Sets a new password if name and DOB match. Returns False otherwise."""
+        with self._lock:
+            with open(self.path, 'r', newline='') as f:
+                users = list(csv.DictReader(f))
+            for user in users:
+                if user['name'] == name and user['dob'] == dob:
+                    user['password'] = new_password
+                    break
+            else:
+                return False
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(CSV_FIELDS)
+                for user in users:
+                    writer.writerow([user['name'], user['dob'], user['password']])
+            os.replace(tmp_path, self.path)
+            return True
+
+class SqliteUserStore:
+    """
+    SQLite backend with an index on `name`, WAL journaling (readers never block
+    the writer) and a small pool of connections shared across request threads.
+    """
+
+    def __init__(self, path='users.db', pool_size=4, timeout=5.0):
+        self.path = path
+        self.timeout = timeout
+        self._pool = queue.Queue()
+        for _ in range(max(1, pool_size)):
+            self._pool.put(self._connect())
+        with self._connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS users (name TEXT NOT NULL, dob TEXT NOT NULL, password TEXT NOT NULL)")
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_users_name ON users (name)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        conn = self._pool.get(timeout=self.timeout)
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def get(self, name):
+        with self._connection() as conn:
+            row = conn.execute("SELECT name, dob, password FROM users WHERE name = ?", (name,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def add(self, name, dob, password):
+        """Adds a user. Returns False if the name is already registered."""
+        with self._connection() as conn:
+            try:
+                conn.execute("INSERT INTO users (name, dob, password) VALUES (?, ?, ?)", (name, dob, password))
+            except sqlite3.IntegrityError:
+                return False
+        return True
+
+    def update_password(self, name, dob, new_password):
+        """Sets a new password if name and DOB match. Returns False otherwise."""
+        with self._connection() as conn:
+            cur = conn.execute("UPDATE users SET password = ? WHERE name = ? AND dob = ?", (new_password, name, dob))
+        return cur.rowcount > 0
+
+    def import_csv(self, csv_path, batch_size=10000):
+        """One-shot import of an existing users.csv. Duplicate names keep the first row. Returns rows read."""
+        count = 0
+        with open(csv_path, 'r', newline='') as f, self._connection() as conn:
+            reader = csv.DictReader(f)
+            conn.execute("BEGIN")
+            try:
+                batch = []
+                for user in reader:
+                    batch.append((user['name'], user['dob'], user['password']))
+                    if len(batch) >= batch_size:
+                        conn.executemany("INSERT OR IGNORE INTO users (name, dob, password) VALUES (?, ?, ?)", batch)
+                        count += len(batch)
+                        batch = []
+                if batch:
+                    conn.executemany("INSERT OR IGNORE INTO users (name, dob, password) VALUES (?, ?, ?)", batch)
+                    count += len(batch)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return count
+
+    def close(self):
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+def create_user_store(backend='sqlite', path=None, csv_path='users.csv'):
+    """
+    Builds the configured user store. A new SQLite database is seeded from
+    `csv_path` when that file exists, so switching backends keeps existing users.
+    """
+    if backend == 'csv':
+        return CsvUserStore(path or csv_path)
+    if backend == 'sqlite':
+        path = path or 'users.db'
+        is_new = not os.path.exists(path)
+        store = SqliteUserStore(path)
+        if is_new and os.path.exists(csv_path):
+            imported = store.import_csv(csv_path)
+            print(f"Imported {imported} users from {csv_path} into {path}")
+        return store
+    raise ValueError(f"Unknown user store backend '{backend}'")
+
+if __name__ == "__main__":
+    # Example usage: python user_store.py --csv users.csv --db users.db
+    import argparse
+    parser = argparse.ArgumentParser(description='Import users.csv into the SQLite user store')
+    parser.add_argument('--csv', type=str, default='users.csv', help='Source CSV file')
+    parser.add_argument('--db', type=str, default='users.db', help='Target SQLite database')
+    args = parser.parse_args()
+
+    store = SqliteUserStore(args.db)
+    print(f"Imported {store.import_csv(args.csv)} rows from {args.csv} into {args.db}")
+    store.close()
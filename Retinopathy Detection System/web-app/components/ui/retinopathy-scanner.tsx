@@ -13,6 +13,9 @@ interface Annotation {
     w: number;
     h: number;
     label: string;
+    area: number;
+    cx: number;
+    cy: number;
 }
 
 interface PredictionResult {